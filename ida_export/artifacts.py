@@ -0,0 +1,255 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from dump_writer import create_dump_writer
+
+'''
+Writers for the files produced by the exporters and the manifest describing
+them.
+
+Every artifact is opened once, fed while the exporter traverses the module
+and closed at the end. The manifest (`{module_name}_manifest.json` next to
+the artifacts, so the modules exported into one directory keep their own)
+lists the written artifacts with their size, number of records and SHA-256
+hash as well as the wall time spent in each phase of the export.
+'''
+
+MANIFEST_SUFFIX = '_manifest.json'
+MANIFEST_VERSION = 1
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class Artifact(object):
+    """
+    Output file `{output_dir}/{module_name}{suffix}`. Text artifacts start
+    with the module name.
+    """
+
+    suffix = None
+    binary = False
+
+    def __init__(self):
+        self.path = None
+        self.records = 0
+        self._f = None
+
+    def open(self, output_dir, module_name):
+        self.path = output_dir + os.sep + module_name + self.suffix
+        self._f = open(self.path, 'wb' if self.binary else 'w')
+        self.write_header(module_name)
+
+    def write_header(self, module_name):
+
+        # Write Module name to file.
+        # NOTE: We consider the file name == module name.
+        self._f.write("%s\n" % module_name)
+
+    def close(self):
+        self._f.close()
+
+    def manifest_entry(self):
+        sha256 = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        return {
+            'artifact': self.suffix,
+            'file': os.path.basename(self.path),
+            'bytes': os.path.getsize(self.path),
+            'records': self.records,
+            'sha256': sha256.hexdigest(),
+        }
+
+
+class DumpArtifact(Artifact):
+    """
+    `.dmp` file, see dump_writer.py.
+    """
+
+    suffix = '.dmp'
+    binary = True
+
+    def __init__(self, image_base, version=2):
+        super(DumpArtifact, self).__init__()
+        self.image_base = image_base
+        self.version = version
+        self._dump_writer = None
+
+    def write_header(self, module_name):
+        self._dump_writer = create_dump_writer(self._f, self.image_base,
+                                               self.version)
+
+    # blocks is an iterable of (block_rva, block_size, instruction_count)
+    def add_function(self, function_rva, blocks):
+        self._dump_writer.write_function(function_rva, blocks)
+        self.records += 1
+
+    def close(self):
+        self._dump_writer.close()
+        super(DumpArtifact, self).close()
+
+
+class FunctionNamesArtifact(Artifact):
+    """
+    `_funcs.txt` file (parsed by ExternalFunctions).
+    """
+
+    suffix = '_funcs.txt'
+
+    def add(self, addr, name):
+        self._f.write("%x %s\n" % (addr, name))
+        self.records += 1
+
+
+class BlacklistArtifact(Artifact):
+    """
+    `_funcs_blacklist.txt` file (parsed by import_blacklist_funcs).
+    """
+
+    suffix = '_funcs_blacklist.txt'
+
+    def add(self, addr):
+        self._f.write("%x\n" % addr)
+        self.records += 1
+
+
+class VTablesArtifact(Artifact):
+    """
+    `_vtables.txt` file (parsed by VTableFile::parse and marx.parse_vtables).
+    """
+
+    suffix = '_vtables.txt'
+
+    def add(self, vtable, offset_to_top, entries):
+        self._f.write("%x %d" % (vtable, offset_to_top))
+
+        # write vtable entries in the correct order
+        for vtbl_entry in entries:
+            self._f.write(" %x" % vtbl_entry)
+
+        self._f.write("\n")
+        self.records += 1
+
+    def add_vtables(self, vtables_offset_to_top, vtable_entries):
+        for k in vtables_offset_to_top:
+            self.add(k, vtables_offset_to_top[k], vtable_entries[k])
+
+
+class PltArtifact(Artifact):
+    """
+    `_plt.txt` file (parsed by ModulePlt).
+    """
+
+    suffix = '_plt.txt'
+
+    def add(self, addr, name):
+        self._f.write("%x %s\n" % (addr, name))
+        self.records += 1
+
+
+class GotArtifact(Artifact):
+    """
+    `_got.txt` file (parsed by import_got).
+    """
+
+    suffix = '_got.txt'
+
+    def add(self, addr, value):
+        self._f.write("%x %x\n" % (addr, value))
+        self.records += 1
+
+
+class IDataArtifact(Artifact):
+    """
+    `_idata.txt` file (parsed by import_idata).
+    """
+
+    suffix = '_idata.txt'
+
+    def add(self, addr, name):
+        self._f.write("%x %s\n" % (addr, name))
+        self.records += 1
+
+
+# all artifacts in the order they are listed in the manifest
+ARTIFACT_SUFFIXES = [x.suffix for x in (DumpArtifact,
+                                        FunctionNamesArtifact,
+                                        BlacklistArtifact,
+                                        VTablesArtifact,
+                                        PltArtifact,
+                                        GotArtifact,
+                                        IDataArtifact)]
+
+
+class ExportPipeline(object):
+    """
+    Owns the artifacts of one export. Artifacts that were not handed to
+    the pipeline are skipped (get() returns None for them).
+    """
+
+    def __init__(self, output_dir, module_name, artifacts):
+        self.output_dir = output_dir
+        self.module_name = module_name
+        self.artifacts = list(artifacts)
+        self.manifest_path = (output_dir + os.sep + module_name
+                              + MANIFEST_SUFFIX)
+        self.phases = []
+        self._start = None
+
+    def get(self, suffix):
+        for artifact in self.artifacts:
+            if artifact.suffix == suffix:
+                return artifact
+        return None
+
+    def open(self):
+        self._start = time.time()
+        for artifact in self.artifacts:
+            artifact.open(self.output_dir, self.module_name)
+
+    # measures the wall time of the enclosed phase of the export
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        yield
+        self.phases.append((name, time.time() - start))
+
+    def close(self):
+        with self.phase('close'):
+            for artifact in self.artifacts:
+                artifact.close()
+        self.write_manifest()
+
+    def write_manifest(self):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'module': self.module_name,
+            'artifacts': [x.manifest_entry() for x in self.artifacts],
+            'phases': [{'phase': name, 'seconds': round(seconds, 6)}
+                       for name, seconds in self.phases],
+            'total_seconds': round(time.time() - self._start, 6),
+        }
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+            f.write("\n")
+        return manifest
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        for artifact in self.artifacts:
+            if artifact._f is not None:
+                artifact._f.close()
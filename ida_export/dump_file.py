@@ -0,0 +1,173 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import argparse
+import bisect
+import mmap
+import struct
+
+from dump_writer import (BLOCK, BLOCK_V2, DUMP_MAGIC, FUNCTION, HEADER,
+                         HEADER_V2, INDEX_ENTRY_V2, create_dump_writer)
+
+'''
+Reader for `.dmp` files (both layouts, see dump_writer.py) and converter
+between them.
+'''
+
+
+class DumpFile(object):
+    """
+    Memory-mapped `.dmp` file. Indexed (version 2) files are searched in
+    O(log n) without parsing other functions, version 1 files are indexed
+    once by a sequential pass over the function records.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fp = open(path, 'rb')
+        self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(DUMP_MAGIC)] == DUMP_MAGIC:
+            (_, self.version, self.function_count, self.image_base,
+             self._index_offset) = HEADER_V2.unpack_from(self._map, 0)
+            if self.version != 2:
+                raise Exception("Unknown dump file version %d."
+                                % self.version)
+            self._function_rvas = None
+        else:
+            self.version = 1
+            self.image_base, self.function_count = HEADER.unpack_from(
+                self._map, 0)
+            self._index_v1()
+
+    def close(self):
+        self._map.close()
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.function_count
+
+    def _index_v1(self):
+        self._function_rvas = []
+        self._records = []
+        offset = HEADER.size
+        for _ in range(self.function_count):
+            function_rva, block_count = FUNCTION.unpack_from(self._map,
+                                                             offset)
+            offset += FUNCTION.size
+            self._function_rvas.append(function_rva)
+            self._records.append((function_rva, block_count, offset))
+            offset += block_count * BLOCK.size
+
+        # keep the file order for iteration, sort for lookups
+        self._order = sorted(range(self.function_count),
+                             key=self._function_rvas.__getitem__)
+        self._sorted_rvas = [self._function_rvas[k] for k in self._order]
+
+    # returns (function_rva, block_count, blocks_offset) of the k-th
+    # function in the index (sorted by address)
+    def _index_entry(self, k):
+        if self.version == 1:
+            return self._records[self._order[k]]
+        return INDEX_ENTRY_V2.unpack_from(
+            self._map, self._index_offset + k * INDEX_ENTRY_V2.size)
+
+    def _read_blocks(self, block_count, offset):
+        block_struct = BLOCK if self.version == 1 else BLOCK_V2
+        blocks = []
+        for _ in range(block_count):
+            record = block_struct.unpack_from(self._map, offset)
+            offset += block_struct.size
+            blocks.append((record[0], record[1], record[2]))
+        return blocks
+
+    # returns a list of (block_rva, block_size, instruction_count) of the
+    # function at the given address or None if the function is not known
+    def find_function(self, address):
+        rva = address - self.image_base
+        lo, hi = 0, self.function_count
+        if self.version == 1:
+            lo = bisect.bisect_left(self._sorted_rvas, rva)
+        else:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._index_entry(mid)[0] < rva:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        if lo == self.function_count:
+            return None
+        function_rva, block_count, offset = self._index_entry(lo)
+        if function_rva != rva:
+            return None
+        return self._read_blocks(block_count, offset)
+
+    # yields (function_rva, blocks) in the order of the index
+    def iter_functions(self):
+        for k in range(self.function_count):
+            function_rva, block_count, offset = self._index_entry(k)
+            yield function_rva, self._read_blocks(block_count, offset)
+
+
+# converts a dump file into the given layout version
+def convert(source_path, target_path, version):
+    with DumpFile(source_path) as source:
+        with open(target_path, 'wb') as f:
+            with create_dump_writer(f, source.image_base,
+                                    version) as writer:
+                for function_rva, blocks in source.iter_functions():
+                    writer.write_function(function_rva, blocks)
+    return writer.function_count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspects and converts .dmp files.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    info = subparsers.add_parser("info", help="prints the header")
+    info.add_argument("dump_file")
+
+    lookup = subparsers.add_parser("lookup",
+                                   help="prints the blocks of a function")
+    lookup.add_argument("dump_file")
+    lookup.add_argument("address", type=lambda x: int(x, 16))
+
+    convert_parser = subparsers.add_parser("convert",
+                                           help="converts between versions")
+    convert_parser.add_argument("dump_file")
+    convert_parser.add_argument("target_file")
+    convert_parser.add_argument("-v", "--version", type=int, default=2,
+                                choices=(1, 2))
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        count = convert(args.dump_file, args.target_file, args.version)
+        print("Converted %d functions." % count)
+        return
+
+    with DumpFile(args.dump_file) as dump_file:
+        if args.command == "info":
+            print("Version: %d" % dump_file.version)
+            print("Image base: %x" % dump_file.image_base)
+            print("Functions: %d" % dump_file.function_count)
+
+        elif args.command == "lookup":
+            blocks = dump_file.find_function(args.address)
+            if blocks is None:
+                print("Function %x not found." % args.address)
+                return
+            for block_rva, block_size, instruction_count in blocks:
+                print("%x %x %d" % (dump_file.image_base + block_rva,
+                                    block_size, instruction_count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import struct
+from array import array
+
+'''
+Writers for the `.dmp` file parsed by DumpFile::parse.
+
+Version 1 layout (little endian):
+    uint64 image_base
+    uint32 function_count
+    function_count times:
+        uint32 function_rva
+        uint16 block_count
+        block_count times:
+            uint32 block_rva
+            uint32 block_size
+            uint16 instruction_count
+
+Version 2 (indexed) layout (little endian):
+    header:
+        char   magic[8] = "MARXDMP\\0"
+        uint32 version = 2
+        uint32 function_count
+        uint64 image_base
+        uint64 index_offset
+    block records (fixed width, consecutive for each function):
+        uint32 block_rva
+        uint32 block_size
+        uint16 instruction_count
+        uint16 reserved
+    padding to 8 bytes
+    index at index_offset, function_count entries sorted by function_rva:
+        uint32 function_rva
+        uint32 block_count
+        uint64 blocks_offset (file offset of the first block record)
+
+Version 1 files start with the (page aligned) image base, so they never
+start with the magic value of version 2.
+
+Every function record is written as soon as it is produced, counts and the
+index are written when the writer is closed.
+'''
+
+DUMP_MAGIC = b'MARXDMP\0'
+
+HEADER = struct.Struct('<QI')
+FUNCTION = struct.Struct('<IH')
+BLOCK = struct.Struct('<IIH')
+
+FUNCTION_COUNT_OFFSET = 8
+
+HEADER_V2 = struct.Struct('<8sIIQQ')
+INDEX_ENTRY_V2 = struct.Struct('<IIQ')
+BLOCK_V2 = struct.Struct('<IIHH')
+
+
+class DumpWriter(object):
+    """
+    Streams function records into an opened (binary, seekable) file
+    (version 1 layout).
+    """
+
+    version = 1
+
+    def __init__(self, f, image_base):
+        self._f = f
+        self._start = f.tell()
+        self.image_base = image_base
+        self.function_count = 0
+        self.block_count = 0
+        self._block_buffer = bytearray()
+
+        self._write_header()
+
+    def _write_header(self):
+        # function_count is patched in by close()
+        self._f.write(HEADER.pack(self.image_base, 0))
+
+    # writes one function; blocks is an iterable of
+    # (block_rva, block_size, instruction_count)
+    def write_function(self, function_rva, blocks):
+        block_buffer = self._block_buffer
+        del block_buffer[:]
+
+        block_count = 0
+        for block in blocks:
+            block_buffer += BLOCK.pack(*block)
+            block_count += 1
+
+        self._f.write(FUNCTION.pack(function_rva, block_count))
+        self._f.write(block_buffer)
+
+        self.function_count += 1
+        self.block_count += block_count
+
+    def close(self):
+        end = self._f.tell()
+        self._f.seek(self._start + FUNCTION_COUNT_OFFSET)
+        self._f.write(struct.pack('<I', self.function_count))
+        self._f.seek(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class IndexedDumpWriter(DumpWriter):
+    """
+    Streams function records into an opened (binary, seekable) file
+    (version 2 layout). Only the index (16 bytes per function) is kept in
+    memory until the writer is closed.
+    """
+
+    version = 2
+
+    def __init__(self, f, image_base):
+        self._function_rvas = array('I')
+        self._block_counts = array('I')
+        self._block_offsets = []
+        super(IndexedDumpWriter, self).__init__(f, image_base)
+
+    def _write_header(self):
+        # function_count and index_offset are patched in by close()
+        self._f.write(HEADER_V2.pack(DUMP_MAGIC, self.version, 0,
+                                     self.image_base, 0))
+
+    def write_function(self, function_rva, blocks):
+        block_buffer = self._block_buffer
+        del block_buffer[:]
+
+        block_count = 0
+        for block_rva, block_size, instruction_count in blocks:
+            block_buffer += BLOCK_V2.pack(block_rva, block_size,
+                                          instruction_count, 0)
+            block_count += 1
+
+        self._function_rvas.append(function_rva)
+        self._block_counts.append(block_count)
+        self._block_offsets.append(self._f.tell() - self._start)
+        self._f.write(block_buffer)
+
+        self.function_count += 1
+        self.block_count += block_count
+
+    def close(self):
+        f = self._f
+        end = f.tell()
+        padding = (-(end - self._start)) & 7
+        f.write(b'\0' * padding)
+        index_offset = end + padding - self._start
+
+        order = sorted(range(self.function_count),
+                       key=self._function_rvas.__getitem__)
+        for k in order:
+            f.write(INDEX_ENTRY_V2.pack(self._function_rvas[k],
+                                        self._block_counts[k],
+                                        self._block_offsets[k]))
+
+        end = f.tell()
+        f.seek(self._start)
+        f.write(HEADER_V2.pack(DUMP_MAGIC, self.version, self.function_count,
+                               self.image_base, index_offset))
+        f.seek(end)
+
+
+# returns a writer for the given layout version
+def create_dump_writer(f, image_base, version=2):
+    if version == 1:
+        return DumpWriter(f, image_base)
+    elif version == 2:
+        return IndexedDumpWriter(f, image_base)
+    raise Exception("Unknown dump file version %d." % version)
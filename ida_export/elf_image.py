@@ -0,0 +1,436 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import bisect
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+
+from elftools.elf.constants import SH_FLAGS
+from elftools.elf.elffile import ELFFile
+from elftools.elf.relocation import RelocationSection
+
+from vtable_scanner import RelocationIndex, sorted_qwords, unpack_qwords
+
+'''
+IDA-free view of a 64 bit ELF file as the export script sees it inside IDA.
+
+The file is memory-mapped once and sections are decoded as whole qword
+buffers. Relocations are applied the way IDA's ELF loader does it so that
+the heuristics of the exporter see the same values as `Qword()` would return.
+'''
+
+# Relocation types (x86-64) that IDA resolves while loading a module.
+R_X86_64_64 = 1
+R_X86_64_GLOB_DAT = 6
+R_X86_64_JUMP_SLOT = 7
+R_X86_64_RELATIVE = 8
+
+# Value IDA returns for reads from unmapped memory.
+BADQWORD = 0xFFFFFFFFFFFFFFFF
+
+# Size of a slot in the synthesized extern segment.
+EXTERN_SLOT_SIZE = 8
+
+# Symbol types and section index of undefined symbols.
+STT_FUNC = 2
+STT_GNU_IFUNC = 10
+SHN_UNDEF = 0
+
+# Sections holding PLT stubs and the size of a stub.
+PLT_STUB_SIZES = {'.plt': 16, '.plt.sec': 16, '.plt.got': 8}
+
+# jmp qword ptr [rip+disp32] (the indirect jump of every PLT stub)
+PLT_JMP = re.compile(b'\xff\x25', re.DOTALL)
+
+# Elf64_Sym: st_name, st_info, st_other, st_shndx, st_value, st_size
+SYMBOL = struct.Struct('<IBBHQQ')
+
+# Types of the sections holding program data. Loader tables (relocations,
+# symbols, dynamic entries, ...) are not defined as data by IDA, so the
+# addresses stored in them are no references.
+DATA_SECTION_TYPES = ('SHT_PROGBITS', 'SHT_INIT_ARRAY', 'SHT_FINI_ARRAY',
+                      'SHT_PREINIT_ARRAY')
+
+Section = namedtuple('Section', ['name', 'start', 'end', 'offset', 'nobits',
+                                 'executable'])
+Symbol = namedtuple('Symbol', ['name', 'value', 'size', 'type', 'shndx'])
+
+
+# names of the sections holding the relocation entries used by the
+# vtable heuristics
+relocation_section_names = ['.rela.dyn', '.rela.plt']
+
+
+def iter_relocation_sections(elf):
+    for name in relocation_section_names:
+        section = elf.get_section_by_name(name)
+        if section is not None:
+            yield section
+
+
+# reads the relocation entries of the given ELF file into a RelocationIndex
+# (one bulk read per RELA section, without parsing single relocations)
+def load_relocation_index(path):
+    with open(path, 'rb') as f:
+        elf = ELFFile(f)
+        rela_datas = []
+        for section in iter_relocation_sections(elf):
+            f.seek(section['sh_offset'])
+            rela_datas.append(f.read(section['sh_size']))
+    return RelocationIndex.from_rela(rela_datas)
+
+
+class ElfImage(object):
+    """
+    Memory-mapped, read-only view of a 64 bit ELF file.
+    Sections are named and placed like the segments IDA creates for them,
+    including the synthesized `extern` segment holding imported symbols.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._fp = open(path, 'rb')
+        self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.elf = ELFFile(self._fp)
+
+        if self.elf.elfclass != 64:
+            raise Exception("Only 64 bit architecture is supported.")
+
+        self.sections = []
+        self._loader_table_names = set()
+        for section in self.elf.iter_sections():
+            if not section['sh_flags'] & SH_FLAGS.SHF_ALLOC:
+                continue
+            if not section['sh_addr'] or not section.name:
+                continue
+            if (section['sh_type'] not in DATA_SECTION_TYPES
+                and section['sh_type'] != 'SHT_NOBITS'):
+                self._loader_table_names.add(section.name)
+            self.sections.append(Section(
+                section.name,
+                section['sh_addr'],
+                section['sh_addr'] + section['sh_size'],
+                section['sh_offset'],
+                section['sh_type'] == 'SHT_NOBITS',
+                bool(section['sh_flags'] & SH_FLAGS.SHF_EXECINSTR)))
+        self.sections.sort(key=lambda x: x.start)
+        self._section_starts = [x.start for x in self.sections]
+
+        self.image_base = min(
+            [x['p_vaddr'] & ~0xFFF for x in self.elf.iter_segments()
+             if x['p_type'] == 'PT_LOAD'] or [0])
+
+        self._symbol_tables = dict()
+        self._build_extern()
+        self._relocated_offsets = None
+        self._relocated_values = None
+        self._code_references = None
+
+    def close(self):
+        self._map.close()
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # IDA places every imported symbol into an artificial segment behind
+    # the last section of the module
+    def _build_extern(self):
+        self.extern_symbols = dict()
+        start = 0
+        if self.sections:
+            start = (max(x.end for x in self.sections) + 0xF) & ~0xF
+        addr = start
+        for symbol in self.symbols('.dynsym'):
+            if (symbol.shndx != SHN_UNDEF
+                or not symbol.name
+                or symbol.name in self.extern_symbols):
+                continue
+            self.extern_symbols[symbol.name] = addr
+            addr += EXTERN_SLOT_SIZE
+        if addr != start:
+            self.sections.append(Section('extern', start, addr, 0, True,
+                                         False))
+            self._section_starts.append(start)
+
+    def get_section(self, name):
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def get_sections(self, names):
+        return [x for x in self.sections if x.name in names]
+
+    # returns the section containing addr or None
+    def section_at(self, addr):
+        i = bisect.bisect_right(self._section_starts, addr) - 1
+        if i >= 0 and addr < self.sections[i].end:
+            return self.sections[i]
+        return None
+
+    def memory_accessible(self, addr):
+        return self.section_at(addr) is not None
+
+    # returns the symbols of the given symbol table (decoded in bulk,
+    # the index in the list is the symbol index)
+    def symbols(self, table_name):
+        if table_name in self._symbol_tables:
+            return self._symbol_tables[table_name]
+
+        symbols = []
+        table = self.elf.get_section_by_name(table_name)
+        if table is not None:
+            strtab = self.elf.get_section(table['sh_link'])
+            strings = self._map[strtab['sh_offset']:
+                                strtab['sh_offset'] + strtab['sh_size']]
+            offset = table['sh_offset']
+            end = offset + table['sh_size']
+            while offset + SYMBOL.size <= end:
+                (st_name, st_info, _, st_shndx, st_value,
+                 st_size) = SYMBOL.unpack_from(self._map, offset)
+                offset += SYMBOL.size
+
+                name = strings[st_name:strings.find(b'\0', st_name)]
+                if not isinstance(name, str):
+                    name = name.decode('latin-1')
+                symbols.append(Symbol(name, st_value, st_size,
+                                      st_info & 0xF, st_shndx))
+
+        self._symbol_tables[table_name] = symbols
+        return symbols
+
+    # returns the address of a (defined or imported) symbol
+    def symbol_address(self, name):
+        if name in self.extern_symbols:
+            return self.extern_symbols[name]
+        for table_name in ('.dynsym', '.symtab'):
+            for symbol in self.symbols(table_name):
+                if symbol.name == name and symbol.shndx != SHN_UNDEF:
+                    return symbol.value
+        return None
+
+    def _rela_data(self, section):
+        return self._map[section['sh_offset']:
+                         section['sh_offset'] + section['sh_size']]
+
+    # extracts all relocation entries from the ELF file
+    # (needed for vtable location heuristics)
+    def relocation_entries(self):
+        return RelocationIndex.from_rela(
+            self._rela_data(x) for x in iter_relocation_sections(self.elf))
+
+    # yields (r_offset, reloc_type, symbol, r_addend) of all RELA entries
+    # (decoded in bulk, symbol is None if the entry has no symbol)
+    def _iter_relocations(self):
+        for section in self.elf.iter_sections():
+            if not isinstance(section, RelocationSection):
+                continue
+            if not section.is_RELA():
+                continue
+            symbols = []
+            if section['sh_link']:
+                symbols = self.symbols(
+                    self.elf.get_section(section['sh_link']).name)
+
+            qwords = unpack_qwords(self._rela_data(section))
+            for r_offset, r_info, r_addend in zip(qwords[0::3],
+                                                  qwords[1::3],
+                                                  qwords[2::3]):
+                symbol_index = r_info >> 32
+                symbol = None
+                if 0 < symbol_index < len(symbols):
+                    symbol = symbols[symbol_index]
+                yield r_offset, r_info & 0xFFFFFFFF, symbol, r_addend
+
+    # returns the value IDA assigns to a symbol
+    # (imported symbols point into the extern segment)
+    def _symbol_value(self, symbol):
+        if symbol is None:
+            return 0
+        if symbol.shndx != SHN_UNDEF:
+            return symbol.value
+        return self.extern_symbols.get(symbol.name, 0)
+
+    # decodes all RELA sections in bulk and keeps the value IDA stores at
+    # each relocated address after loading (sorted by address)
+    def _load_relocations(self):
+        offsets = []
+        values = []
+        for r_offset, reloc_type, symbol, r_addend in \
+                self._iter_relocations():
+            if reloc_type == R_X86_64_RELATIVE:
+                value = r_addend
+            elif reloc_type in (R_X86_64_64,
+                                R_X86_64_GLOB_DAT,
+                                R_X86_64_JUMP_SLOT):
+                value = self._symbol_value(symbol)
+                if reloc_type == R_X86_64_64:
+                    value = (value + r_addend) & 0xFFFFFFFFFFFFFFFF
+            else:
+                continue
+            offsets.append(r_offset)
+            values.append(value)
+
+        order = sorted(range(len(offsets)), key=offsets.__getitem__)
+        self._relocated_offsets = sorted_qwords(offsets)
+        self._relocated_values = [values[k] for k in order]
+
+    # returns the value IDA stores at the given relocated address
+    # or None if the address is not relocated
+    def relocated_value(self, addr):
+        if self._relocated_offsets is None:
+            self._load_relocations()
+        i = bisect.bisect_left(self._relocated_offsets, addr)
+        if (i < len(self._relocated_offsets)
+            and self._relocated_offsets[i] == addr):
+            return self._relocated_values[i]
+        return None
+
+    # returns the qwords of the given section starting at its first byte
+    def section_qwords(self, section):
+        size = section.end - section.start
+        if section.nobits:
+            return unpack_qwords(b'\0' * size)
+        qwords = unpack_qwords(
+            self._map[section.offset:section.offset + size])
+
+        if self._relocated_offsets is None:
+            self._load_relocations()
+        lo = bisect.bisect_left(self._relocated_offsets, section.start)
+        hi = bisect.bisect_right(self._relocated_offsets, section.end - 8)
+        for k in range(lo, hi):
+            delta = self._relocated_offsets[k] - section.start
+            if not delta & 7:
+                qwords[delta >> 3] = self._relocated_values[k]
+        return qwords
+
+    def read(self, addr, size):
+        section = self.section_at(addr)
+        if section is None or section.nobits:
+            return None
+        size = min(size, section.end - addr)
+        offset = section.offset + addr - section.start
+        return self._map[offset:offset + size]
+
+    def qword(self, addr):
+        relocated = self.relocated_value(addr)
+        if relocated is not None:
+            return relocated
+        section = self.section_at(addr)
+        if section is None:
+            return BADQWORD
+        if section.nobits:
+            return 0
+        data = self.read(addr, 8)
+        if len(data) < 8:
+            # the remaining bytes belong to whatever follows the section
+            data += struct.pack('<Q', self.qword(addr + len(data)))[:8 -
+                                                                   len(data)]
+        return struct.unpack('<Q', data)[0]
+
+    def _collect_code_references(self):
+        if self._relocated_offsets is None:
+            self._load_relocations()
+        referenced = set(self._relocated_values)
+
+        # rip relative lea/mov instructions (position independent code)
+        rip_relative = re.compile(b'[\x48\x4c][\x8b\x8d][\x05\x0d\x15\x1d'
+                                  b'\x25\x2d\x35\x3d]', re.DOTALL)
+        for section in self.sections:
+            if not section.executable or section.nobits:
+                continue
+            data = self._map[section.offset:
+                             section.offset + section.end - section.start]
+            for match in rip_relative.finditer(data):
+                pos = match.start()
+                if pos + 7 > len(data):
+                    continue
+                disp = struct.unpack('<i', data[pos + 3:pos + 7])[0]
+                referenced.add(section.start + pos + 7 + disp)
+        return referenced
+
+    # approximates IDA's XrefsTo() for data: true if the address is
+    # referenced by a relocation, a rip relative instruction, an absolute
+    # 32 bit immediate in executable code or an aligned pointer in data
+    # (loader tables are skipped, the relocation entry of a vtable slot
+    # stores the slot address but does not refer to it)
+    def has_references(self, addr):
+        if self._code_references is None:
+            self._code_references = self._collect_code_references()
+        if addr in self._code_references:
+            return True
+        needle_code = None
+        if addr <= 0xFFFFFFFF:
+            needle_code = struct.pack('<I', addr)
+        needle_data = struct.pack('<Q', addr)
+        for section in self.sections:
+            if section.nobits or section.name in self._loader_table_names:
+                continue
+            data = self._map[section.offset:
+                             section.offset + section.end - section.start]
+            if section.executable:
+                if needle_code is not None and data.find(needle_code) != -1:
+                    return True
+                continue
+            pos = data.find(needle_data)
+            while pos != -1:
+                if not (section.start + pos) & 7:
+                    return True
+                pos = data.find(needle_data, pos + 1)
+        return False
+
+    # returns a sorted list of (address, name) of the named functions
+    # defined in executable sections (except the PLT stubs), aliases of a
+    # function are all listed
+    def function_names(self):
+        functions = set()
+        for table_name in ('.symtab', '.dynsym'):
+            for symbol in self.symbols(table_name):
+                if (symbol.type not in (STT_FUNC, STT_GNU_IFUNC)
+                    or symbol.shndx == SHN_UNDEF
+                    or not symbol.name):
+                    continue
+                section = self.section_at(symbol.value)
+                if (section is None
+                    or not section.executable
+                    or section.name in PLT_STUB_SIZES):
+                    continue
+                functions.add((symbol.value, symbol.name))
+        return sorted(functions)
+
+    # returns a sorted list of (address, name) of the PLT stubs; the name
+    # is the one of the symbol whose GOT slot the stub jumps through
+    def plt_entries(self):
+        slot_names = dict()
+        for r_offset, reloc_type, symbol, _ in self._iter_relocations():
+            if (reloc_type in (R_X86_64_GLOB_DAT, R_X86_64_JUMP_SLOT)
+                and symbol is not None and symbol.name):
+                slot_names[r_offset] = symbol.name
+
+        entries = []
+        for section in self.sections:
+            if section.name not in PLT_STUB_SIZES or section.nobits:
+                continue
+            stub_size = PLT_STUB_SIZES[section.name]
+            data = self.read(section.start, section.end - section.start)
+
+            named = set()
+            for match in PLT_JMP.finditer(data):
+                pos = match.start()
+                stub = pos - pos % stub_size
+                if stub in named or pos + 6 > len(data):
+                    continue
+                disp = struct.unpack_from('<i', data, pos + 2)[0]
+                name = slot_names.get(section.start + pos + 6 + disp)
+                if name:
+                    entries.append((section.start + stub, name))
+                    named.add(stub)
+        return sorted(entries)
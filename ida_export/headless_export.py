@@ -0,0 +1,349 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import argparse
+import multiprocessing
+import os
+import time
+
+import vtable_scanner
+from artifacts import (ARTIFACT_SUFFIXES, ExportPipeline,
+                       FunctionNamesArtifact, GotArtifact, IDataArtifact,
+                       PltArtifact, VTablesArtifact)
+from pe_image import MZ_MAGIC, PeImage
+
+'''
+Exports the data needed by Marx directly from a binary (64 bit ELF or PE)
+without IDA.
+
+The output files have the same format as the ones written by export.py
+(`{BINARY_NAME}_vtables.txt` ...), so Marx and ida_import can consume them
+unchanged. A `{BINARY_NAME}_manifest.json` describing the written files is
+placed next to them.
+'''
+
+# C++ configuration
+vtable_section_names = [".rodata", ".data.rel.ro", ".data.rel.ro.local"]
+pure_virtual_name = "__cxa_pure_virtual"
+msvc_vtable_section_names = [".rdata"]
+
+
+class Exporter(object):
+    """
+    Writes the artifacts of a memory-mapped module. Subclasses implement
+    get_vtables() and may export further artifacts.
+    """
+
+    def __init__(self, image):
+        self.image = image
+
+    # returns the artifacts the exporter can write
+    def create_artifacts(self):
+        return [VTablesArtifact()]
+
+    def export_vtables(self, pipeline):
+        vtables_file = pipeline.get('_vtables.txt')
+        if vtables_file is None:
+            return
+
+        with pipeline.phase('vtables'):
+            vtables_offset_to_top, vtable_entries = self.get_vtables()
+            vtables_file.add_vtables(vtables_offset_to_top, vtable_entries)
+
+        print('Exported %d vtables.' % vtables_file.records)
+
+    def export_artifacts(self, pipeline):
+        self.export_vtables(pipeline)
+
+    def export(self, output_dir, suffixes=ARTIFACT_SUFFIXES):
+        artifacts = [x for x in self.create_artifacts()
+                     if x.suffix in suffixes]
+        with ExportPipeline(output_dir, self.image.name,
+                            artifacts) as pipeline:
+            self.export_artifacts(pipeline)
+        return pipeline
+
+
+class ElfExporter(Exporter):
+    """
+    Applies the vtable heuristics of export.py to a memory-mapped ELF file.
+    """
+
+    def __init__(self, image, pure_virtual_addr=None):
+        super(ElfExporter, self).__init__(image)
+
+        # NOTE: Modules without pure virtual functions do not import it.
+        # None never matches a vtable entry.
+        if pure_virtual_addr is None:
+            pure_virtual_addr = image.symbol_address(pure_virtual_name)
+        self.pure_virtual_addr = pure_virtual_addr
+
+        text = image.get_section(".text")
+        extern = image.get_section("extern")
+        plt = image.get_section(".plt")
+        self.text_start, self.text_end = (text.start, text.end) if text \
+            else (0, 0)
+        self.extern_start, self.extern_end = (extern.start, extern.end) \
+            if extern else (0, 0)
+        self.plt_start, self.plt_end = (plt.start, plt.end) if plt else (0, 0)
+
+        self.vtable_sections = image.get_sections(vtable_section_names)
+        self.relocation_entries = image.relocation_entries()
+
+        self.classifier = vtable_scanner.EntryClassifier(
+            [(self.text_start, self.text_end),
+             (self.extern_start, self.extern_end),
+             (self.plt_start, self.plt_end)],
+            self.pure_virtual_addr,
+            self.relocation_entries,
+            [(x.start, x.end) for x in self.vtable_sections])
+
+    # is it preceded by a valid offset to top and rtti entry?
+    # heuristic value for offset to top taken from vfguard paper
+    def check_rtti_and_offset_to_top(self, rtti_candidate, ott_candidate,
+                                     addr):
+        ott_addr = addr - 16
+        offset_to_top = vtable_scanner.to_signed64(ott_candidate)
+        ott_valid = (-0xFFFFFF <= offset_to_top and offset_to_top <= 0xffffff)
+        rtti_valid = (rtti_candidate == 0
+            or (not self.text_start <= rtti_candidate < self.text_end
+            and self.image.memory_accessible(rtti_candidate)))
+
+        # offset to top can not be a relocation entry
+        # (RTTI on the other hand can be a relocation entry)
+        # => probably a vtable beginning
+        ott_no_rel = (not ott_addr in self.relocation_entries)
+
+        return ott_valid and rtti_valid and ott_no_rel
+
+    def get_vtables(self):
+        sections = [vtable_scanner.VTableSection(
+                        x.start, x.end, self.image.section_qwords(x))
+                    for x in self.vtable_sections]
+
+        vtables_offset_to_top = vtable_scanner.get_vtables_gcc64(
+            sections,
+            self.classifier,
+            self.check_rtti_and_offset_to_top)
+        vtables_offset_to_top = vtable_scanner.filter_vtable_candidates(
+            vtables_offset_to_top,
+            self.image.has_references)
+
+        vtable_entries = vtable_scanner.get_vtable_entries_gcc64(
+            vtables_offset_to_top,
+            sections,
+            self.image.qword,
+            self.classifier)
+
+        return vtables_offset_to_top, vtable_entries
+
+    def create_artifacts(self):
+        return [FunctionNamesArtifact(), VTablesArtifact(), PltArtifact(),
+                GotArtifact()]
+
+    def export_functions(self, pipeline):
+        funcs_file = pipeline.get('_funcs.txt')
+        if funcs_file is None:
+            return
+
+        with pipeline.phase('functions'):
+            for addr, name in self.image.function_names():
+                funcs_file.add(addr, name)
+
+        print('Exported %d function names.' % funcs_file.records)
+
+    def export_plt(self, pipeline):
+        plt_file = pipeline.get('_plt.txt')
+        if plt_file is None:
+            return
+
+        with pipeline.phase('plt'):
+            for addr, name in self.image.plt_entries():
+                plt_file.add(addr, name)
+
+        print('Exported %d .plt entries.' % plt_file.records)
+
+    def export_got(self, pipeline):
+        got_file = pipeline.get('_got.txt')
+        if got_file is None:
+            return
+
+        with pipeline.phase('got'):
+            got = self.image.get_section('.got')
+            if got is not None:
+                for k, qword in enumerate(self.image.section_qwords(got)):
+                    got_file.add(got.start + k*8, qword)
+
+                # NOTE: export.py includes the end address of .got
+                got_file.add(got.end, self.image.qword(got.end))
+
+        print('Exported %d .got entries.' % got_file.records)
+
+    def export_artifacts(self, pipeline):
+        self.export_functions(pipeline)
+        self.export_vtables(pipeline)
+        self.export_plt(pipeline)
+        self.export_got(pipeline)
+
+
+# returns the given interval without the part overlapping [start, end)
+def subtract_interval(interval, start, end):
+    result = []
+    if interval[0] < min(start, interval[1]):
+        result.append((interval[0], min(start, interval[1])))
+    if max(end, interval[0]) < interval[1]:
+        result.append((max(end, interval[0]), interval[1]))
+    return result
+
+
+class PeExporter(Exporter):
+    """
+    Applies the MSVC vtable heuristics of export.py to a memory-mapped PE32+
+    file. All addresses are written as RVAs (as if the IDA database was
+    rebased to 0x0).
+    """
+
+    def __init__(self, image, pure_virtual_addr=None):
+        super(PeExporter, self).__init__(image)
+
+        # NOTE: _purecall is usually linked into .text, so its address is
+        # only needed if it lies somewhere else. None never matches.
+        self.pure_virtual_addr = pure_virtual_addr
+
+        text = image.get_section(".text")
+        self.text_start, self.text_end = (text.start, text.end) if text \
+            else (0, 0)
+
+        # IDA moves the import address table into its own .idata segment
+        idata_start, idata_end = image.iat_range()
+        self.vtable_sections = []
+        for section in image.get_sections(msvc_vtable_section_names):
+            for start, end in subtract_interval((section.start, section.end),
+                                                idata_start, idata_end):
+                self.vtable_sections.append((section, start, end))
+
+        self.classifier = vtable_scanner.EntryClassifier(
+            [(self.text_start, self.text_end)],
+            self.pure_virtual_addr,
+            vtable_scanner.RelocationIndex(),
+            [])
+
+    def create_artifacts(self):
+        return [VTablesArtifact(), IDataArtifact()]
+
+    def get_vtables(self):
+        sections = []
+        qwords = dict()
+        for section, start, end in self.vtable_sections:
+            if section not in qwords:
+                qwords[section] = self.image.section_qwords(section)
+            first = (start - section.start + 7) >> 3
+            last = (end - section.start) >> 3
+            sections.append(vtable_scanner.VTableSection(
+                section.start + first * 8, end,
+                qwords[section][first:last]))
+
+        vtables_offset_to_top = vtable_scanner.get_vtables_msvc64(
+            sections,
+            self.classifier,
+            [(self.text_start, self.text_end)],
+            self.image.read_dwords)
+
+        vtable_entries = vtable_scanner.get_vtable_entries_msvc64(
+            vtables_offset_to_top,
+            sections,
+            self.image.qword,
+            self.classifier)
+
+        return vtables_offset_to_top, vtable_entries
+
+    def export_idata(self, pipeline):
+        idata_file = pipeline.get('_idata.txt')
+        if idata_file is None:
+            return
+
+        with pipeline.phase('idata'):
+            for rva, name in self.image.imports():
+                idata_file.add(rva, name)
+
+        print('Exported %d .idata entries.' % idata_file.records)
+
+    def export_artifacts(self, pipeline):
+        super(PeExporter, self).export_artifacts(pipeline)
+        self.export_idata(pipeline)
+
+
+# opens the given binary and returns (image, exporter)
+def open_binary(path, pure_virtual_addr=None):
+    with open(path, 'rb') as f:
+        magic = f.read(len(MZ_MAGIC))
+    if magic == MZ_MAGIC:
+        image = PeImage(path)
+        return image, PeExporter(image, pure_virtual_addr)
+
+    # pyelftools is only needed for ELF files
+    from elf_image import ElfImage
+    image = ElfImage(path)
+    return image, ElfExporter(image, pure_virtual_addr)
+
+
+# exports one binary, job = (path, output_dir, pure_virtual_addr,
+# artifact suffixes); returns (path, phases, seconds)
+def export_binary(job):
+    path, output_dir, pure_virtual_addr, suffixes = job
+    start = time.time()
+    image, exporter = open_binary(path, pure_virtual_addr)
+    with image:
+        pipeline = exporter.export(output_dir, suffixes)
+    return path, pipeline.phases, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exports Marx input files without IDA.")
+    parser.add_argument("binaries", nargs="+", metavar="binary",
+                        help="ELF or PE files to export")
+    parser.add_argument("-o", "--output_dir",
+                        help="directory to save the outputs "
+                             "(default: directory of each binary)")
+    parser.add_argument("-p", "--pure_virtual_addr",
+                        type=lambda x: int(x, 16),
+                        help="address of pure_virtual_call (hex, default: "
+                             "address of %s for ELF files)"
+                             % pure_virtual_name)
+    parser.add_argument("-a", "--artifacts", nargs="+",
+                        choices=ARTIFACT_SUFFIXES, default=ARTIFACT_SUFFIXES,
+                        metavar="SUFFIX",
+                        help="files to export (default: all supported, "
+                             "choices: %s)" % " ".join(ARTIFACT_SUFFIXES))
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of binaries exported in parallel")
+    args = parser.parse_args()
+
+    jobs = []
+    for path in args.binaries:
+        output_dir = args.output_dir or os.path.dirname(os.path.abspath(path))
+        jobs.append((path, output_dir, args.pure_virtual_addr,
+                     args.artifacts))
+
+    start = time.time()
+    if args.jobs > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap_unordered(export_binary, jobs)
+    else:
+        pool = None
+        results = (export_binary(x) for x in jobs)
+
+    for path, phases, seconds in results:
+        print('%s: %s (%.2fs)' % (path, ', '.join(
+            '%s %.2fs' % (name, phase_seconds)
+            for name, phase_seconds in phases), seconds))
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    print('Finished in %.2fs.' % (time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
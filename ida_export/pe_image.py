@@ -0,0 +1,312 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import bisect
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+from vtable_scanner import RelocationIndex, unpack_qwords
+
+'''
+IDA-free view of a PE32+ (64 bit) file as the export script sees it inside an
+IDA database rebased to 0x0.
+
+All addresses are relative virtual addresses (RVAs), which is also what Marx
+uses for PE files (see MappedPe). The file is memory-mapped once, sections are
+placed at their RVA and every absolute pointer the base relocations point to
+is rebased by subtracting the image base, so the preferred image base of the
+file does not matter.
+'''
+
+MZ_MAGIC = b'MZ'
+PE_MAGIC = b'PE\0\0'
+PE32_PLUS_MAGIC = 0x20B
+
+# IMAGE_FILE_HEADER without the signature
+FILE_HEADER = struct.Struct('<HHIIIHH')
+
+# IMAGE_OPTIONAL_HEADER64 up to NumberOfRvaAndSizes
+OPTIONAL_HEADER = struct.Struct('<HBBIIIIIQIIHHHHHHIIIIHHQQQQII')
+
+SECTION_HEADER = struct.Struct('<8sIIIIIIHHI')
+DATA_DIRECTORY = struct.Struct('<II')
+IMPORT_DESCRIPTOR = struct.Struct('<IIIII')
+BASE_RELOCATION = struct.Struct('<II')
+
+# Data directory indices.
+IMAGE_DIRECTORY_ENTRY_IMPORT = 1
+IMAGE_DIRECTORY_ENTRY_BASERELOC = 5
+IMAGE_DIRECTORY_ENTRY_IAT = 12
+
+IMAGE_SCN_MEM_EXECUTE = 0x20000000
+IMAGE_REL_BASED_DIR64 = 10
+IMAGE_ORDINAL_FLAG64 = 0x8000000000000000
+
+# Value IDA returns for reads from unmapped memory.
+BADQWORD = 0xFFFFFFFFFFFFFFFF
+
+Section = namedtuple('Section', ['name', 'start', 'end', 'offset', 'raw_size',
+                                 'executable'])
+
+
+class PeImage(object):
+    """
+    Memory-mapped, read-only view of a PE32+ file. Sections are placed at
+    their RVA with their virtual size rounded up to the section alignment
+    (like the segments IDA creates for them).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._fp = open(path, 'rb')
+        self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:2] != MZ_MAGIC:
+            raise Exception("Malformed input file %s." % path)
+        pe_offset = struct.unpack_from('<I', self._map, 0x3C)[0]
+        if self._map[pe_offset:pe_offset + 4] != PE_MAGIC:
+            raise Exception("Malformed input file %s." % path)
+
+        (_, section_count, _, _, _, optional_header_size,
+         _) = FILE_HEADER.unpack_from(self._map, pe_offset + 4)
+        optional_header_offset = pe_offset + 4 + FILE_HEADER.size
+
+        optional_header = OPTIONAL_HEADER.unpack_from(self._map,
+                                                      optional_header_offset)
+        if optional_header[0] != PE32_PLUS_MAGIC:
+            raise Exception("Only 64 bit architecture is supported.")
+        self.image_base = optional_header[8]
+        self.section_alignment = optional_header[9]
+        self.size_of_image = optional_header[18]
+        directory_count = optional_header[-1]
+
+        self.data_directories = []
+        offset = optional_header_offset + OPTIONAL_HEADER.size
+        for _ in range(directory_count):
+            self.data_directories.append(
+                DATA_DIRECTORY.unpack_from(self._map, offset))
+            offset += DATA_DIRECTORY.size
+
+        alignment = max(self.section_alignment, 1)
+        self.sections = []
+        offset = optional_header_offset + optional_header_size
+        for _ in range(section_count):
+            (name, virtual_size, virtual_address, raw_size, raw_offset,
+             _, _, _, _, characteristics) = SECTION_HEADER.unpack_from(
+                self._map, offset)
+            offset += SECTION_HEADER.size
+
+            name = name.rstrip(b'\0')
+            if not isinstance(name, str):
+                name = name.decode('latin-1')
+            size = virtual_size or raw_size
+            size = (size + alignment - 1) // alignment * alignment
+            self.sections.append(Section(
+                name,
+                virtual_address,
+                virtual_address + size,
+                raw_offset,
+                min(raw_size, size),
+                bool(characteristics & IMAGE_SCN_MEM_EXECUTE)))
+        self.sections.sort(key=lambda x: x.start)
+        self._section_starts = [x.start for x in self.sections]
+
+        self._fixups = None
+
+    def close(self):
+        self._map.close()
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # returns (rva, size) of the given data directory or (0, 0)
+    def data_directory(self, index):
+        if index < len(self.data_directories):
+            return self.data_directories[index]
+        return 0, 0
+
+    def get_section(self, name):
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def get_sections(self, names):
+        return [x for x in self.sections if x.name in names]
+
+    # returns the section containing rva or None
+    def section_at(self, rva):
+        i = bisect.bisect_right(self._section_starts, rva) - 1
+        if i >= 0 and rva < self.sections[i].end:
+            return self.sections[i]
+        return None
+
+    def memory_accessible(self, rva):
+        return self.section_at(rva) is not None
+
+    # returns size bytes at rva (bytes behind the raw data of a section are
+    # zero) or None if rva is not mapped
+    def read(self, rva, size):
+        section = self.section_at(rva)
+        if section is None:
+            return None
+        size = min(size, section.end - rva)
+        delta = rva - section.start
+        data = b''
+        if delta < section.raw_size:
+            offset = section.offset + delta
+            data = self._map[offset:
+                             offset + min(size, section.raw_size - delta)]
+        return data + b'\0' * (size - len(data))
+
+    def _read_string(self, rva):
+        section = self.section_at(rva)
+        if section is None or rva - section.start >= section.raw_size:
+            return None
+        offset = section.offset + rva - section.start
+        end = self._map.find(b'\0', offset,
+                             section.offset + section.raw_size)
+        if end == -1:
+            end = section.offset + section.raw_size
+        name = self._map[offset:end]
+        if not isinstance(name, str):
+            name = name.decode('latin-1')
+        return name
+
+    # returns the RVAs of all absolute 64 bit pointers (base relocations)
+    def fixups(self):
+        if self._fixups is not None:
+            return self._fixups
+
+        offsets = []
+        rva, size = self.data_directory(IMAGE_DIRECTORY_ENTRY_BASERELOC)
+        data = self.read(rva, size) if size else None
+        pos = 0
+        while data is not None and pos + BASE_RELOCATION.size <= len(data):
+            page_rva, block_size = BASE_RELOCATION.unpack_from(data, pos)
+            if (block_size < BASE_RELOCATION.size
+                or pos + block_size > len(data)):
+                break
+            count = (block_size - BASE_RELOCATION.size) // 2
+            entries = struct.unpack_from('<%dH' % count, data,
+                                         pos + BASE_RELOCATION.size)
+            for entry in entries:
+                if entry >> 12 == IMAGE_REL_BASED_DIR64:
+                    offsets.append(page_rva + (entry & 0xFFF))
+            pos += block_size
+
+        self._fixups = RelocationIndex(offsets)
+        return self._fixups
+
+    # rebases an absolute pointer to image base 0x0
+    def _rebase(self, value):
+        return (value - self.image_base) & 0xFFFFFFFFFFFFFFFF
+
+    # returns true if the file has no base relocations and pointers have to
+    # be recognized by their value
+    def _is_fixed(self):
+        return not len(self.fixups())
+
+    def _rebase_fixed(self, value):
+        if self.image_base <= value < self.image_base + self.size_of_image:
+            return value - self.image_base
+        return value
+
+    # returns the qwords of the given section (rebased to image base 0x0)
+    def section_qwords(self, section):
+        qwords = unpack_qwords(self.read(section.start,
+                                         section.end - section.start))
+        if self._is_fixed():
+            for k, value in enumerate(qwords):
+                qwords[k] = self._rebase_fixed(value)
+            return qwords
+
+        for rva in self.fixups().range(section.start, section.end - 7):
+            delta = rva - section.start
+            if not delta & 7:
+                qwords[delta >> 3] = self._rebase(qwords[delta >> 3])
+        return qwords
+
+    def qword(self, rva):
+        data = self.read(rva, 8)
+        if data is None:
+            return BADQWORD
+        if len(data) < 8:
+            # the remaining bytes belong to whatever follows the section
+            rest = struct.pack('<Q', self.qword(rva + len(data)))
+            data += rest[:8 - len(data)]
+        value = struct.unpack('<Q', data)[0]
+        if self._is_fixed():
+            return self._rebase_fixed(value)
+        if rva in self.fixups():
+            return self._rebase(value)
+        return value
+
+    # returns the dword at each of the given RVAs
+    # (None if the RVA is not accessible)
+    def read_dwords(self, rvas):
+        dwords = []
+        for rva in rvas:
+            data = self.read(rva, 4)
+            if data is None or len(data) < 4:
+                dwords.append(None)
+            else:
+                dwords.append(struct.unpack('<I', data)[0])
+        return dwords
+
+    # returns (start, end) of the import address table or (0, 0)
+    # (IDA shows it as `.idata` segment)
+    def iat_range(self):
+        rva, size = self.data_directory(IMAGE_DIRECTORY_ENTRY_IAT)
+        if not size:
+            return 0, 0
+        return rva, rva + size
+
+    # returns a sorted list of (rva of the IAT slot, import name)
+    def imports(self):
+        imports = []
+        rva, size = self.data_directory(IMAGE_DIRECTORY_ENTRY_IMPORT)
+        if not size:
+            return imports
+
+        descriptor = rva
+        while True:
+            data = self.read(descriptor, IMPORT_DESCRIPTOR.size)
+            if data is None or len(data) < IMPORT_DESCRIPTOR.size:
+                break
+            (lookup_table, _, _, dll_name,
+             address_table) = IMPORT_DESCRIPTOR.unpack(data)
+            if not lookup_table and not address_table:
+                break
+            descriptor += IMPORT_DESCRIPTOR.size
+
+            dll_name = self._read_string(dll_name) or ''
+            module_name = dll_name.rsplit('.', 1)[0]
+
+            # the address table is overwritten by the loader, names are
+            # taken from the lookup table if the file has one
+            table = lookup_table or address_table
+            section = self.section_at(table)
+            if section is None:
+                continue
+            for k, thunk in enumerate(unpack_qwords(
+                    self.read(table, section.end - table))):
+                if not thunk:
+                    break
+                if thunk & IMAGE_ORDINAL_FLAG64:
+                    name = '%s_%d' % (module_name, thunk & 0xFFFF)
+                else:
+                    # skip the hint of IMAGE_IMPORT_BY_NAME
+                    name = self._read_string((thunk & 0x7FFFFFFF) + 2)
+                if name:
+                    imports.append((address_table + k * 8, name))
+
+        imports.sort()
+        return imports
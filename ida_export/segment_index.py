@@ -0,0 +1,137 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import bisect
+from collections import namedtuple
+
+try:
+    from itertools import imap
+except ImportError:
+    imap = map
+
+'''
+Sorted interval index over the segments of a module.
+
+The segments are collected once (from IDA or any other source) and every
+address classification ("which segment", "is accessible", "is text",
+"is vtable section") is answered by a binary search over the segment starts.
+'''
+
+# Segment permissions (same values as IDA's SEGPERM_*).
+SEGPERM_EXEC = 1
+SEGPERM_WRITE = 2
+SEGPERM_READ = 4
+
+Segment = namedtuple('Segment', ['name', 'start', 'end', 'perm'])
+
+
+class SegmentIndex(object):
+    """
+    Non-overlapping segments sorted by start address. Segments are
+    half-open intervals [start, end).
+    """
+
+    def __init__(self, segments, text_section_names=('.text',),
+                 vtable_section_names=()):
+        self.segments = sorted(segments, key=lambda x: x.start)
+        self._starts = [x.start for x in self.segments]
+        self._ends = [x.end for x in self.segments]
+        self.text_section_names = frozenset(text_section_names)
+        self.vtable_section_names = frozenset(vtable_section_names)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    # returns the position of the segment containing addr or -1
+    def _position(self, addr):
+        i = bisect.bisect_right(self._starts, addr) - 1
+        if i >= 0 and addr < self._ends[i]:
+            return i
+        return -1
+
+    def _positions(self, addresses):
+        return list(imap(self._position, addresses))
+
+    # returns the segment containing addr or None
+    def segment_at(self, addr):
+        i = self._position(addr)
+        if i < 0:
+            return None
+        return self.segments[i]
+
+    # returns the segment (or None) for each of the given addresses
+    def segments_at(self, addresses):
+        return [self.segments[i] if i >= 0 else None
+                for i in self._positions(addresses)]
+
+    # returns the first segment with the given name or None
+    def get_segment(self, name):
+        for segment in self.segments:
+            if segment.name == name:
+                return segment
+        return None
+
+    # returns all segments whose name is in names (sorted by address)
+    def get_segments(self, names):
+        return [x for x in self.segments if x.name in names]
+
+    # returns (start, end) of the first segment with the given name
+    # or (0, 0) if there is none
+    def bounds(self, name):
+        segment = self.get_segment(name)
+        if segment is None:
+            return 0, 0
+        return segment.start, segment.end
+
+    # returns a list of (start, end) of all segments whose name is in names
+    def intervals(self, names):
+        return [(x.start, x.end) for x in self.get_segments(names)]
+
+    def is_accessible(self, addr):
+        return self._position(addr) >= 0
+
+    def in_segments(self, addr, names):
+        i = self._position(addr)
+        return i >= 0 and self.segments[i].name in names
+
+    def is_text(self, addr):
+        return self.in_segments(addr, self.text_section_names)
+
+    def is_vtable_section(self, addr):
+        return self.in_segments(addr, self.vtable_section_names)
+
+    def is_executable(self, addr):
+        i = self._position(addr)
+        return i >= 0 and bool(self.segments[i].perm & SEGPERM_EXEC)
+
+    # batched versions, return a bytearray with 1 for every address
+    # that fulfills the condition
+    def accessible_many(self, addresses):
+        return bytearray(i >= 0 for i in self._positions(addresses))
+
+    def in_segments_many(self, addresses, names):
+        segments = self.segments
+        return bytearray(i >= 0 and segments[i].name in names
+                         for i in self._positions(addresses))
+
+    def text_many(self, addresses):
+        return self.in_segments_many(addresses, self.text_section_names)
+
+    def vtable_section_many(self, addresses):
+        return self.in_segments_many(addresses, self.vtable_section_names)
+
+
+# builds the index from the segments of the current IDA database
+def build_ida_segment_index(vtable_section_names=()):
+    from idaapi import getseg
+    from idautils import Segments
+    from idc import SegEnd, SegName, SegStart
+
+    segments = []
+    for ea in Segments():
+        segments.append(Segment(SegName(ea), SegStart(ea), SegEnd(ea),
+                                getseg(ea).perm))
+    return SegmentIndex(segments, vtable_section_names=vtable_section_names)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import bisect
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from functools import partial
+from itertools import compress, repeat
+from operator import add, and_, gt, rshift, sub, xor
+
+try:
+    from itertools import imap
+except ImportError:
+    imap = map
+
+'''
+Vtable location heuristics of the exporter operating on qword buffers.
+
+Nothing in here depends on IDA: the caller supplies the contents of the
+vtable sections as qword sequences and the checks which need further
+knowledge about the module (valid entries, valid RTTI/offset to top,
+references). The IDA exporter and the headless exporters share this code.
+'''
+
+# gives the number of allowed zero entries in the beginning of
+# a vtable candidate
+NUMBER_ALLOWED_ZERO_ENTRIES = 2
+
+# start, end = addresses of the section, qwords = contents of the section
+# (qwords[k] is the qword at start + k*8)
+VTableSection = namedtuple('VTableSection', ['start', 'end', 'qwords'])
+
+
+def _find_qword_typecode():
+    for typecode in ('Q', 'L'):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+QWORD_TYPECODE = _find_qword_typecode()
+
+
+# decodes a little endian byte buffer into a sequence of qwords
+# (an array if the interpreter has a 64 bit array type, a list otherwise)
+def unpack_qwords(data):
+    count = len(data) // 8
+    data = data[:count * 8]
+    if QWORD_TYPECODE is None:
+        return list(struct.unpack('<%dQ' % count, data))
+    qwords = array(QWORD_TYPECODE)
+    if hasattr(qwords, 'frombytes'):
+        qwords.frombytes(data)
+    else:
+        qwords.fromstring(data)
+    if sys.byteorder != 'little':
+        qwords.byteswap()
+    return qwords
+
+
+# returns a sorted copy of the given qwords
+def sorted_qwords(values):
+    if QWORD_TYPECODE is None:
+        return sorted(values)
+    return array(QWORD_TYPECODE, sorted(values))
+
+
+def to_signed64(value):
+    if value & 0x8000000000000000:
+        return value - 0x10000000000000000
+    return value
+
+
+class IntervalTable(object):
+    """
+    Sorted table of half-open intervals [start, end). Overlapping and
+    adjacent intervals are merged, so the table is stored as one flat list
+    of boundaries [start0, end0, start1, end1, ...]. A value lies inside an
+    interval iff the number of boundaries <= value is odd.
+    """
+
+    def __init__(self, intervals):
+        self.boundaries = []
+        for start, end in sorted(x for x in intervals if x[0] < x[1]):
+            if self.boundaries and start <= self.boundaries[-1]:
+                self.boundaries[-1] = max(self.boundaries[-1], end)
+            else:
+                self.boundaries.extend((start, end))
+        self._bisect = partial(bisect.bisect_right, self.boundaries)
+
+        # maps a boundary count to 1 if it is odd
+        self._parity = bytearray(x & 1 for x in range(256))
+
+    def __contains__(self, value):
+        return bisect.bisect_right(self.boundaries, value) & 1 == 1
+
+    # returns a bytearray with mask[k] = 1 iff values[k] is inside the table
+    def contains_many(self, values):
+        if len(self.boundaries) < 256:
+            return bytearray(imap(self._bisect, values)).translate(
+                self._parity)
+        return bytearray(imap(and_, imap(self._bisect, values), repeat(1)))
+
+
+class RelocationIndex(object):
+    """
+    Sorted array of relocation entry addresses (r_offset values).
+    Answers whether an address is a relocation entry by binary search.
+    """
+
+    def __init__(self, offsets=()):
+        self.offsets = sorted_qwords(offsets)
+
+    # builds the index from the raw contents of RELA sections
+    # (Elf64_Rela entries: r_offset, r_info, r_addend)
+    @classmethod
+    def from_rela(cls, rela_datas):
+        offsets = []
+        for data in rela_datas:
+            offsets.extend(unpack_qwords(data)[0::3])
+        return cls(offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __contains__(self, addr):
+        i = bisect.bisect_left(self.offsets, addr)
+        return i < len(self.offsets) and self.offsets[i] == addr
+
+    # returns a bytearray with mask[k] = 1 iff addresses[k] is a
+    # relocation entry
+    def contains_many(self, addresses):
+        return bytearray(imap(self.__contains__, addresses))
+
+    # returns the relocation entries in [start, end)
+    def range(self, start, end):
+        lo = bisect.bisect_left(self.offsets, start)
+        hi = bisect.bisect_left(self.offsets, end)
+        return self.offsets[lo:hi]
+
+
+class EntryClassifier(object):
+    """
+    Decides which qwords can be vtable entries. A qword is a valid entry if it
+    points into one of the pointer intervals (text, extern and plt sections),
+    is the pure virtual function or if it is stored at a relocation entry
+    that does not point into a vtable section (relocated RTTI entries do
+    that).
+    """
+
+    def __init__(self, pointer_intervals, pure_virtual_addr,
+                 relocation_entries, vtable_intervals):
+        intervals = list(pointer_intervals)
+        if pure_virtual_addr is not None:
+            intervals.append((pure_virtual_addr, pure_virtual_addr + 1))
+        self.pointers = IntervalTable(intervals)
+
+        # vtable sections are checked inclusive their end address
+        self.vtable_sections = IntervalTable(
+            (start, end + 1) for start, end in vtable_intervals)
+
+        if not isinstance(relocation_entries, RelocationIndex):
+            relocation_entries = RelocationIndex(relocation_entries)
+        self.relocation_entries = relocation_entries
+
+    # check the given vtable entry is valid
+    def __call__(self, addr, qword):
+        return (qword in self.pointers
+                or (addr in self.relocation_entries
+                    and not qword in self.vtable_sections))
+
+    # returns a mask with mask[k] = 1 iff values[k] stored at addresses[k]
+    # is a valid vtable entry
+    def classify(self, addresses, values):
+        mask = self.pointers.contains_many(values)
+        is_relocation_entry = self.relocation_entries.contains_many(addresses)
+        for k in compress(range(len(mask)), is_relocation_entry):
+            if not mask[k] and not values[k] in self.vtable_sections:
+                mask[k] = 1
+        return mask
+
+    # same as classify for the consecutive qwords of a section
+    # (qwords[k] is stored at start + k*8)
+    def classify_section(self, start, qwords):
+        mask = self.pointers.contains_many(qwords)
+
+        # only visit the relocation entries inside the section
+        end = start + len(qwords) * 8
+        deltas = list(imap(sub, self.relocation_entries.range(start, end),
+                           repeat(start)))
+        if any(imap(and_, deltas, repeat(7))):
+            deltas = [x for x in deltas if not x & 7]
+        positions = list(imap(rshift, deltas, repeat(3)))
+
+        in_vtable_sections = self.vtable_sections.contains_many(
+            imap(qwords.__getitem__, positions))
+        for k in compress(positions,
+                          imap(xor, in_vtable_sections, repeat(1))):
+            mask[k] = 1
+        return mask
+
+
+# returns a dict with key = vtable address and value = offset to top
+#
+# classifier is an EntryClassifier deciding which qwords can be vtable
+# entries, check_rtti_and_offset_to_top(rtti_candidate, ott_candidate, addr)
+# decides if the entry at addr is preceded by valid RTTI and offset to top
+# values.
+def get_vtables_gcc64(vtable_sections, classifier,
+                      check_rtti_and_offset_to_top,
+                      number_allowed_zero_entries=NUMBER_ALLOWED_ZERO_ENTRIES):
+    vtables_offset_to_top = dict()
+
+    for vtable_section in vtable_sections:
+        start = vtable_section.start
+        end = vtable_section.end
+        qwords = vtable_section.qwords
+
+        # classify all qwords of the section at once
+        valid = classifier.classify_section(start, qwords)
+
+        def check_entry_valid(addr, qword):
+            return valid[(addr - start) >> 3]
+
+        i = start
+        qword = 0
+        prevqword = 0
+        pprevqword = 0
+
+        while i <= end - 8:
+
+            pprevqword = prevqword
+            prevqword = qword
+            qword = qwords[(i - start) >> 3]
+
+            # heuristic that we also find vtables that have a zero
+            # entry as first entry (libxul.so has some of them which
+            # are not abstract classes, so we have to find them)
+            is_zero_entry = (qword == 0)
+
+            # Could entry be a valid vtable entry?
+            if check_entry_valid(i, qword):
+
+                # is it preceded by a valid offset to top and rtti entry?
+                if check_rtti_and_offset_to_top(prevqword, pprevqword, i):
+
+                    # extract offset to top value for this vtable
+                    vtables_offset_to_top[i] = to_signed64(pprevqword)
+
+                # skip succeeding function pointers of the vtable
+                while (check_entry_valid(i, qword)
+                    and i < (end - 8)):
+
+                    i += 8
+                    prevqword = qword
+                    qword = qwords[(i - start) >> 3]
+
+            # Allow the first x vtable entries to be a zero entry
+            # and check if it is preceded by a valid
+            # offset to top and RTTI entry
+            elif (is_zero_entry
+                and (i-16) >= start
+                and check_rtti_and_offset_to_top(prevqword, pprevqword, i)):
+
+                for j in range(1, number_allowed_zero_entries+1):
+
+                    # break if we would check outside of the section
+                    if (i+(j*8)) > (end-8):
+                        break
+
+                    nextqword = qwords[(i + j*8 - start) >> 3]
+
+                    # skip if next entry is a zero entry
+                    if nextqword == 0:
+                        continue
+
+                    # if entry is a valid vtable entry add it
+                    if check_entry_valid(i+(j*8), nextqword):
+
+                        # extract offset to top value for this vtable
+                        vtables_offset_to_top[i] = to_signed64(pprevqword)
+
+                    # do not check further if it is an invalid vtable entry
+                    break
+
+            i += 8
+
+    return vtables_offset_to_top
+
+
+# Heuristic to filter out vtable candidates (like wrong candidates
+# because of the allowed 0 entries in the beginning):
+# If vtable + 8 or vtable + 16 is also considered a vtable,
+# check if they have Xrefs => remove candidates if they do not have Xrefs.
+# Same goes for wrongly detected vtables that reside before the actual
+# vtable.
+#
+# Candidates are visited in ascending address order and only neighbours
+# within number_allowed_zero_entries qwords are looked at (found by a sweep
+# over the sorted candidates). has_xrefs(addr) is called at most once per
+# address.
+def filter_vtable_candidates(vtables_offset_to_top, has_xrefs,
+                      number_allowed_zero_entries=NUMBER_ALLOWED_ZERO_ENTRIES):
+    candidates = sorted(vtables_offset_to_top)
+    window = number_allowed_zero_entries * 8
+    xref_cache = dict()
+
+    def is_referenced(addr):
+        if addr not in xref_cache:
+            xref_cache[addr] = bool(has_xrefs(addr))
+        return xref_cache[addr]
+
+    for k, vtable in enumerate(candidates):
+        j = k + 1
+        while j < len(candidates) and candidates[j] <= vtable + window:
+            neighbour = candidates[j]
+            j += 1
+            if ((neighbour - vtable) & 7
+                or neighbour not in vtables_offset_to_top):
+                continue
+
+            if not is_referenced(neighbour):
+                del vtables_offset_to_top[neighbour]
+                continue
+
+            if not is_referenced(vtable):
+                vtables_offset_to_top.pop(vtable, None)
+
+    return vtables_offset_to_top
+
+
+# returns a dict with key = vtable address and value = list of vtable entries
+#
+# Entries inside the given vtable sections are taken from their qwords,
+# read_qword(addr) returns the qword at any other addr (entries may exceed
+# the section the vtable was found in).
+def get_vtable_entries_gcc64(vtables_offset_to_top, vtable_sections,
+                      read_qword, classifier,
+                      number_allowed_zero_entries=NUMBER_ALLOWED_ZERO_ENTRIES):
+    vtable_entries = dict()
+
+    sections = sorted(vtable_sections, key=lambda x: x.start)
+    section_starts = [x.start for x in sections]
+    masks = dict()
+
+    def read_entry(addr):
+        i = bisect.bisect_right(section_starts, addr) - 1
+        if i >= 0 and not (addr - sections[i].start) & 7:
+            section = sections[i]
+            k = (addr - section.start) >> 3
+            if k < len(section.qwords):
+                if i not in masks:
+                    masks[i] = classifier.classify_section(section.start,
+                                                           section.qwords)
+                return section.qwords[k], masks[i][k]
+        qword = read_qword(addr)
+        return qword, classifier(addr, qword)
+
+    # get all vtable entries for each identified vtable
+    for vtable_addr in vtables_offset_to_top.keys():
+
+        curr_addr = vtable_addr
+        curr_qword, curr_valid = read_entry(curr_addr)
+        entry_ctr = 0
+        vtable_entries[vtable_addr] = list()
+
+        # get all valid entries and add them as vtable entry
+        # (ignore the first x zero entries)
+        while (curr_valid
+            or (entry_ctr < number_allowed_zero_entries and curr_qword == 0)):
+
+            vtable_entries[vtable_addr].append(curr_qword)
+
+            curr_addr += 8
+            entry_ctr += 1
+            curr_qword, curr_valid = read_entry(curr_addr)
+
+    return vtable_entries
+
+
+# returns a dict with key = vtable address and value = offset to top
+# for modules compiled by MSVC (x64, RTTI enabled)
+#
+# A vtable starts with the first valid entry following an invalid one if the
+# qword in front of it (the RTTI pointer) points into a vtable section but
+# not into text and the offset of the complete object locator it points to
+# is a valid offset to top. text_intervals are the (start, end) tuples of the
+# text sections, read_dwords(addresses) returns the dword at each address
+# (None if it is not accessible). All RTTI pointers of a section are
+# validated at once.
+def get_vtables_msvc64(vtable_sections, classifier, text_intervals,
+                       read_dwords):
+    vtables_offset_to_top = dict()
+
+    vtable_intervals = IntervalTable((x.start, x.end) for x in vtable_sections)
+    text = IntervalTable(text_intervals)
+
+    for vtable_section in vtable_sections:
+        start = vtable_section.start
+        qwords = vtable_section.qwords
+
+        # classify all qwords of the section at once
+        valid = classifier.classify_section(start, qwords)
+
+        # the succeeding function pointers of a vtable are skipped, so only
+        # the first entry of each run of valid entries is a candidate
+        positions = list(compress(range(1, len(qwords)),
+                                  imap(gt, valid[1:], valid[:-1])))
+
+        # rtti pointer points to this structure
+        #
+        # http://blog.quarkslab.com/visual-c-rtti-inspection.html
+        #typedef const struct _s__RTTICompleteObjectLocator {
+        #  unsigned long signature;
+        #  unsigned long offset;
+        #  unsigned long cdOffset;
+        #  _TypeDescriptor *pTypeDescriptor;
+        #  __RTTIClassHierarchyDescriptor *pClassDescriptor;
+        #} __RTTICompleteObjectLocator;
+        rtti_candidates = [qwords[k - 1] for k in positions]
+        rtti_valid = list(imap(gt,
+                               vtable_intervals.contains_many(rtti_candidates),
+                               text.contains_many(rtti_candidates)))
+        positions = list(compress(positions, rtti_valid))
+        rtti_candidates = list(compress(rtti_candidates, rtti_valid))
+
+        ott_candidates = read_dwords(list(imap(add, rtti_candidates,
+                                               repeat(4))))
+        for k, ott_candidate in zip(positions, ott_candidates):
+            if ott_candidate is None or ott_candidate > 0xffffff:
+                continue
+
+            # Offset To Top is stored as a positive value and not
+            # as negative one like gcc does
+            # => we assume negative values.
+            vtables_offset_to_top[start + k*8] = -ott_candidate
+
+    return vtables_offset_to_top
+
+
+# returns a dict with key = vtable address and value = list of vtable entries
+# (same as get_vtable_entries_gcc64, MSVC vtables do not start with zero
+# entries)
+def get_vtable_entries_msvc64(vtables_offset_to_top, vtable_sections,
+                              read_qword, classifier):
+    return get_vtable_entries_gcc64(vtables_offset_to_top, vtable_sections,
+                                    read_qword, classifier, 0)
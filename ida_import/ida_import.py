@@ -1,17 +1,26 @@
 
+import argparse
 import marx
 import os
 import re
+import time
+import write_plan
 from sys import stdout
 
 # IDA imports
-from idaapi import add_dref, dr_O, Form
-from idc import MakeComm, MakeQword, Comment
-# from idautils import DataRefsFrom
+import idc
+from idaapi import add_dref, del_dref, dr_O, Form, hide_wait_box, netnode, replace_wait_box, show_wait_box, wasBreak
+from idc import MakeComm, MakeQword, Comment, GetFlags, GetIdbPath, isQwrd
+from idautils import DataRefsFrom
 # from idautils import Modules as ida_Modules
 
-# Number of bytes of an address
-WORD_BYTE_COUNT = 8
+# Seconds spent applying writes between two progress updates (and checks for cancellation)
+APPLY_TIME_BUDGET = 0.2
+# Number of addresses written between two checks of the time
+APPLY_CHECK_INTERVAL = 64
+
+# Netnode holding the token of the last import, matching the token of its applied import file
+APPLIED_NODE_NAME = "$ marx import"
 
 
 class MarxIDAImportForm(Form):
@@ -23,99 +32,106 @@ class MarxIDAImportForm(Form):
 <#Select a vcalls file to open#       Vcalls File:{iVcallFileOpen}>
 <#Select a Vtables file to open#      Vtables File:{iVTablesFileOpen}>
 Class hierarchies <Allow hierarchies with only one class:{rAllowSingleClassHierarchies}>{cHierarchies}>
+
+Filters (empty or 0: import everything)
+<#Only import vtables, new operators and vcalls in these ranges (hex), e.g. 401000-4a0000#Address Ranges:{iAddressRanges}>
+<#Only import these class hierarchies, e.g. 3,10-12#   Hierarchies:{iHierarchyNumbers}>
+<#Skip class hierarchies with fewer vtables#Min. Hierarchy Size:{iMinHierarchySize}>
+<#Skip class hierarchies with more vtables#Max. Hierarchy Size:{iMaxHierarchySize}>
+<#Skip vcalls with more target functions#Max. Vcall Targets:{iMaxVcallTargets}>
 """, {
             'iHierarchyFileOpen': Form.FileInput(open=True, value="*.hierarchy"),
             'iNewOpFileOpen': Form.FileInput(open=True, value="*.new_operators"),
             'iVcallFileOpen': Form.FileInput(open=True, value="*.vcalls_extended"),
             'iVTablesFileOpen': Form.FileInput(open=True, value="*_vtables.txt"),
-            'cHierarchies': Form.ChkGroupControl(("rAllowSingleClassHierarchies",))
+            'cHierarchies': Form.ChkGroupControl(("rAllowSingleClassHierarchies",)),
+            'iAddressRanges': Form.StringInput(swidth=40),
+            'iHierarchyNumbers': Form.StringInput(swidth=40),
+            'iMinHierarchySize': Form.NumericInput(tp=Form.FT_DEC),
+            'iMaxHierarchySize': Form.NumericInput(tp=Form.FT_DEC),
+            'iMaxVcallTargets': Form.NumericInput(tp=Form.FT_DEC)
         })
 
 
-def vtable_hierarchy_to_ida_db(marx_module):
-    for hierarchy in marx_module.class_hierarchies:
-        for vtable in hierarchy.vtables:
-            new_comment = "Begin of vtable - Class_{:X}, part of ClassHierarchy_{:d}".format(vtable.address, hierarchy.number)
-            comment = Comment(vtable.address) or ""
-            # Check if there is already a comment (with the same content)
-            if new_comment not in comment:
-                MakeComm(vtable.address, new_comment + comment)
-            MakeQword(vtable.address)
-
-
-def new_operators_to_ida_db(marx_module):
-    for new_op in marx_module.new_operators.itervalues():
-        comment = Comment(new_op.address)
-        if new_op.class_hierarchy:
-            # Check if there is already a comment, do nothing if there is already a comment
-            if not comment:
-                MakeComm(new_op.address,
-                         "New operator - Size: {:d}, ".format(new_op.size) +
-                         "ClassHierarchy_{:d}".format(
-                         new_op.class_hierarchy.number))
-
-            # For each vtable of an object which could be constructed by this new operator
-            for vtable in new_op.class_hierarchy.vtables:
-                # Add references from new operator address to vtable address
-                add_dref(new_op.address, vtable.address, dr_O)
+# Applies the writes of a record (see WritePlan.record) to an address and undoes the writes of the last import
+# (applied_entry, see write_plan.load_applied, None if the last import did not write to the address) which are not
+# part of the record anymore. Comments which were edited since the last import are kept. Returns the new applied
+# entry of the address
+def apply_record(address, record, applied_entry):
+    define_qword, comment_writes, dref_to_addresses = record
+    if define_qword and not isQwrd(GetFlags(address)):
+        MakeQword(address)
+
+    base_comment = comment = new_comment = None
+    if comment_writes or applied_entry:
+        comment = Comment(address)
+        # Replace the comment of the last import if it was not edited since
+        if applied_entry and comment == applied_entry[2]:
+            base_comment = applied_entry[1]
         else:
-            # Check if there is already a comment, do nothing if there is already a comment
-            if not comment:
-                MakeComm(new_op.address, "New operator - Size: {:d}, no class info available".format(new_op.size))
-
-
-def vcalls_extended_to_ida_db(marx_module):
-    target_addresses = set()
-    for vcall in marx_module.vcalls.itervalues():
-        comment = Comment(vcall.address)
-        if vcall.class_hierarchy:
-            # For each vtable of an object which is possible at this vcall
-            for vtable in vcall.class_hierarchy.vtables:
-
-                # Add reference from vcall address to target function address (resolves icall)
-                target_function = vtable.functions.get(vcall.index, None)
-                if target_function:
-                    add_dref(vcall.address, target_function.address, dr_O)
-                    target_addresses.add(target_function.address)
-
-            # Check if there is already a comment, do nothing if there is already a comment
-            if not comment:
-                MakeComm(vcall.address,
-                         "Vcall - vtable index: {:d}, ".format(vcall.index) + 
-                         "ClassHierarchy_{:d}\n".format(
-                         vcall.class_hierarchy.number) +
-                         "\n".join(
-                         map(lambda target_address: "Possible target: 0x{:X}".format(target_address), target_addresses)))
-                target_addresses.clear()
-
+            base_comment = comment
+        new_comment = write_plan.resolve_comment(base_comment, comment_writes)
+        if new_comment != comment:
+            MakeComm(address, new_comment or "")
+
+    added_dref_to_addresses = set(applied_entry[3]) if applied_entry else set()
+    if dref_to_addresses or added_dref_to_addresses:
+        existing_dref_to_addresses = set(DataRefsFrom(address))
+        for to_address in added_dref_to_addresses.difference(dref_to_addresses):
+            if to_address in existing_dref_to_addresses:
+                del_dref(address, to_address)
+        added_dref_to_addresses.intersection_update(dref_to_addresses)
+        for to_address in dref_to_addresses:
+            if to_address not in existing_dref_to_addresses:
+                add_dref(address, to_address, dr_O)
+                added_dref_to_addresses.add(to_address)
+
+    return record, base_comment, new_comment, tuple(sorted(added_dref_to_addresses))
+
+
+# Applies the changes of the write plan (list of (address, record, applied_entry) tuples, see WritePlan.diff) to
+# the database and records them in applied ({address: applied_entry}). Writes which would not change the database
+# (existing qwords, comments and data references) are skipped. Generator yielding the number of processed
+# addresses whenever time_budget seconds have passed since the last yield (and at the end), so the caller can
+# update the UI and stop the import between two chunks
+def apply_plan(changes, applied, time_budget=APPLY_TIME_BUDGET):
+    processed = reported = 0
+    chunk_end = time.time() + time_budget
+    for address, record, applied_entry in changes:
+        applied_entry = apply_record(address, record, applied_entry)
+        if record == write_plan.EMPTY_RECORD:
+            applied.pop(address, None)
         else:
-            # Check if there is already a comment, do nothing if there is already a comment
-            if not comment:
-                MakeComm(vcall.address, "Vcall - vtable index: {:d}, no class info available".format(vcall.index))
-
+            applied[address] = applied_entry
 
-def vtables_to_ida_db(marx_module):
-    for vtable in marx_module.vtables.itervalues():
-        vtable_entry_address = 0
-        for index, target_function in vtable.functions.iteritems():
-            vtable_entry_address = vtable.address + (index * WORD_BYTE_COUNT)
-            MakeQword(vtable_entry_address)
+        processed += 1
+        if processed % APPLY_CHECK_INTERVAL == 0 and time.time() >= chunk_end:
+            yield processed
+            reported = processed
+            chunk_end = time.time() + time_budget
+    if processed != reported:
+        yield processed
 
-            if target_function.address:
-                # Add reference from vtable entry address to target function address
-                add_dref(vtable_entry_address, target_function.address, dr_O)
-            # else:
-            #     MakeComm("Unknown target function.")
 
-        # Add comment at the end of the vtable
-        if vtable_entry_address and vtable.class_hierarchy:
-            MakeComm(vtable_entry_address,
-                     "End of vtable - Class_{:X}, ".format(vtable.address) +
-                     "part of ClassHierarchy_{:d}".format(
-                     vtable.class_hierarchy.number))
+# Returns the progress message of the import, with rate (addresses per second) and estimated remaining time
+def format_progress(processed, total, elapsed):
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    eta = "{:d}:{:02d}".format(*divmod(int((total - processed) / rate), 60)) if rate else "?"
+    return "Applying Marx results: {:d} of {:d} addresses ({:.0f}/s, {:s} remaining)".format(processed, total,
+                                                                                           rate, eta)
 
 
 def ida_main():
+    # Arguments passed to the script (idaq -S"ida_import.py --plan-only"), with --plan-only the write plan is written
+    # to a file instead of being applied to the database
+    parser = argparse.ArgumentParser(prog="ida_import.py")
+    parser.add_argument("--plan-only", dest="plan_only", action="store_true",
+                        help="writes the plan to a .plan file next to the Marx files, leaves the database as is")
+    parser.add_argument("--plan-file", dest="plan_file", help="file to write the plan to (with --plan-only)")
+    parser.add_argument("--full", action="store_true",
+                        help="applies all writes, not only the ones which changed since the last import")
+    args = parser.parse_args(getattr(idc, "ARGV", [])[1:])
+
     # # Get IDA's module representation
     # ida_modules_dict = {module.name : module for module in ida_Modules()}
 
@@ -131,47 +147,86 @@ def ida_main():
         new_operators_file_path = form.iNewOpFileOpen.value
         vcalls_extended_file_path = form.iVcallFileOpen.value
         vtables_file_path = form.iVTablesFileOpen.value
-        marx_module = None
 
-        try:
-            # Parsing hierarchy file
-            with open(hierarchy_file_path, "r") as f:
-                marx_module = marx.parse_hierarchy(f)
-        except IOError:
-            print "Could not open hierarchy file: {:s}".format(hierarchy_file_path)
+        # Toggle allow_false_positives (before parsing, the parsers and the model cache depend on it)
+        marx.allow_single_class_hierarchies = bool(form.cHierarchies.value)
 
+        paths = []
+        for kind, path in zip(marx.MARX_FILE_KINDS, (hierarchy_file_path, new_operators_file_path,
+                                                     vcalls_extended_file_path, vtables_file_path)):
+            if os.path.isfile(path):
+                paths.append((kind, path))
+            else:
+                print "Could not open {:s} file: {:s}".format(kind, path)
+        if not paths:
+            return
+
+        # Records excluded by the filters are skipped while parsing
         try:
-            # Parsing new_operators file
-            with open(new_operators_file_path, "r") as f:
-                marx_module = marx.parse_new_operators(f)
-        except IOError:
-            print "Could not open new_operators file: {:s}".format(new_operators_file_path)
-
+            import_filter = marx.ImportFilter(marx.parse_address_ranges(form.iAddressRanges.value),
+                                              marx.parse_numbers(form.iHierarchyNumbers.value),
+                                              form.iMinHierarchySize.value or None,
+                                              form.iMaxHierarchySize.value or None,
+                                              form.iMaxVcallTargets.value or None) or None
+        except ValueError as e:
+            print "Invalid filter: {:s}".format(e)
+            return
+
+        # Results of earlier imports are not mixed into this one, the parsed model is cached next to the files
+        cache_path = marx.default_cache_path(paths)
         try:
-            # Parsing vcalls_extended file
-            with open(vcalls_extended_file_path, "r") as f:
-                marx_module = marx.parse_vcalls_extended(f)
-        except IOError:
-            print "Could not open vcalls_extended file: {:s}".format(vcalls_extended_file_path)
-
+            _, marx_module, cached = marx.parse_files(paths, cache_path, import_filter=import_filter)
+        except IOError as e:
+            print "Could not open file: {:s}".format(e.filename or str(e))
+            return
+        if cached:
+            print "Loaded parsed Marx results from {:s}".format(cache_path)
+
+        # Compute all writes before touching the database
+        plan = write_plan.plan_module(marx_module)
+        print "Planned {:d} writes at {:d} addresses ({:d} requested)".format(len(plan), len(plan.addresses()),
+                                                                            plan.requested)
+
+        if args.plan_only:
+            plan_path = args.plan_file or os.path.splitext(paths[0][1])[0] + ".plan"
+            with open(plan_path, "w") as f:
+                plan.dump(f)
+            print "Wrote plan to {:s}".format(plan_path)
+            return
+
+        # Only apply what changed since the last import into this database
+        applied_path = write_plan.default_applied_path(GetIdbPath())
+        node = netnode(APPLIED_NODE_NAME, 0, True)
+        applied = write_plan.load_applied(applied_path, node.supval(0))
+        changes = list(plan.diff(applied, changed_only=not args.full))
+        print "{:d} addresses changed since the last import".format(len(changes))
+
+        # Apply the changes in chunks, the results of a cancelled import are kept and the next import continues
+        # from there (the addresses which were already applied are not changed anymore)
+        processed = 0
+        cancelled = False
+        start = time.time()
+        show_wait_box(format_progress(0, len(changes), 0))
         try:
-            # Parsing vtables file
-            with open(vtables_file_path, "r") as f:
-                marx_module = marx.parse_vtables(f)
-        except IOError:
-            print "Could not open vtables file: {:s}".format(vtables_file_path)
-
-        # Toggle allow_false_positives
-        marx.allow_single_class_hierarchies = bool(form.cHierarchies.value)
-
-        # Add comments to vtables
-        vtable_hierarchy_to_ida_db(marx_module)
-        # Add data references and comments to new operators
-        new_operators_to_ida_db(marx_module)
-        # Add data references and comments to vcalls and vtables
-        vcalls_extended_to_ida_db(marx_module)
-        # Add data references to vtables
-        vtables_to_ida_db(marx_module)
+            for processed in apply_plan(changes, applied):
+                replace_wait_box(format_progress(processed, len(changes), time.time() - start))
+                if wasBreak():
+                    cancelled = True
+                    break
+        finally:
+            hide_wait_box()
+
+            # The token in the database tells whether the applied import file belongs to the saved database
+            token = os.urandom(8).encode("hex")
+            node.supset(0, token)
+            if not write_plan.save_applied(applied_path, token, applied):
+                print "Could not write {:s}, the next import applies all writes".format(applied_path)
+
+        if cancelled:
+            print "Import cancelled after {:d} of {:d} addresses, run the script again to continue".format(
+                processed, len(changes))
+        else:
+            print "Applied the plan to {:d} addresses in {:.1f}s".format(processed, time.time() - start)
 
 
 ida_main()
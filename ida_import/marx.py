@@ -1,35 +1,151 @@
 
 import argparse
+import gc
+import hashlib
+import marshal
+import mmap
+import os
+import sqlite3
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from itertools import izip
+from contextlib import contextmanager
+from cStringIO import StringIO
+from itertools import chain, compress, count, imap, izip
+from operator import not_
 from sys import stdout
 
 # Toggle if parsing new operators or vcall extended files can create new class hierarchies
 allow_single_class_hierarchies = False
 
+# Number of bytes read at once by the parsers
+PARSER_CHUNK_SIZE = 1 << 22
 
-class Multiton(type):
+# Kinds of Marx output files in the order they are parsed, a kind names the Session.parse_{kind} method
+MARX_FILE_KINDS = ("hierarchy", "new_operators", "vcalls_extended", "vtables")
+
+# Version of the model cache format, caches written by other versions are rebuilt
+MODEL_CACHE_VERSION = 1
+# Extension of the model cache written next to the Marx output files
+MODEL_CACHE_EXTENSION = ".model_cache"
+# Number of bytes hashed at once when fingerprinting Marx output files
+HASH_CHUNK_SIZE = 1 << 20
+
+# Version of the persisted line index of IndexedMarxFile, indexes written by other versions are rebuilt
+INDEX_VERSION = 1
+# Extension of the persisted line index written next to a Marx output file
+INDEX_EXTENSION = ".index"
+
+# Suffixes of the Marx output files imported by ResultStore and the kind of each file
+STORE_FILE_SUFFIXES = ((".hierarchy", "hierarchy"),
+                       (".new_operators", "new_operators"),
+                       (".vcalls", "vcalls"),
+                       (".vcalls_extended", "vcalls_extended"),
+                       (".vtableupdates", "vtable_updates"),
+                       (".vtv_vcalls", "vtv_vcalls"),
+                       ("_vtables.txt", "vtables"))
+
+
+def _find_qword_typecode():
+    for typecode in ("Q", "L"):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+# Next wider array type for values which do not fit into an array (None: fall back to a list)
+_WIDER_TYPECODE = {"H": "I", "I": _find_qword_typecode()}
+
+
+def _typed_array(typecode, values):
+    """
+    Creates an array of the given type containing values, or of the next wider array type (or a list if there
+    is none) if the values do not fit into it.
+    :param typecode: preferred array type
+    :param values: iterable of integers (iterators are read into a list first, a failed attempt would use them up)
+    :return: the array
+    """
+    if not hasattr(values, "__len__"):
+        values = list(values)
+    while typecode:
+        try:
+            return array(typecode, values)
+        except OverflowError:
+            typecode = _WIDER_TYPECODE.get(typecode)
+    return list(values)
+
+
+def _widen(values):
     """
-    Metaclass which implements an object registry. Every class of this meta type contains a dict object
-    which associates each object of such a class with the object that is passed first to its init method.
-    That first object is used as primary key to distinguish between two instances of such a class and
-    prevent the exist of two instances bound to the same key (in other words each instance associated
-    with a specific key exists only once).
+    Copies the given array into the next wider array type (or a list if there is none).
+    :param values: array whose type is too small for a new value
+    :return: the copy
     """
-    def __init__(cls, name, bases, dct):
-        super(Multiton, cls).__init__(name, bases, dct)
-        cls._instances = {}
+    return _typed_array(_WIDER_TYPECODE.get(values.typecode), values)
+
 
-    def __call__(cls, *args, **kw):
-        if args[0] not in cls._instances:
-            cls._instances[args[0]] = super(Multiton, cls).__call__(*args)
-        return cls._instances[args[0]]
+def _typecode(values):
+    """
+    :param values: array or list
+    :return: the type of the array or None if values is a list
+    """
+    return getattr(values, "typecode", None)
 
-    def __getitem__(self, key):
-        return self(key)
 
-    def __delitem__(self, key):
-        self._instances.__delitem__(key)
+class DisjointSet(object):
+    """
+    Disjoint-set forest (union by rank, path compression) over hashable objects. Objects which were never
+    passed to union form a set of their own.
+    """
+
+    def __init__(self):
+        self._parents = {}
+        self._ranks = {}
+
+    def find(self, item):
+        """
+        :param item: any object
+        :return: the representative of the set containing item
+        """
+        root = item
+        while root in self._parents:
+            root = self._parents[root]
+        # Path compression
+        while item is not root:
+            parent = self._parents[item]
+            self._parents[item] = root
+            item = parent
+        return root
+
+    def union(self, item, other_item):
+        """
+        Joins the sets containing the given objects.
+        :return: the representative of the joined set
+        """
+        root, other_root = self.find(item), self.find(other_item)
+        if root is other_root:
+            return root
+        rank, other_rank = self._ranks.get(root, 0), self._ranks.get(other_root, 0)
+        if rank < other_rank:
+            root, other_root = other_root, root
+        elif rank == other_rank:
+            self._ranks[root] = rank + 1
+        self._parents[other_root] = root
+        return root
+
+    def sets(self):
+        """
+        :return: list of the sets (as lists) with more than one object
+        """
+        sets = defaultdict(list)
+        for item in self._parents.keys():
+            sets[self.find(item)].append(item)
+        for root, items in sets.iteritems():
+            items.append(root)
+        return sets.values()
 
 
 class PatchedDefaultDict(defaultdict):
@@ -49,10 +165,12 @@ class PatchedDefaultDict(defaultdict):
 
 
 class Module(object):
-    __metaclass__ = Multiton
-
-    def __init__(self, name):
+    def __init__(self, name, session):
         self.name = name
+        self.session = session
+        # Interned module id (position in session.modules_by_id)
+        self.id = len(session.modules_by_id)
+        session.modules_by_id.append(self)
         self.vtables = PatchedDefaultDict(lambda address: VTable(address, self))  # {vtable_address: vtable_object}
         self.class_hierarchies = []
 
@@ -64,15 +182,16 @@ class Module(object):
 
 
 class ClassHierarchy(object):
-    _hierarchy_count = 0
+    __slots__ = ("vtables", "number")
 
-    def __init__(self, vtables=None):
+    def __init__(self, number, vtables=None):
         self.vtables = vtables if vtables else []
-        self.number = ClassHierarchy._hierarchy_count
-        ClassHierarchy._hierarchy_count += 1
+        self.number = number
 
 
 class Addressable(object):
+    __slots__ = ("address", "module")
+
     def __init__(self, address, marx_module):
         self.address = address
         self.module = marx_module
@@ -81,15 +200,153 @@ class Addressable(object):
         return str.format("{:s}:{:x}", self.module.name, self.address)
 
 
+class VTableFunctions(object):
+    """
+    Entries of a vtable, behaves like the dict {index: addressable_object} it replaces. The entries are stored
+    in two typed arrays indexed by the vtable slot (target address and interned module id) instead of one
+    Addressable object per entry, the Addressable objects are created on access.
+    """
+    __slots__ = ("_addresses", "_module_ids", "_modules")
+
+    def __init__(self, modules_by_id):
+        self._addresses = array("I")
+        self._module_ids = array("H")
+        self._modules = modules_by_id
+
+    def __len__(self):
+        return len(self._module_ids) - self._module_ids.count(0)
+
+    def __contains__(self, index):
+        return 0 <= index < len(self._module_ids) and self._module_ids[index] != 0
+
+    def __getitem__(self, index):
+        if index not in self:
+            raise KeyError(index)
+        return Addressable(self._addresses[index], self._modules[self._module_ids[index]])
+
+    def __setitem__(self, index, addressable):
+        self.set(index, addressable.address, addressable.module)
+
+    def __delitem__(self, index):
+        if index not in self:
+            raise KeyError(index)
+        self._addresses[index] = 0
+        self._module_ids[index] = 0
+
+    def __iter__(self):
+        return compress(count(), self._module_ids)
+
+    def set(self, index, address, marx_module):
+        """
+        Sets the entry at the given index without creating an Addressable object.
+        :param index: vtable slot of the entry
+        :param address: target address of the entry
+        :param marx_module: module the target address belongs to
+        """
+        if index < 0:
+            raise KeyError(index)
+        if index >= len(self._module_ids):
+            missing = index + 1 - len(self._module_ids)
+            self._addresses.extend([0] * missing)
+            self._module_ids.extend([0] * missing)
+        try:
+            self._addresses[index] = address
+        except OverflowError:
+            self._addresses = _widen(self._addresses)
+            self._addresses[index] = address
+        try:
+            self._module_ids[index] = marx_module.id
+        except OverflowError:
+            self._module_ids = _widen(self._module_ids)
+            self._module_ids[index] = marx_module.id
+
+    def has_empty(self, count):
+        """
+        :param count: number of entries to check
+        :return: True if one of the entries at the indices 0 to count - 1 is empty
+        """
+        return count > len(self._module_ids) or 0 in self._module_ids[:count]
+
+    def fill(self, addresses, marx_module):
+        """
+        Sets the empty entries at the indices 0 to len(addresses) - 1 to the given target addresses.
+        :param addresses: list of target addresses ordered by vtable slot
+        :param marx_module: module the target addresses belong to
+        """
+        # Arrays wide enough for the new values
+        addresses = _typed_array(_typecode(self._addresses), addresses)
+        module_id = _typed_array(_typecode(self._module_ids), [marx_module.id])
+        if _typecode(addresses) != _typecode(self._addresses):
+            self._addresses = _typed_array(_typecode(addresses), self._addresses)
+        if _typecode(module_id) != _typecode(self._module_ids):
+            self._module_ids = _typed_array(_typecode(module_id), self._module_ids)
+        module_id = module_id[0]
+
+        missing = len(addresses) - len(self._module_ids)
+        if missing > 0:
+            self._addresses.extend(addresses[-missing:])
+            self._module_ids.extend([module_id] * missing)
+
+        # Entries which are set already are kept
+        for index in compress(xrange(len(addresses)), imap(not_, self._module_ids)):
+            self._addresses[index] = addresses[index]
+            self._module_ids[index] = module_id
+
+    def get(self, index, default=None):
+        return self[index] if index in self else default
+
+    def target(self, index):
+        """
+        :param index: vtable slot
+        :return: (target_address, module_object) of the entry at the given index, None if there is no entry
+        """
+        if 0 <= index < len(self._module_ids):
+            module_id = self._module_ids[index]
+            if module_id:
+                return self._addresses[index], self._modules[module_id]
+        return None
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        for index in self:
+            yield Addressable(self._addresses[index], self._modules[self._module_ids[index]])
+
+    def iteritems(self):
+        for index in self:
+            yield index, Addressable(self._addresses[index], self._modules[self._module_ids[index]])
+
+    def iterentries(self):
+        """
+        :return: generator of (index, target_address, module_object) tuples, without creating Addressable objects
+        """
+        for index in self:
+            yield index, self._addresses[index], self._modules[self._module_ids[index]]
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+
 class VTable(Addressable):
+    __slots__ = ("class_hierarchy", "offset_to_top", "functions")
+
     def __init__(self, address, marx_module):
         super(VTable, self).__init__(address, marx_module)
         self.class_hierarchy = None
         self.offset_to_top = 0
-        self.functions = {}  # {index: addressable_object}
+        self.functions = VTableFunctions(marx_module.session.modules_by_id)  # {index: addressable_object}
 
 
 class NewOperator(Addressable):
+    __slots__ = ("size", "class_hierarchy")
+
     def __init__(self, address, marx_module, size):
         super(NewOperator, self).__init__(address, marx_module)
         self.size = size
@@ -97,211 +354,1697 @@ class NewOperator(Addressable):
 
 
 class VCall(Addressable):
+    __slots__ = ("index", "class_hierarchy")
+
     def __init__(self, address, marx_module, index):
         super(VCall, self).__init__(address, marx_module)
         self.index = index
         self.class_hierarchy = None
 
 
-def parse_hierarchy(f):
+def parse_address_ranges(text):
     """
-    Parse a given file f and constructs or extend a representation of the module specified in f, this
-    involves vtables, vtable hierarchies and associated modules found in that module. This function could
-    only  process files which contain the same output format as produced by Marx's VTableHierarchies::export_hierarchy
-    function.
-    :param f: output file of VTableHierarchies::export_hierarchy function
-    :return: the object representing the module specified in f
+    Parses address ranges like "401000-4a0000, 510000-520000" (hexadecimal, the end is exclusive).
+    :param text: comma separated address ranges
+    :return: list of (start, end) tuples
+    :raises ValueError: if a range is malformed or empty
+    """
+    address_ranges = []
+    for token in text.replace(",", " ").split():
+        start, separator, end = token.partition("-")
+        if not separator:
+            raise ValueError("Address range without end: {:s}".format(token))
+        address_range = (int(start, 16), int(end, 16))
+        if address_range[0] >= address_range[1]:
+            raise ValueError("Empty address range: {:s}".format(token))
+        address_ranges.append(address_range)
+    return address_ranges
+
+
+def parse_numbers(text):
+    """
+    Parses numbers and inclusive ranges of numbers like "3, 10-12" (decimal).
+    :param text: comma separated numbers and ranges
+    :return: list of numbers
+    :raises ValueError: if a number or a range is malformed
+    """
+    numbers = []
+    for token in text.replace(",", " ").split():
+        first, separator, last = token.partition("-")
+        numbers.extend(xrange(int(first), int(last) + 1) if separator else (int(first),))
+    return numbers
+
+
+class ImportFilter(object):
+    """
+    Restricts which records are parsed into a session. Records which are excluded are skipped while parsing,
+    so they are never built. Class hierarchies are always built (their numbers and sizes are only known after
+    merging), but excluded ones are not listed in the class hierarchies of their module once all files are
+    parsed (see Session.filter_class_hierarchies). Records are checked against the class hierarchies merged so
+    far, so .hierarchy files have to be parsed before the other files.
+    """
+
+    def __init__(self, address_ranges=(), hierarchy_numbers=(), min_hierarchy_size=None,
+                 max_hierarchy_size=None, max_vcall_targets=None):
+        """
+        :param address_ranges: list of (start, end) tuples, vtables, new operators and vcalls outside of these
+                               ranges are excluded (nothing is excluded if empty)
+        :param hierarchy_numbers: numbers of the class hierarchies to include (all if empty)
+        :param min_hierarchy_size: minimum number of vtables of an included class hierarchy
+        :param max_hierarchy_size: maximum number of vtables of an included class hierarchy
+        :param max_vcall_targets: maximum number of distinct target functions of an included vcall
+        """
+        # Overlapping and adjacent ranges are joined, so a single bisection finds the range of an address
+        self._starts = []
+        self._ends = []
+        for start, end in sorted(address_ranges):
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+        self.hierarchy_numbers = frozenset(hierarchy_numbers)
+        self.min_hierarchy_size = min_hierarchy_size
+        self.max_hierarchy_size = max_hierarchy_size
+        self.max_vcall_targets = max_vcall_targets
+        self.filters_hierarchies = bool(self.hierarchy_numbers or min_hierarchy_size is not None or
+                                        max_hierarchy_size is not None)
+
+    def __nonzero__(self):
+        return bool(self._starts or self.filters_hierarchies or self.max_vcall_targets is not None)
+
+    @property
+    def address_ranges(self):
+        return zip(self._starts, self._ends)
+
+    def key(self):
+        """
+        :return: tuple of builtin types identifying the filter (part of the model cache settings)
+        """
+        return (self.address_ranges, sorted(self.hierarchy_numbers), self.min_hierarchy_size,
+                self.max_hierarchy_size, self.max_vcall_targets)
+
+    def includes_address(self, address):
+        if not self._starts:
+            return True
+        position = bisect_right(self._starts, address) - 1
+        return position >= 0 and address < self._ends[position]
+
+    def includes_hierarchy(self, class_hierarchy):
+        """
+        :param class_hierarchy: class hierarchy or None
+        :return: True if the class hierarchy is included, None is only included if no class hierarchy is
+                 filtered
+        """
+        if class_hierarchy is None:
+            return not self.filters_hierarchies
+        size = len(class_hierarchy.vtables)
+        return ((not self.hierarchy_numbers or class_hierarchy.number in self.hierarchy_numbers) and
+                (self.min_hierarchy_size is None or size >= self.min_hierarchy_size) and
+                (self.max_hierarchy_size is None or size <= self.max_hierarchy_size))
+
+    def includes_vtable(self, address, vtable):
+        """
+        :param address: address of the vtable
+        :param vtable: the vtable object, None if it was not created yet (not part of a class hierarchy)
+        """
+        return self.includes_address(address) and self.includes_hierarchy(vtable and vtable.class_hierarchy)
+
+    def includes_target_count(self, target_count):
+        return self.max_vcall_targets is None or target_count <= self.max_vcall_targets
+
+
+def add_import_filter_arguments(parser):
+    """
+    Adds the arguments of an import filter to a command line parser, see import_filter_from_args.
+    :param parser: argparse.ArgumentParser
     """
-    marx_module = Module(f.readline().strip())
+    parser.add_argument("--address_ranges", type=parse_address_ranges, default=[],
+                        help="only parses vtables, new operators and vcalls in these address ranges "
+                             "(e.g. 401000-4a0000,510000-520000)")
+    parser.add_argument("--hierarchies", type=parse_numbers, default=[],
+                        help="only parses these class hierarchies (e.g. 3,10-12)")
+    parser.add_argument("--min_hierarchy_size", type=int, help="skips class hierarchies with fewer vtables")
+    parser.add_argument("--max_hierarchy_size", type=int, help="skips class hierarchies with more vtables")
+    parser.add_argument("--max_vcall_targets", type=int, help="skips vcalls with more target functions")
 
-    vtables = []
-    for line in f:
-        for token in line.split():
+
+def import_filter_from_args(args):
+    """
+    :param args: arguments parsed by a parser set up by add_import_filter_arguments
+    :return: the ImportFilter, None if no filter was given
+    """
+    return ImportFilter(args.address_ranges, args.hierarchies, args.min_hierarchy_size, args.max_hierarchy_size,
+                        args.max_vcall_targets) or None
+
+
+def _read_chunks(f):
+    """
+    Reads the remaining lines of a given file f in chunks of about PARSER_CHUNK_SIZE bytes.
+    :param f: file to read
+    :return: generator of line lists
+    """
+    return iter(lambda: f.readlines(PARSER_CHUNK_SIZE), [])
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Disables the cyclic garbage collector within the with block. The parsers allocate millions of objects but
+    no garbage, collecting while they run only traverses the growing model again and again.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _hierarchy_ref(class_hierarchy):
+    """
+    :param class_hierarchy: class hierarchy or None
+    :return: the number of the class hierarchy + 1, or 0 for None
+    """
+    return class_hierarchy.number + 1 if class_hierarchy else 0
+
+
+class _CacheColumns(object):
+    """
+    Named columns of unsigned integers, stored as typed arrays by Session.dump. Each column is stored in the
+    smallest array type its values fit into, so slices of the loaded arrays can be used by the model directly.
+    """
+
+    def __init__(self, names):
+        self._names = names
+        for name in names:
+            setattr(self, name, [])
+
+    def append(self, *values):
+        """
+        Appends one value to each of the first len(values) columns.
+        """
+        for name, value in izip(self._names, values):
+            getattr(self, name).append(value)
+
+    def pack(self):
+        """
+        :return: dict {column_name: (array_typecode, array_bytes)}, or (None, values) for columns which do not
+                 fit into an array
+        """
+        packed = {}
+        for name in self._names:
+            values = _typed_array("H", getattr(self, name))
+            packed[name] = (values.typecode, values.tostring()) if _typecode(values) else (None, values)
+        return packed
+
+    @classmethod
+    def unpack(cls, packed):
+        """
+        :param packed: columns returned by pack
+        :return: object with one array (or list) attribute per column
+        """
+        columns = cls(tuple(packed))
+        for name, (typecode, values) in packed.iteritems():
+            if typecode:
+                data, values = values, array(typecode)
+                values.fromstring(data)
+            setattr(columns, name, values)
+        return columns
+
+
+class Session(object):
+    """
+    Owns all modules, vtables and class hierarchies parsed from one set of Marx results. Several sessions can
+    be used side by side; dropping a session drops everything parsed into it.
+    """
+
+    def __init__(self, import_filter=None):
+        """
+        :param import_filter: ImportFilter restricting the records parsed into this session (None parses all)
+        """
+        self.modules = PatchedDefaultDict(lambda name: Module(name, self))  # {module_name: module_object}
+        self.modules_by_id = [None]  # interned modules, id 0 marks an empty vtable entry
+        self.hierarchy_count = 0
+        self.import_filter = import_filter
+        self._indexes = {}  # {index_name: index}, built on first use and dropped whenever data is parsed
+
+    def new_class_hierarchy(self, vtables=None):
+        """
+        Creates a class hierarchy with the next free hierarchy number of this session.
+        :param vtables: list of vtable objects in the class hierarchy
+        :return: the new class hierarchy
+        """
+        class_hierarchy = ClassHierarchy(self.hierarchy_count, vtables)
+        self.hierarchy_count += 1
+        return class_hierarchy
+
+    def _merge_class_hierarchies(self, class_hierarchy_sets):
+        """
+        Merges each set of class hierarchies into the one with the lowest number, so hierarchy numbers do not
+        depend on how the sets were joined. The vtables of the merged class hierarchies are appended in the
+        order of their numbers and all references to them are replaced.
+        :param class_hierarchy_sets: disjoint sets of class hierarchies to merge
+        """
+        merged = {}  # {merged_class_hierarchy: remaining_class_hierarchy}
+        for class_hierarchies in class_hierarchy_sets.sets():
+            class_hierarchies.sort(key=lambda class_hierarchy: class_hierarchy.number)
+            remaining = class_hierarchies[0]
+            for class_hierarchy in class_hierarchies[1:]:
+                for vtable in class_hierarchy.vtables:
+                    vtable.class_hierarchy = remaining
+                remaining.vtables.extend(class_hierarchy.vtables)
+                merged[class_hierarchy] = remaining
+
+        if not merged:
+            return
+        for marx_module in self.modules.itervalues():
+            marx_module.class_hierarchies = [class_hierarchy for class_hierarchy in marx_module.class_hierarchies
+                                             if class_hierarchy not in merged]
+            for addressable in chain(marx_module.vcalls.itervalues(), marx_module.new_operators.itervalues()):
+                if addressable.class_hierarchy in merged:
+                    addressable.class_hierarchy = merged[addressable.class_hierarchy]
+
+    def _create_vtable_lookup(self):
+        """
+        Creates the cache used while parsing a file. Each distinct "module:address" vtable token is split,
+        converted and looked up only once per file.
+        :return: function returning the vtable object for a given vtable token
+        """
+        modules = self.modules
+
+        def lookup_vtable(token):
             module_name, address = token.split(":", 1)
-            vtable = Module[module_name].vtables[int(address, 16)]
-            # Check if vtable is already part of a class hierarchy
-            if not vtable.class_hierarchy:
-                vtables.append(vtable)
-
-        # Check if a new class hierarchy is needed
-        if vtables:
-            new_class_hierarchy = ClassHierarchy(vtables)
-            marx_module.class_hierarchies.append(new_class_hierarchy)
-            for vtable in vtables:
-                vtable.class_hierarchy = new_class_hierarchy
-            # Reset vtables list
-            vtables = []
+            return modules[module_name].vtables[int(address, 16)]
+
+        return PatchedDefaultDict(lookup_vtable).__getitem__
+
+    def parse_hierarchy(self, f):
+        """
+        Parse a given file f and constructs or extend a representation of the module specified in f, this
+        involves vtables, vtable hierarchies and associated modules found in that module. This function could
+        only  process files which contain the same output format as produced by Marx's VTableHierarchies::export_hierarchy
+        function. Class hierarchies sharing a vtable (within f or with files parsed before) are merged. Class
+        hierarchies excluded by the import filter are kept until filter_class_hierarchies is called, as they may
+        still be merged with the ones of files parsed later.
+        :param f: output file of VTableHierarchies::export_hierarchy function
+        :return: the object representing the module specified in f
+        """
+        self._indexes.clear()
+        marx_module = self.modules[f.readline().strip()]
+        lookup_vtable = self._create_vtable_lookup()
+        class_hierarchy_sets = DisjointSet()
+
+        with _gc_paused():
+            for lines in _read_chunks(f):
+                for line in lines:
+                    new_class_hierarchy = None
+                    class_hierarchies = []
+                    for vtable in map(lookup_vtable, line.split()):
+                        if vtable.class_hierarchy:
+                            class_hierarchies.append(vtable.class_hierarchy)
+                            continue
+
+                        # Vtables which are not part of a class hierarchy yet form a new one
+                        if not new_class_hierarchy:
+                            new_class_hierarchy = self.new_class_hierarchy()
+                            marx_module.class_hierarchies.append(new_class_hierarchy)
+                        new_class_hierarchy.vtables.append(vtable)
+                        vtable.class_hierarchy = new_class_hierarchy
+
+                    # Class hierarchies sharing a vtable with this line are merged
+                    if class_hierarchies:
+                        class_hierarchy = new_class_hierarchy or class_hierarchies.pop()
+                        for other_class_hierarchy in class_hierarchies:
+                            class_hierarchy_sets.union(class_hierarchy, other_class_hierarchy)
+
+            self._merge_class_hierarchies(class_hierarchy_sets)
+
+        return marx_module
+
+    def filter_class_hierarchies(self):
+        """
+        Removes the class hierarchies excluded by the import filter from the class hierarchies of the modules.
+        Call it once after all .hierarchy files are parsed: merging changes the size of class hierarchies, and
+        removed class hierarchies which are merged later are lost.
+        """
+        import_filter = self.import_filter
+        if import_filter and import_filter.filters_hierarchies:
+            for marx_module in self.modules.itervalues():
+                marx_module.class_hierarchies = filter(import_filter.includes_hierarchy,
+                                                       marx_module.class_hierarchies)
+
+    def parse_new_operators(self, f):
+        """
+        Parse a given file f and constructs or extend a representation of the module specified in f, this
+        involves the new operators found in that module. This function could only process files which contain
+        the same output format as produced by Marx's NewOperators::export_new_operators function.
+        :param f: output file of NewOperators::export_new_operators function
+        :return: the object representing the module specified in f
+        """
+        self._indexes.clear()
+        marx_module = self.modules[f.readline().strip()]
+        lookup_vtable = self._create_vtable_lookup()
+        new_operators = marx_module.new_operators
+        import_filter = self.import_filter
+
+        with _gc_paused():
+            for lines in _read_chunks(f):
+                for line in lines:
+                    tokens = line.split()
+                    class_hierarchy = None
+
+                    if len(tokens) > 2:
+                        vtable = lookup_vtable(tokens[2])
+
+                        # Check if class hierarchy exists already, if not create one (also for records excluded
+                        # by the import filter, so the numbers of class hierarchies do not depend on the filter)
+                        if vtable.class_hierarchy or not allow_single_class_hierarchies:
+                            class_hierarchy = vtable.class_hierarchy
+                        else:
+                            class_hierarchy = self.new_class_hierarchy(map(lookup_vtable, tokens[2:]))
+                            if not import_filter or import_filter.includes_hierarchy(class_hierarchy):
+                                vtable.module.class_hierarchies.append(class_hierarchy)
+                            for vtable in class_hierarchy.vtables:
+                                vtable.class_hierarchy = class_hierarchy
+
+                    address = int(tokens[0], 16)
+                    if import_filter and not (import_filter.includes_address(address) and
+                                              import_filter.includes_hierarchy(class_hierarchy)):
+                        continue
+                    new_op = NewOperator(address, marx_module, int(tokens[1], 16))
+                    new_op.class_hierarchy = class_hierarchy
+                    new_operators[address] = new_op
+
+        return marx_module
+
+    def parse_vcalls_extended(self, f):
+        """
+        Parse a given file f and constructs or extend a representation of the module specified in f, this
+        involves the vcalls, whose vtables, the target functions within these vtables and whose modules found
+        in that module. This function could only process files which contain the same output format as
+        produced by Marx's VCallFile::export_vcalls function.
+        :param f: output file of VCallFile::export_vcalls function
+        :return: the object representing the module specified in f
+        """
+        self._indexes.clear()
+        marx_module = self.modules[f.readline().strip()]
+        modules = self.modules
+        lookup_vtable = self._create_vtable_lookup()
+        vcalls = marx_module.vcalls
+        import_filter = self.import_filter
+
+        with _gc_paused():
+            for lines in _read_chunks(f):
+                for line in lines:
+                    tokens = line.split()
+                    class_hierarchy = None
+
+                    if len(tokens) > 2:
+                        vtable = lookup_vtable(tokens[2])
+
+                        # Tokens alternate between vtables and target functions (an incomplete pair is ignored)
+                        pair_count = (len(tokens) - 2) // 2
+                        vtables = map(lookup_vtable, tokens[2:2 + 2 * pair_count:2])
+
+                        # Check if class hierarchy exists already (if single class hierarchies allowed, missing class hierarchies are added)
+                        # Class hierarchies are also added for records excluded by the import filter, so the numbers
+                        # of class hierarchies do not depend on the filter
+                        if vtable.class_hierarchy or not allow_single_class_hierarchies:
+                            class_hierarchy = vtable.class_hierarchy
+                        else:
+                            # Initialize new class hierarchy
+                            class_hierarchy = self.new_class_hierarchy(vtables)
+                            if not import_filter or import_filter.includes_hierarchy(class_hierarchy):
+                                vtable.module.class_hierarchies.append(class_hierarchy)
+                            for vtable in vtables:
+                                vtable.class_hierarchy = class_hierarchy
+
+                    address = int(tokens[0], 16)
+                    index = int(tokens[1], 16)
+                    target_addresses = ()
+
+                    # The vtable entries are filled in also for vcalls excluded by the import filter, they do not
+                    # depend on the vcall
+                    if len(tokens) > 2:
+                        # The target addresses are converted at once
+                        targets = " ".join(tokens[3:3 + 2 * pair_count:2]).replace(":", " ").split()
+                        target_addresses = map(int, targets[1::2], [16] * pair_count)
+                        for vtable, target_module_name, target_address in izip(vtables, targets[::2], target_addresses):
+                            # Omit unresolved target functions
+                            if target_address:
+                                vtable.functions.set(index, target_address, modules[target_module_name])
+
+                    if import_filter and not (import_filter.includes_address(address) and
+                                              import_filter.includes_hierarchy(class_hierarchy) and
+                                              import_filter.includes_target_count(
+                                                  len(set(target_addresses).difference((0,))))):
+                        continue
+                    vcall = VCall(address, marx_module, index)
+                    vcall.class_hierarchy = class_hierarchy
+                    vcalls[address] = vcall
+
+        return marx_module
+
+    def parse_vtables(self, f):
+        """
+        Parse a given file f and constructs or extend the vtable function dicts of the module specified in f.
+        :param f: file containing a description of the vtables in a module (*_vtables.txt file)
+        :return: the object representing the module specified in f
+        """
+        self._indexes.clear()
+        marx_module = self.modules[f.readline().strip()]
+        vtables = marx_module.vtables
+        import_filter = self.import_filter
+
+        with _gc_paused():
+            for lines in _read_chunks(f):
+                for line in lines:
+                    tokens = line.split()
+                    address = int(tokens[0], 16)
+                    if import_filter and not import_filter.includes_vtable(address, vtables.get(address)):
+                        continue
+                    vtable = vtables[address]
+                    vtable.offset_to_top = int(tokens[1])
+                    # Entries found by parsing other files before are kept
+                    if vtable.functions.has_empty(len(tokens) - 2):
+                        vtable.functions.fill(map(int, tokens[2:], [16] * (len(tokens) - 2)), marx_module)
+
+        return marx_module
+
+    def _index(self, name):
+        """
+        Returns the index with the given name, the index is built by the method _build_{name}_index on first use.
+        :param name: name of the index
+        :return: the index
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            index = self._indexes[name] = getattr(self, "_build_" + name + "_index")()
+        return index
+
+    def _build_function_slots_index(self):
+        """
+        :return: dict {(module_object, function_address): [(vtable_object, index)]}
+        """
+        function_slots = defaultdict(list)
+        for marx_module in self.modules.itervalues():
+            for vtable in marx_module.vtables.itervalues():
+                for index, address, target_module in vtable.functions.iterentries():
+                    function_slots[target_module, address].append((vtable, index))
+        return function_slots
+
+    def _build_vcalls_index(self):
+        """
+        :return: dicts {class_hierarchy: [vcall_object]} and {(class_hierarchy, index): [vcall_object]}
+        """
+        vcalls = defaultdict(list)
+        vcalls_by_index = defaultdict(list)
+        for marx_module in self.modules.itervalues():
+            for vcall in marx_module.vcalls.itervalues():
+                if vcall.class_hierarchy:
+                    vcalls[vcall.class_hierarchy].append(vcall)
+                    vcalls_by_index[vcall.class_hierarchy, vcall.index].append(vcall)
+        return vcalls, vcalls_by_index
+
+    def _build_new_operators_index(self):
+        """
+        :return: dict {class_hierarchy: [new_operator_object]}
+        """
+        new_operators = defaultdict(list)
+        for marx_module in self.modules.itervalues():
+            for new_op in marx_module.new_operators.itervalues():
+                if new_op.class_hierarchy:
+                    new_operators[new_op.class_hierarchy].append(new_op)
+        return new_operators
+
+    def _build_targets_index(self):
+        """
+        :return: dict {(class_hierarchy, index): frozenset of (module_object, target_address)}, filled by targets
+        """
+        return {}
+
+    def _build_target_addresses_index(self):
+        """
+        :return: dict {(class_hierarchy, index): frozenset of target_address}, filled by target_addresses
+        """
+        return {}
+
+    def function_slots(self, marx_module, address):
+        """
+        :param marx_module: module of the function
+        :param address: address of the function
+        :return: list of (vtable_object, index) of all vtable entries pointing to the function
+        """
+        return list(self._index("function_slots").get((marx_module, address), ()))
+
+    def hierarchies_with_function(self, marx_module, address, index=None):
+        """
+        :param marx_module: module of the function
+        :param address: address of the function
+        :param index: vtable index the function has to be at (any index if None)
+        :return: list of class hierarchies containing a vtable with the function (at the given index)
+        """
+        class_hierarchies = []
+        for vtable, vtable_index in self._index("function_slots").get((marx_module, address), ()):
+            if (index is None or vtable_index == index) and vtable.class_hierarchy \
+                    and vtable.class_hierarchy not in class_hierarchies:
+                class_hierarchies.append(vtable.class_hierarchy)
+        return class_hierarchies
+
+    def vcalls_reaching(self, marx_module, address):
+        """
+        :param marx_module: module of the function
+        :param address: address of the function
+        :return: list of vcalls which can call the function (the vcall's class hierarchy contains a vtable with
+                 the function at the vcall's index)
+        """
+        _, vcalls_by_index = self._index("vcalls")
+        vcalls = []
+        keys = set()
+        for vtable, index in self._index("function_slots").get((marx_module, address), ()):
+            key = (vtable.class_hierarchy, index)
+            if vtable.class_hierarchy and key not in keys:
+                keys.add(key)
+                vcalls.extend(vcalls_by_index.get(key, ()))
+        return vcalls
+
+    def targets(self, class_hierarchy, index):
+        """
+        :param class_hierarchy: class hierarchy of a vcall
+        :param index: vtable index of a vcall
+        :return: frozenset of (module_object, target_address) of the functions at the given index of the vtables
+                 in the class hierarchy
+        """
+        targets = self._index("targets")
+        key = (class_hierarchy, index)
+        if key not in targets:
+            targets[key] = frozenset((target[1], target[0]) for target in
+                                     (vtable.functions.target(index) for vtable in class_hierarchy.vtables)
+                                     if target)
+        return targets[key]
+
+    def target_addresses(self, class_hierarchy, index):
+        """
+        :param class_hierarchy: class hierarchy of a vcall
+        :param index: vtable index of a vcall
+        :return: frozenset of the addresses of the functions at the given index of the vtables in the class
+                 hierarchy (the same object for all vcalls with the same class hierarchy and index)
+        """
+        target_addresses = self._index("target_addresses")
+        key = (class_hierarchy, index)
+        if key not in target_addresses:
+            target_addresses[key] = frozenset(address for _, address in self.targets(class_hierarchy, index))
+        return target_addresses[key]
+
+    def vcalls_of(self, class_hierarchy):
+        """
+        :param class_hierarchy: a class hierarchy
+        :return: list of vcalls with the given class hierarchy
+        """
+        vcalls, _ = self._index("vcalls")
+        return list(vcalls.get(class_hierarchy, ()))
+
+    def new_operators_of(self, class_hierarchy):
+        """
+        :param class_hierarchy: a class hierarchy
+        :return: list of new operators which construct objects of the given class hierarchy
+        """
+        return list(self._index("new_operators").get(class_hierarchy, ()))
+
+    def dump(self, f):
+        """
+        Writes the model of this session in a binary form to the given file, see Session.load. The model is
+        flattened into columns of integers (one entry per vtable, vtable entry, class hierarchy, vcall and new
+        operator) which are stored as typed arrays.
+        :param f: file opened in binary mode
+        """
+        vtable_ordinals = {}  # {vtable_object: position in the vtable columns}
+        vtables = _CacheColumns(("module_ids", "addresses", "class_hierarchies", "entry_counts",
+                                 "entry_addresses", "entry_module_ids"))
+        offsets_to_top = []
+        for marx_module in self.modules_by_id[1:]:
+            for vtable in marx_module.vtables.itervalues():
+                vtable_ordinals[vtable] = len(vtable_ordinals)
+                functions = vtable.functions
+                vtables.append(marx_module.id, vtable.address, _hierarchy_ref(vtable.class_hierarchy),
+                               len(functions._module_ids))
+                vtables.entry_addresses.extend(functions._addresses)
+                vtables.entry_module_ids.extend(functions._module_ids)
+                offsets_to_top.append(vtable.offset_to_top)
+
+        # Class hierarchies which are not listed by any module (owner 0) are only referenced by other objects
+        class_hierarchies = _CacheColumns(("numbers", "module_ids", "sizes", "vtables"))
+        listed = set()
+        for marx_module in self.modules_by_id[1:]:
+            for class_hierarchy in marx_module.class_hierarchies:
+                listed.add(class_hierarchy)
+                class_hierarchies.append(class_hierarchy.number, marx_module.id, len(class_hierarchy.vtables))
+                class_hierarchies.vtables.extend(imap(vtable_ordinals.__getitem__, class_hierarchy.vtables))
+        unlisted = set(vtable.class_hierarchy for vtable in vtable_ordinals)
+        for marx_module in self.modules_by_id[1:]:
+            unlisted.update(vcall.class_hierarchy for vcall in marx_module.vcalls.itervalues())
+            unlisted.update(new_op.class_hierarchy for new_op in marx_module.new_operators.itervalues())
+        unlisted.difference_update(listed)
+        unlisted.discard(None)
+        for class_hierarchy in sorted(unlisted, key=lambda class_hierarchy: class_hierarchy.number):
+            class_hierarchies.append(class_hierarchy.number, 0, len(class_hierarchy.vtables))
+            class_hierarchies.vtables.extend(imap(vtable_ordinals.__getitem__, class_hierarchy.vtables))
+
+        vcalls = _CacheColumns(("module_ids", "addresses", "indices", "class_hierarchies"))
+        new_operators = _CacheColumns(("module_ids", "addresses", "sizes", "class_hierarchies"))
+        for marx_module in self.modules_by_id[1:]:
+            for vcall in marx_module.vcalls.itervalues():
+                vcalls.append(marx_module.id, vcall.address, vcall.index, _hierarchy_ref(vcall.class_hierarchy))
+            for new_op in marx_module.new_operators.itervalues():
+                new_operators.append(marx_module.id, new_op.address, new_op.size,
+                                     _hierarchy_ref(new_op.class_hierarchy))
+
+        marshal.dump(([marx_module.name for marx_module in self.modules_by_id[1:]], self.hierarchy_count,
+                      vtables.pack(), offsets_to_top, class_hierarchies.pack(), vcalls.pack(),
+                      new_operators.pack()), f)
+
+    @classmethod
+    def load(cls, f):
+        """
+        Reads a model written by Session.dump into a new session.
+        :param f: file opened in binary mode
+        :return: the new session
+        :raises ValueError, EOFError, TypeError: if f does not contain a model written by Session.dump
+        """
+        (module_names, hierarchy_count, vtables, offsets_to_top, class_hierarchies, vcalls,
+         new_operators) = marshal.load(f)
+        vtables = _CacheColumns.unpack(vtables)
+        class_hierarchies = _CacheColumns.unpack(class_hierarchies)
+        vcalls = _CacheColumns.unpack(vcalls)
+        new_operators = _CacheColumns.unpack(new_operators)
+
+        session = cls()
+        map(session.modules.__getitem__, module_names)
+        modules_by_id = session.modules_by_id
+        if len(modules_by_id) != len(module_names) + 1:
+            raise ValueError("Duplicate module names")
+        session.hierarchy_count = hierarchy_count
+
+        with _gc_paused():
+            hierarchies_by_ref = [None] * (hierarchy_count + 1)
+            for number in class_hierarchies.numbers:
+                hierarchies_by_ref[number + 1] = ClassHierarchy(number)
+
+            # Only vtables with a 64 bit entry need wider arrays than the parsers create
+            narrow_addresses = _typecode(vtables.entry_addresses) not in ("H", "I")
+            vtable_objects = []
+            end = 0
+            for (module_id, address, hierarchy_ref, entry_count,
+                 offset_to_top) in izip(vtables.module_ids, vtables.addresses, vtables.class_hierarchies,
+                                        vtables.entry_counts, offsets_to_top):
+                marx_module = modules_by_id[module_id]
+                vtable = VTable(address, marx_module)
+                dict.__setitem__(marx_module.vtables, address, vtable)
+                vtable.offset_to_top = offset_to_top
+                vtable.class_hierarchy = hierarchies_by_ref[hierarchy_ref]
+                if entry_count:
+                    start, end = end, end + entry_count
+                    functions = vtable.functions
+                    functions._addresses = vtables.entry_addresses[start:end]
+                    if narrow_addresses:
+                        functions._addresses = _typed_array("I", functions._addresses)
+                    functions._module_ids = vtables.entry_module_ids[start:end]
+                vtable_objects.append(vtable)
+
+            end = 0
+            for number, module_id, size in izip(class_hierarchies.numbers, class_hierarchies.module_ids,
+                                                class_hierarchies.sizes):
+                class_hierarchy = hierarchies_by_ref[number + 1]
+                start, end = end, end + size
+                class_hierarchy.vtables = map(vtable_objects.__getitem__, class_hierarchies.vtables[start:end])
+                if module_id:
+                    modules_by_id[module_id].class_hierarchies.append(class_hierarchy)
+
+            for module_id, address, index, hierarchy_ref in izip(vcalls.module_ids, vcalls.addresses,
+                                                                 vcalls.indices, vcalls.class_hierarchies):
+                marx_module = modules_by_id[module_id]
+                vcall = marx_module.vcalls[address] = VCall(address, marx_module, index)
+                vcall.class_hierarchy = hierarchies_by_ref[hierarchy_ref]
+
+            for module_id, address, size, hierarchy_ref in izip(new_operators.module_ids, new_operators.addresses,
+                                                                new_operators.sizes,
+                                                                new_operators.class_hierarchies):
+                marx_module = modules_by_id[module_id]
+                new_op = marx_module.new_operators[address] = NewOperator(address, marx_module, size)
+                new_op.class_hierarchy = hierarchies_by_ref[hierarchy_ref]
+
+        return session
+
+
+# Session used by the module level functions
+default_session = Session()
+
+
+def reset_default_session():
+    """
+    Replaces the default session by a new one, which drops everything parsed by the module level functions
+    before.
+    :return: the new default session
+    """
+    global default_session
+    default_session = Session()
+    return default_session
 
-    return marx_module
+
+def parse_hierarchy(f):
+    """
+    Parses a .hierarchy file into the default session, see Session.parse_hierarchy.
+    :param f: output file of VTableHierarchies::export_hierarchy function
+    :return: the object representing the module specified in f
+    """
+    return default_session.parse_hierarchy(f)
 
 
 def parse_new_operators(f):
     """
-    Parse a given file f and constructs or extend a representation of the module specified in f, this
-    involves the new operators found in that module. This function could only process files which contain
-    the same output format as produced by Marx's NewOperators::export_new_operators function.
+    Parses a .new_operators file into the default session, see Session.parse_new_operators.
     :param f: output file of NewOperators::export_new_operators function
     :return: the object representing the module specified in f
     """
-    marx_module = Module(f.readline().strip())
+    return default_session.parse_new_operators(f)
 
-    for line in f:
-        tokens = line.split()
-        new_op = NewOperator(int(tokens.pop(0), 16), marx_module, int(tokens.pop(0), 16))
 
-        if tokens:
-            vtable_module_name, vtable_address = tokens[0].split(":", 1)
-            vtable = Module[vtable_module_name].vtables[int(vtable_address, 16)]
+def parse_vcalls_extended(f):
+    """
+    Parses a .vcalls_extended file into the default session, see Session.parse_vcalls_extended.
+    :param f: output file of VCallFile::export_vcalls function
+    :return: the object representing the module specified in f
+    """
+    return default_session.parse_vcalls_extended(f)
 
-            # Check if class hierarchy exists already, if not create one
-            if vtable.class_hierarchy or not allow_single_class_hierarchies:
-                new_op.class_hierarchy = vtable.class_hierarchy
-            else:
-                new_op.class_hierarchy = new_class_hierarchy = ClassHierarchy()
-                Module[vtable_module_name].class_hierarchies.append(new_class_hierarchy)
-                for vtable_token in tokens:
-                    vtable_module_name, vtable_address = vtable_token.split(":", 1)
-                    vtable = Module[vtable_module_name].vtables[int(vtable_address, 16)]
 
-                    new_class_hierarchy.vtables.append(vtable)
-                    vtable.class_hierarchy = new_class_hierarchy
+def parse_vtables(f):
+    """
+    Parses a _vtables.txt file into the default session, see Session.parse_vtables.
+    :param f: file containing a description of the vtables in a module (*_vtables.txt file)
+    :return: the object representing the module specified in f
+    """
+    return default_session.parse_vtables(f)
 
-        marx_module.new_operators[new_op.address] = new_op
 
-    return marx_module
+def default_cache_path(paths):
+    """
+    :param paths: list of (kind, file_path) tuples of Marx output files, see parse_files
+    :return: path of the model cache next to the first file (e.g. filezilla.model_cache for filezilla.hierarchy)
+    """
+    return os.path.splitext(paths[0][1])[0] + MODEL_CACHE_EXTENSION
 
 
-def parse_vcalls_extended(f):
+def _hash_file(path):
     """
-    Parse a given file f and constructs or extend a representation of the module specified in f, this
-    involves the vcalls, whose vtables, the target functions within these vtables and whose modules found
-    in that module. This function could only process files which contain the same output format as
-    produced by Marx's VCallFile::export_vcalls function.
-    :param f: output file of VCallFile::export_vcalls function
-    :return: the object representing the module specified in f
+    :param path: path of a file
+    :return: hex SHA-256 digest of the file content
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _fingerprint_files(paths, known_fingerprints=(), verify=False):
+    """
+    Fingerprints the given files by size, modification time and content hash. The content hash of a known
+    fingerprint is reused if size and modification time did not change (unless verify is set).
+    :param paths: list of (kind, file_path) tuples
+    :param known_fingerprints: fingerprints returned before
+    :param verify: hash all files
+    :return: list of (kind, file_name, size, mtime, sha256) tuples
+    :raises OSError, IOError: if a file cannot be read
     """
-    marx_module = Module(f.readline().strip())
+    known = dict(((kind, name), (size, mtime, sha256)) for kind, name, size, mtime, sha256 in known_fingerprints)
+    fingerprints = []
+    for kind, path in paths:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        size, mtime, sha256 = known.get((kind, name), (None, None, None))
+        if verify or (size, mtime) != (stat.st_size, stat.st_mtime):
+            sha256 = _hash_file(path)
+        fingerprints.append((kind, name, stat.st_size, stat.st_mtime, sha256))
+    return fingerprints
+
+
+def _cache_settings(import_filter=None):
+    """
+    :param import_filter: ImportFilter the model is parsed with
+    :return: everything besides the parsed files the cached model depends on
+    """
+    return [MODEL_CACHE_VERSION, list(sys.version_info[:2]), allow_single_class_hierarchies,
+            import_filter.key() if import_filter else None]
 
-    for line in f:
-        tokens = line.split()
-        vcall = VCall(int(tokens.pop(0), 16), marx_module, int(tokens.pop(0), 16))
 
-        if tokens:
-            vtable_module_name, vtable_address = tokens[0].split(":", 1)
-            vtable_address = int(vtable_address, 16)
-            vtable = Module[vtable_module_name].vtables[vtable_address]
+def _content_keys(fingerprints):
+    """
+    :param fingerprints: fingerprints returned by _fingerprint_files
+    :return: list of (kind, file_name, size, sha256) tuples
+    """
+    return [(kind, name, size, sha256) for kind, name, size, _, sha256 in fingerprints]
 
-            # Check if class hierarchy exists already (if single class hierarchies allowed, missing class hierarchies are added)
-            if vtable.class_hierarchy or not allow_single_class_hierarchies:
-                vcall.class_hierarchy = vtable.class_hierarchy
-                new_class_hierarchy = None
-            else:
-                vcall.class_hierarchy = new_class_hierarchy = ClassHierarchy()
-                Module[vtable_module_name].class_hierarchies.append(new_class_hierarchy)
 
-            for vtable_token, target_token in izip(*[iter(tokens)]*2):
-                vtable_module_name, vtable_address = vtable_token.split(":", 1)
-                vtable_address = int(vtable_address, 16)
-                target_module_name, target_address = target_token.split(":", 1)
-                target_address = int(target_address, 16)
+def _read_cache_header(f, paths, verify=False, import_filter=None):
+    """
+    Reads the header of a model cache and checks it against the given files.
+    :param f: model cache opened in binary mode
+    :param paths: list of (kind, file_path) tuples
+    :param verify: hash all files instead of trusting unchanged sizes and modification times
+    :param import_filter: ImportFilter the model is parsed with
+    :return: the name of the module returned by the last parser (None if no file was parsed), the current
+             fingerprints of the files and True if they differ from the cached ones only in modification times
+    :raises ValueError, EOFError, TypeError: if f is not a model cache or the cache is out of date
+    """
+    header = marshal.load(f)
+    if not isinstance(header, tuple) or len(header) != 3 or header[0] != _cache_settings(import_filter):
+        raise ValueError("Model cache was written with other settings")
+    _, fingerprints, module_name = header
+    current = _fingerprint_files(paths, fingerprints, verify)
+    # Modification times only save hashing, files which were touched without being changed are still valid
+    if _content_keys(current) != _content_keys(fingerprints):
+        raise ValueError("Model cache is out of date")
+    return module_name, current, current != list(fingerprints)
+
+
+def check_cache(paths, cache_path=None, verify=True, import_filter=None):
+    """
+    :param paths: list of (kind, file_path) tuples, see parse_files
+    :param cache_path: path of the model cache (next to the first file if None)
+    :param verify: hash all files instead of trusting unchanged sizes and modification times
+    :param import_filter: ImportFilter the model is parsed with
+    :return: True if the model cache exists and was built from the given files
+    """
+    try:
+        with open(cache_path or default_cache_path(paths), "rb") as f:
+            _read_cache_header(f, paths, verify, import_filter)
+        return True
+    except (EnvironmentError, EOFError, ValueError, TypeError):
+        return False
 
-                vtable = Module[vtable_module_name].vtables[vtable_address]
 
-                # Initialize new class hierarchy
-                if new_class_hierarchy:
-                    new_class_hierarchy.vtables.append(vtable)
-                    vtable.class_hierarchy = new_class_hierarchy
+def write_cache(cache_path, session, paths, marx_module=None, fingerprints=None):
+    """
+    Writes the model of the given session and the fingerprints of the files it was parsed from to a model
+    cache. The cache is written to a temporary file first, so an interrupted write leaves no broken cache.
+    :param cache_path: path of the model cache
+    :param session: session parsed from the given files
+    :param paths: list of (kind, file_path) tuples, see parse_files
+    :param marx_module: module returned by the last parser
+    :param fingerprints: fingerprints of the files (computed if None)
+    :return: True if the cache was written
+    """
+    temporary_path = cache_path + ".tmp"
+    try:
+        if fingerprints is None:
+            fingerprints = _fingerprint_files(paths)
+        with open(temporary_path, "wb") as f:
+            marshal.dump((_cache_settings(session.import_filter), fingerprints,
+                          marx_module.name if marx_module else None), f)
+            session.dump(f)
+        if os.name == "nt" and os.path.exists(cache_path):
+            os.remove(cache_path)
+        os.rename(temporary_path, cache_path)
+        return True
+    except EnvironmentError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return False
+
+
+def parse_files(paths, cache_path=None, verify=False, import_filter=None):
+    """
+    Parses the given Marx output files into a new session. If a model cache is given and it was built from
+    the same files (same sizes and content hashes, with the same allow_single_class_hierarchies setting and
+    import filter), the model is loaded from the cache instead; otherwise the files are parsed and the cache
+    is (re)written.
+    :param paths: list of (kind, file_path) tuples in parsing order, kind is one of MARX_FILE_KINDS
+    :param cache_path: path of the model cache (no cache is used if None, see default_cache_path)
+    :param verify: hash all files instead of trusting unchanged sizes and modification times
+    :param import_filter: ImportFilter restricting the parsed records (None parses all)
+    :return: the session, the object representing the module returned by the last parser (None if no file
+             was given) and True if the model was loaded from the cache
+    :raises IOError: if a file cannot be opened
+    """
+    if cache_path:
+        try:
+            with open(cache_path, "rb") as f:
+                module_name, fingerprints, touched = _read_cache_header(f, paths, verify, import_filter)
+                session = Session.load(f)
+                session.import_filter = import_filter
+            marx_module = session.modules[module_name] if module_name is not None else None
+            if touched:
+                # Same contents, store the new modification times so the files are not hashed next time
+                write_cache(cache_path, session, paths, marx_module, fingerprints)
+            return session, marx_module, True
+        except (EnvironmentError, EOFError, ValueError, TypeError, IndexError):
+            pass
+
+    session = Session(import_filter)
+    marx_module = None
+    for kind, path in paths:
+        with open(path, "r") as f:
+            marx_module = getattr(session, "parse_" + kind)(f)
+    session.filter_class_hierarchies()
+    if cache_path:
+        write_cache(cache_path, session, paths, marx_module)
+    return session, marx_module, False
+
+
+class IndexedMarxFile(object):
+    """
+    Read-only view of a Marx output file whose lines start with an address (all files besides .hierarchy). The
+    file is memory-mapped and indexed by a sorted array of the leading addresses and the byte offsets of their
+    lines, so single lines are found without parsing the file. The index can be persisted next to the file, it
+    is rebuilt if the size or modification time of the file changed.
+    """
 
-                # Omit unresolved target functions
-                if target_address:
-                    vtable.functions[vcall.index] = Addressable(target_address, Module[target_module_name])
+    def __init__(self, path, kind=None, index_path=None):
+        """
+        :param path: path of the Marx output file
+        :param kind: kind of the file (see STORE_FILE_SUFFIXES), taken from the file name if None
+        :param index_path: path of the persisted index (see default_index_path), the index is not persisted if
+                           None
+        :raises ValueError: if the kind of the file is unknown or its lines do not start with an address
+        """
+        self.path = path
+        self.kind = kind or ResultStore.file_kind(path)
+        if self.kind is None or self.kind == "hierarchy":
+            raise ValueError("Marx output file is not indexed by address: {:s}".format(path))
+
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.module_name = self._map.readline().strip()
+
+        stat = os.fstat(self._file.fileno())
+        self._file_key = [INDEX_VERSION, stat.st_size, stat.st_mtime]
+        self._addresses = self._offsets = None
+        if index_path:
+            self._load_index(index_path)
+        if self._addresses is None:
+            self._build_index()
+            if index_path:
+                self._save_index(index_path)
+
+    @staticmethod
+    def default_index_path(path):
+        """
+        :param path: path of a Marx output file
+        :return: path of the persisted index next to the file
+        """
+        return path + INDEX_EXTENSION
 
-        marx_module.vcalls[vcall.address] = vcall
+    def close(self):
+        self._map.close()
+        self._file.close()
 
-    return marx_module
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *args):
+        self.close()
 
-def parse_vtables(f):
+    def _build_index(self):
+        """
+        Reads the file once and creates the arrays of leading addresses and line offsets sorted by address.
+        """
+        addresses = []
+        offsets = []
+        with open(self.path, "rb") as f:
+            offset = len(f.readline())
+            for lines in _read_chunks(f):
+                for line in lines:
+                    tokens = line.split(None, 1)
+                    if tokens:
+                        addresses.append(int(tokens[0], 16))
+                        offsets.append(offset)
+                    offset += len(line)
+
+        # Marx writes the lines in hash order
+        order = sorted(xrange(len(addresses)), key=addresses.__getitem__)
+        self._addresses = _typed_array("I", [addresses[k] for k in order])
+        self._offsets = _typed_array("I", [offsets[k] for k in order])
+
+    def _load_index(self, index_path):
+        """
+        Loads the index persisted for the current version of the file (if there is one).
+        :param index_path: path of the persisted index
+        """
+        try:
+            with open(index_path, "rb") as f:
+                file_key, columns = marshal.load(f)
+            if file_key != self._file_key:
+                return
+            columns = _CacheColumns.unpack(columns)
+            if len(columns.addresses) == len(columns.offsets):
+                self._addresses, self._offsets = columns.addresses, columns.offsets
+        except (EnvironmentError, EOFError, ValueError, TypeError, KeyError, AttributeError):
+            pass
+
+    def _save_index(self, index_path):
+        """
+        Persists the index, errors are ignored (the index is rebuilt next time).
+        :param index_path: path of the persisted index
+        """
+        columns = _CacheColumns(("addresses", "offsets"))
+        columns.addresses, columns.offsets = self._addresses, self._offsets
+        temporary_path = index_path + ".tmp"
+        try:
+            with open(temporary_path, "wb") as f:
+                marshal.dump((self._file_key, columns.pack()), f)
+            if os.name == "nt" and os.path.exists(index_path):
+                os.remove(index_path)
+            os.rename(temporary_path, index_path)
+        except EnvironmentError:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def __contains__(self, address):
+        position = bisect_left(self._addresses, address)
+        return position < len(self._addresses) and self._addresses[position] == address
+
+    def __iter__(self):
+        """
+        :return: iterator of the leading addresses in ascending order
+        """
+        return iter(self._addresses)
+
+    def _line_at(self, offset):
+        end = self._map.find("\n", offset)
+        return self._map[offset:end if end >= 0 else len(self._map)]
+
+    def lines(self, address):
+        """
+        :param address: leading address of the lines
+        :return: list of the lines (without line break) starting with the given address
+        """
+        start = bisect_left(self._addresses, address)
+        end = bisect_right(self._addresses, address, start)
+        return [self._line_at(offset) for offset in self._offsets[start:end]]
+
+    def line(self, address):
+        """
+        :param address: leading address of the line
+        :return: the first line starting with the given address (without line break) or None
+        """
+        lines = self.lines(address)
+        return lines[0] if lines else None
+
+    def parse_into(self, session, addresses):
+        """
+        Parses only the lines starting with the given addresses into the given session, with the parser of the
+        file's kind (Session.parse_{kind}). The lines are parsed as if they were the only lines of the file.
+        :param session: session to parse into
+        :param addresses: iterable of leading addresses
+        :return: the object representing the module of the file
+        :raises ValueError: if the session has no parser for the kind of the file
+        """
+        parse = getattr(session, "parse_" + self.kind, None)
+        if parse is None:
+            raise ValueError("Marx output files of kind {:s} cannot be parsed".format(self.kind))
+        lines = [self.module_name]
+        for address in addresses:
+            lines.extend(self.lines(address))
+        lines.append("")
+        return parse(StringIO("\n".join(lines)))
+
+
+def _split_token(token):
     """
-    Parse a given file f and constructs or extend the vtable function dicts of the module specified in f.
-    :param f: file containing a description of the vtables in a module (*_vtables.txt file)
-    :return: the object representing the module specified in f
+    :param token: "module_name:hex_address" token
+    :return: module name, address
     """
-    marx_module = Module(f.readline().strip())
+    module_name, address = token.split(":", 1)
+    return module_name, int(address, 16)
+
 
-    for line in f:
-        tokens = line.split()
-        vtable = marx_module.vtables[int(tokens.pop(0), 16)]
-        vtable.offset_to_top = int(tokens.pop(0))
+class ResultStore(object):
+    """
+    SQLite database holding the Marx output files of any number of modules. The files are parsed line by line
+    and inserted in batches, nothing but the current batch is kept in memory. Modules, vtables and functions
+    are identified by module name and address. The class hierarchies of a module are numbered in the order of
+    its .hierarchy file. Unlike Session.parse_hierarchy, hierarchies of different files sharing a vtable are not
+    merged: each file keeps its own hierarchies, hierarchies_with_vtable lists all of them.
+    """
 
-        index = 0
-        for target_address in tokens:
-            if index not in vtable.functions:
-                vtable.functions[index] = Addressable(int(target_address, 16), marx_module)
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS modules (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE IF NOT EXISTS vtables (
+            module_id INTEGER NOT NULL, address INTEGER NOT NULL, offset_to_top INTEGER NOT NULL,
+            PRIMARY KEY (module_id, address));
+        CREATE TABLE IF NOT EXISTS vtable_entries (
+            module_id INTEGER NOT NULL, vtable_address INTEGER NOT NULL, slot INTEGER NOT NULL,
+            target_address INTEGER NOT NULL,
+            PRIMARY KEY (module_id, vtable_address, slot));
+        CREATE TABLE IF NOT EXISTS hierarchy_vtables (
+            module_id INTEGER NOT NULL, number INTEGER NOT NULL,
+            vtable_module_id INTEGER NOT NULL, vtable_address INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS vcalls (
+            module_id INTEGER NOT NULL, address INTEGER NOT NULL, entry_index INTEGER,
+            PRIMARY KEY (module_id, address));
+        CREATE TABLE IF NOT EXISTS vcall_vtables (
+            module_id INTEGER NOT NULL, vcall_address INTEGER NOT NULL,
+            vtable_module_id INTEGER NOT NULL, vtable_address INTEGER NOT NULL,
+            target_module_id INTEGER, target_address INTEGER,
+            PRIMARY KEY (module_id, vcall_address, vtable_module_id, vtable_address));
+        CREATE TABLE IF NOT EXISTS new_operators (
+            module_id INTEGER NOT NULL, address INTEGER NOT NULL, size INTEGER NOT NULL,
+            PRIMARY KEY (module_id, address));
+        CREATE TABLE IF NOT EXISTS new_operator_vtables (
+            module_id INTEGER NOT NULL, new_operator_address INTEGER NOT NULL,
+            vtable_module_id INTEGER NOT NULL, vtable_address INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS vtable_updates (
+            module_id INTEGER NOT NULL, function_address INTEGER NOT NULL,
+            vtable_module_id INTEGER NOT NULL, vtable_address INTEGER NOT NULL, base TEXT NOT NULL,
+            offset INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS vtv_vcalls (
+            module_id INTEGER NOT NULL, verify_address INTEGER NOT NULL, vcall_address INTEGER NOT NULL);
+        """
 
-            index += 1
+    # Secondary indexes (name, table, columns), built after the data when importing into an empty store
+    _INDEXES = (
+        ("vtable_entries_by_target", "vtable_entries", "module_id, target_address"),
+        ("hierarchy_vtables_by_number", "hierarchy_vtables", "module_id, number"),
+        ("hierarchy_vtables_by_vtable", "hierarchy_vtables", "vtable_module_id, vtable_address"),
+        ("vcall_vtables_by_vtable", "vcall_vtables", "vtable_module_id, vtable_address"),
+        ("vcall_vtables_by_target", "vcall_vtables", "target_module_id, target_address"),
+        ("new_operator_vtables_by_new_operator", "new_operator_vtables", "module_id, new_operator_address"),
+        ("new_operator_vtables_by_vtable", "new_operator_vtables", "vtable_module_id, vtable_address"),
+        ("vtable_updates_by_function", "vtable_updates", "module_id, function_address"),
+        ("vtable_updates_by_vtable", "vtable_updates", "vtable_module_id, vtable_address"),
+        ("vtv_vcalls_by_verify_call", "vtv_vcalls", "module_id, verify_address"),
+        ("vtv_vcalls_by_vcall", "vtv_vcalls", "module_id, vcall_address"),
+    )
+
+    # Rows replaced when a file of a module is imported again ({kind: [(table, condition)]}, the conditions
+    # take the module id as parameter :module_id and are applied in order). The .vcalls and .vcalls_extended
+    # files complement each other: each replaces only the vcalls it imported, which are told apart by the
+    # vtable entry index (NULL for vcalls imported from a .vcalls file only).
+    _REPLACED_TABLES = {
+        "hierarchy": [("hierarchy_vtables", "module_id = :module_id")],
+        "new_operators": [("new_operators", "module_id = :module_id"),
+                          ("new_operator_vtables", "module_id = :module_id")],
+        "vcalls": [("vcall_vtables", "module_id = :module_id AND vcall_address IN "
+                                     "(SELECT address FROM vcalls WHERE module_id = :module_id AND "
+                                     "entry_index IS NULL)"),
+                   ("vcalls", "module_id = :module_id AND entry_index IS NULL")],
+        "vcalls_extended": [("vcall_vtables", "module_id = :module_id AND vcall_address IN "
+                                              "(SELECT address FROM vcalls WHERE module_id = :module_id AND "
+                                              "entry_index IS NOT NULL)"),
+                            ("vcalls", "module_id = :module_id AND entry_index IS NOT NULL")],
+        "vtable_updates": [("vtable_updates", "module_id = :module_id")],
+        "vtv_vcalls": [("vtv_vcalls", "module_id = :module_id")],
+        "vtables": [("vtables", "module_id = :module_id"), ("vtable_entries", "module_id = :module_id")],
+    }
+
+    def __init__(self, path):
+        """
+        Opens (or creates) the database at the given path.
+        :param path: path of the database file (":memory:" for an in-memory database)
+        """
+        self.connection = sqlite3.connect(path)
+        self.connection.text_factory = str
+        self.connection.executescript(self._SCHEMA)
+        self._module_ids = dict((name, module_id) for module_id, name in
+                                self.connection.execute("SELECT id, name FROM modules"))
+        self._module_names = dict((module_id, name) for name, module_id in self._module_ids.iteritems())
 
-    return marx_module
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def file_kind(path):
+        """
+        :param path: path of a Marx output file
+        :return: kind of the file (see STORE_FILE_SUFFIXES) or None if the file is not imported
+        """
+        for suffix, kind in STORE_FILE_SUFFIXES:
+            if path.endswith(suffix):
+                return kind
+        return None
+
+    def import_files(self, paths):
+        """
+        Imports the given Marx output files in one transaction. Files of a module which were imported before
+        are replaced.
+        :param paths: paths of Marx output files, the kind of each file is given by its suffix
+        :raises ValueError: if the kind of a file is unknown
+        :raises IOError: if a file cannot be opened (nothing is imported then)
+        """
+        kinds = map(self.file_kind, paths)
+        for path, kind in izip(paths, kinds):
+            if kind is None:
+                raise ValueError("Unknown Marx output file: {:s}".format(path))
+
+        with self.connection:
+            # Building the indexes once after a bulk import is faster than updating them row by row
+            if not self._module_ids:
+                for name, _, _ in self._INDEXES:
+                    self.connection.execute("DROP INDEX IF EXISTS {:s}".format(name))
+            for path, kind in izip(paths, kinds):
+                with open(path, "r") as f:
+                    self._import_file(kind, f)
+            for name, table, columns in self._INDEXES:
+                self.connection.execute("CREATE INDEX IF NOT EXISTS {:s} ON {:s} ({:s})".format(name, table, columns))
+
+    def import_directory(self, directory):
+        """
+        Imports all Marx output files in the given directory in one transaction, see ResultStore.import_files.
+        :param directory: directory containing Marx output files
+        :return: the imported paths
+        """
+        paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                 if self.file_kind(name)]
+        self.import_files(paths)
+        return paths
+
+    def _module_id(self, name):
+        """
+        :param name: name of a module
+        :return: the id of the module, the module is added if it is not known yet
+        """
+        module_id = self._module_ids.get(name)
+        if module_id is None:
+            module_id = self.connection.execute("INSERT INTO modules (name) VALUES (?)", (name,)).lastrowid
+            self._module_ids[name] = module_id
+            self._module_names[module_id] = name
+        return module_id
+
+    def _lookup_vtable(self, token):
+        """
+        :param token: "module_name:hex_address" token
+        :return: module id, address
+        """
+        module_name, address = _split_token(token)
+        return self._module_id(module_name), address
+
+    def _import_file(self, kind, f):
+        """
+        Imports a Marx output file within the current transaction.
+        :param kind: kind of the file, names the method _import_{kind}
+        :param f: the file
+        """
+        module_id = self._module_id(f.readline().strip())
+        for table, condition in self._REPLACED_TABLES.get(kind, ()):
+            self.connection.execute("DELETE FROM {:s} WHERE {:s}".format(table, condition), {"module_id": module_id})
+        getattr(self, "_import_" + kind)(module_id, f)
+
+    def _import_hierarchy(self, module_id, f):
+        number = 0
+        for lines in _read_chunks(f):
+            rows = []
+            for line in lines:
+                rows.extend((module_id, number) + self._lookup_vtable(token) for token in line.split())
+                number += 1
+            self.connection.executemany("INSERT INTO hierarchy_vtables VALUES (?, ?, ?, ?)", rows)
+
+    def _import_new_operators(self, module_id, f):
+        for lines in _read_chunks(f):
+            new_operators = []
+            vtables = []
+            for line in lines:
+                tokens = line.split()
+                address = int(tokens[0], 16)
+                new_operators.append((module_id, address, int(tokens[1], 16)))
+                vtables.extend((module_id, address) + self._lookup_vtable(token) for token in tokens[2:])
+            self.connection.executemany("INSERT OR REPLACE INTO new_operators VALUES (?, ?, ?)", new_operators)
+            self.connection.executemany("INSERT INTO new_operator_vtables VALUES (?, ?, ?, ?)", vtables)
+
+    def _import_vcalls(self, module_id, f):
+        # Vcalls and vtables imported from a .vcalls_extended file before are kept
+        for lines in _read_chunks(f):
+            vcalls = []
+            vtables = []
+            for line in lines:
+                tokens = line.split()
+                address = int(tokens[0], 16)
+                vcalls.append((module_id, address))
+                vtables.extend((module_id, address) + self._lookup_vtable(token) for token in tokens[1:])
+            self.connection.executemany("INSERT OR IGNORE INTO vcalls VALUES (?, ?, NULL)", vcalls)
+            self.connection.executemany("INSERT OR IGNORE INTO vcall_vtables VALUES (?, ?, ?, ?, NULL, NULL)",
+                                        vtables)
+
+    def _import_vcalls_extended(self, module_id, f):
+        for lines in _read_chunks(f):
+            vcalls = []
+            vtables = []
+            for line in lines:
+                tokens = line.split()
+                address = int(tokens[0], 16)
+                vcalls.append((module_id, address, int(tokens[1], 16)))
+                # Tokens alternate between vtables and target functions (an incomplete pair is ignored)
+                for k in xrange(2, len(tokens) - 1, 2):
+                    target_module_id, target_address = self._lookup_vtable(tokens[k + 1])
+                    # Unresolved target functions are stored as NULL
+                    if not target_address:
+                        target_module_id = target_address = None
+                    vtables.append((module_id, address) + self._lookup_vtable(tokens[k]) +
+                                   (target_module_id, target_address))
+            self.connection.executemany("INSERT OR REPLACE INTO vcalls VALUES (?, ?, ?)", vcalls)
+            self.connection.executemany("INSERT OR REPLACE INTO vcall_vtables VALUES (?, ?, ?, ?, ?, ?)", vtables)
+
+    def _import_vtable_updates(self, module_id, f):
+        for lines in _read_chunks(f):
+            rows = []
+            for line in lines:
+                tokens = line.split()
+                function_address = int(tokens[0], 16)
+                # Updates are given as module_name:hex_vtable_address:base:dec_offset
+                for token in tokens[1:]:
+                    vtable_token, base, offset = token.rsplit(":", 2)
+                    rows.append((module_id, function_address) + self._lookup_vtable(vtable_token) +
+                                (base, int(offset)))
+            self.connection.executemany("INSERT INTO vtable_updates VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _import_vtv_vcalls(self, module_id, f):
+        for lines in _read_chunks(f):
+            rows = []
+            for line in lines:
+                tokens = line.split()
+                verify_address = int(tokens[0], 16)
+                rows.extend((module_id, verify_address, int(token, 16)) for token in tokens[1:])
+            self.connection.executemany("INSERT INTO vtv_vcalls VALUES (?, ?, ?)", rows)
+
+    def _import_vtables(self, module_id, f):
+        for lines in _read_chunks(f):
+            vtables = []
+            entries = []
+            for line in lines:
+                tokens = line.split()
+                address = int(tokens[0], 16)
+                vtables.append((module_id, address, int(tokens[1])))
+                entries.extend((module_id, address, slot, int(token, 16)) for slot, token in enumerate(tokens[2:]))
+            self.connection.executemany("INSERT OR REPLACE INTO vtables VALUES (?, ?, ?)", vtables)
+            self.connection.executemany("INSERT OR REPLACE INTO vtable_entries VALUES (?, ?, ?, ?)", entries)
+
+    def _query(self, statement, module_name, address):
+        """
+        Runs a query on the rows of the given module and address and replaces module ids by module names.
+        :param statement: SQL statement with the parameters module id and address, module ids in the results
+                          are given by columns named *module_id
+        :param module_name: name of a module
+        :param address: address (or class hierarchy number) in the module
+        :return: list of result tuples
+        """
+        module_id = self._module_ids.get(module_name)
+        if module_id is None:
+            return []
+        cursor = self.connection.execute(statement, (module_id, address))
+        module_columns = [k for k, column in enumerate(cursor.description) if column[0].endswith("module_id")]
+        if not module_columns:
+            return cursor.fetchall()
+        results = []
+        for row in cursor:
+            row = list(row)
+            for k in module_columns:
+                row[k] = self._module_names.get(row[k])
+            results.append(tuple(row))
+        return results
+
+    def modules(self):
+        """
+        :return: list of the names of all modules in the store
+        """
+        return sorted(self._module_ids)
+
+    def vtable_entries(self, module_name, address):
+        """
+        :param module_name: module of the vtable
+        :param address: address of the vtable
+        :return: list of (slot, target_address) ordered by slot (targets are in the module of the vtable)
+        """
+        return self._query("SELECT slot, target_address FROM vtable_entries WHERE module_id = ? AND "
+                           "vtable_address = ? ORDER BY slot", module_name, address)
+
+    def vtables_with_function(self, module_name, address):
+        """
+        :param module_name: module of the function
+        :param address: address of the function
+        :return: list of (vtable_module_name, vtable_address, slot) of the _vtables.txt entries pointing to the
+                 function
+        """
+        return self._query("SELECT module_id, vtable_address, slot FROM vtable_entries WHERE module_id = ? AND "
+                           "target_address = ? ORDER BY vtable_address, slot", module_name, address)
+
+    def hierarchies_with_vtable(self, module_name, address):
+        """
+        :param module_name: module of the vtable
+        :param address: address of the vtable
+        :return: list of (module_name, hierarchy_number) of the class hierarchies containing the vtable
+        """
+        return self._query("SELECT DISTINCT module_id, number FROM hierarchy_vtables WHERE vtable_module_id = ? "
+                           "AND vtable_address = ? ORDER BY module_id, number", module_name, address)
+
+    def hierarchy_vtables(self, module_name, number):
+        """
+        :param module_name: module whose .hierarchy file contains the class hierarchy
+        :param number: number of the class hierarchy (line in the .hierarchy file, starting with 0)
+        :return: list of (vtable_module_name, vtable_address)
+        """
+        return self._query("SELECT vtable_module_id, vtable_address FROM hierarchy_vtables WHERE module_id = ? "
+                           "AND number = ? ORDER BY rowid", module_name, number)
+
+    def vcall_targets(self, module_name, address):
+        """
+        :param module_name: module of the vcall
+        :param address: address of the vcall
+        :return: list of (vtable_module_name, vtable_address, target_module_name, target_address), the target is
+                 (None, None) if it is unresolved or only a .vcalls file was imported
+        """
+        return self._query("SELECT vtable_module_id, vtable_address, target_module_id, target_address "
+                           "FROM vcall_vtables WHERE module_id = ? AND vcall_address = ? "
+                           "ORDER BY vtable_module_id, vtable_address", module_name, address)
+
+    def vcalls_reaching(self, module_name, address):
+        """
+        :param module_name: module of the function
+        :param address: address of the function
+        :return: list of (vcall_module_name, vcall_address, entry_index) of the vcalls which can call the
+                 function
+        """
+        return self._query("SELECT DISTINCT v.module_id, v.address, v.entry_index FROM vcall_vtables AS t "
+                           "JOIN vcalls AS v ON v.module_id = t.module_id AND v.address = t.vcall_address "
+                           "WHERE t.target_module_id = ? AND t.target_address = ? "
+                           "ORDER BY v.module_id, v.address", module_name, address)
+
+    def vcalls_with_vtable(self, module_name, address):
+        """
+        :param module_name: module of the vtable
+        :param address: address of the vtable
+        :return: list of (vcall_module_name, vcall_address) of the vcalls which can use the vtable
+        """
+        return self._query("SELECT module_id, vcall_address FROM vcall_vtables WHERE vtable_module_id = ? AND "
+                           "vtable_address = ? ORDER BY module_id, vcall_address", module_name, address)
+
+    def new_operators_with_vtable(self, module_name, address):
+        """
+        :param module_name: module of the vtable
+        :param address: address of the vtable
+        :return: list of (module_name, new_operator_address, size) of the new operators which can construct
+                 objects with the vtable
+        """
+        return self._query("SELECT n.module_id, n.address, n.size FROM new_operator_vtables AS v "
+                           "JOIN new_operators AS n ON n.module_id = v.module_id AND n.address = "
+                           "v.new_operator_address WHERE v.vtable_module_id = ? AND v.vtable_address = ? "
+                           "ORDER BY n.module_id, n.address", module_name, address)
+
+    def vtable_updates_of_function(self, module_name, address):
+        """
+        :param module_name: module of the function
+        :param address: address of the function
+        :return: list of (vtable_module_name, vtable_address, base, offset) of the vtable pointers written by
+                 the function
+        """
+        return self._query("SELECT vtable_module_id, vtable_address, base, offset FROM vtable_updates "
+                           "WHERE module_id = ? AND function_address = ? ORDER BY rowid", module_name, address)
+
+    def functions_updating_vtable(self, module_name, address):
+        """
+        :param module_name: module of the vtable
+        :param address: address of the vtable
+        :return: list of (module_name, function_address, base, offset) of the functions writing the vtable
+                 pointer
+        """
+        return self._query("SELECT module_id, function_address, base, offset FROM vtable_updates "
+                           "WHERE vtable_module_id = ? AND vtable_address = ? ORDER BY module_id, "
+                           "function_address", module_name, address)
+
+    def vtv_vcalls(self, module_name, verify_address):
+        """
+        :param module_name: module of the VTV verification call
+        :param verify_address: address of the verification call
+        :return: list of the addresses of the vcalls protected by the verification call
+        """
+        return [vcall_address for vcall_address, in
+                self._query("SELECT vcall_address FROM vtv_vcalls WHERE module_id = ? AND verify_address = ? "
+                            "ORDER BY vcall_address", module_name, verify_address)]
+
+
+def _write_lines(f, name, lines):
+    """
+    Writes the given module name and lines to the given output stream f one by one. The output is the same as
+    the one of print >>f, name + "\n" + "\n".join(lines), including the empty line after the module name if
+    there are no lines.
+    :param f: output stream to write to
+    :param name: module name
+    :param lines: iterable of lines without line breaks
+    """
+    def separated_lines():
+        yield name + "\n"
+        separator = ""
+        for line in lines:
+            yield separator + line
+            separator = "\n"
+        yield "\n"
+
+    f.writelines(separated_lines())
+
+
+def hierarchy_lines(marx_module):
+    """
+    :param marx_module: module which contains the vtable hierarchy list
+    :return: generator of the lines of a .hierarchy file of the module (without module name and line breaks)
+    """
+    for class_hierarchy in marx_module.class_hierarchies:
+        yield " ".join(map(str, class_hierarchy.vtables))
+
+
+def new_operators_lines(marx_module):
+    """
+    :param marx_module: module which contains the new operators list
+    :return: generator of the lines of a .new_operators file of the module (without module name and line breaks)
+    """
+    # The vtables of a class hierarchy are formatted once for all its new operators
+    formatted_vtables = PatchedDefaultDict(lambda class_hierarchy: "".join(
+        " {:s}".format(vtable) for vtable in class_hierarchy.vtables))
+    for new_op in marx_module.new_operators.itervalues():
+        yield "{:x} {:x}".format(new_op.address, new_op.size) + (
+            formatted_vtables[new_op.class_hierarchy] if new_op.class_hierarchy else "")
+
+
+def vcalls_extended_lines(marx_module):
+    """
+    :param marx_module: module which contains the vcalls list
+    :return: generator of the lines of a .vcalls_extended file of the module (without module name and line
+             breaks)
+    """
+    def format_targets(key):
+        class_hierarchy, index = key
+        return "".join(" {:s} {:s}:{:x}".format(vtable, target[1].name, target[0]) for vtable, target in
+                       ((vtable, vtable.functions.target(index)) for vtable in class_hierarchy.vtables) if target)
+
+    # The vtables and targets are formatted once for all vcalls with the same class hierarchy and index
+    formatted_targets = PatchedDefaultDict(format_targets)
+    for vcall in marx_module.vcalls.itervalues():
+        line = "{:x} {:x}".format(vcall.address, vcall.index)
+        if vcall.class_hierarchy:
+            line += formatted_targets[vcall.class_hierarchy, vcall.index]
+        yield line
+
+
+def vtables_lines(marx_module):
+    """
+    :param marx_module: module which contains the vtables
+    :return: generator of the lines of a _vtables.txt file of the module (without module name and line breaks)
+    """
+    for vtable in marx_module.vtables.itervalues():
+        yield "{:x} {:d} ".format(vtable.address, vtable.offset_to_top) + " ".join(
+            "{:x}".format(address) for _, address, _ in vtable.functions.iterentries())
 
 
 def print_hierarchy(f, marx_module):
     """
-    Converts the vtable hierarchy list of the given module to string and prints it to the given output stream f.
+    Prints the vtable hierarchy list of the given module line by line to the given output stream f.
     This function produces the same output as Marx's VTableHierarchies::export_hierarchy function.
     :param f: output stream to write the string to
     :param marx_module: module which contains the vtable hierarchy list to print
     """
-    print >>f, marx_module.name + "\n" + "\n".join(
-        map(lambda hierarchy: " ".join(map(str, hierarchy.vtables)), marx_module.class_hierarchies))
+    _write_lines(f, marx_module.name, hierarchy_lines(marx_module))
 
 
 def print_new_operators(f, marx_module):
     """
-    Converts the new operators list of the given module to string and prints it to the given output stream f.
+    Prints the new operators list of the given module line by line to the given output stream f.
     :param f: output stream to write the string to
     :param marx_module: module which contains the new operators list to print
     """
-    print >> f, marx_module.name + "\n" + "\n".join(
-        map(lambda new_op: "{:x} {:x}".format(new_op.address, new_op.size) + "".join(
-            map(lambda vtable: " {:s}".format(vtable),
-                new_op.class_hierarchy.vtables) if new_op.class_hierarchy else ""),
-            marx_module.new_operators.itervalues()))
+    _write_lines(f, marx_module.name, new_operators_lines(marx_module))
 
 
 def print_vcalls_extended(f, marx_module):
     """
-    Converts the vcalls list of the given module to string and prints it to the given output stream f.
+    Prints the vcalls list of the given module line by line to the given output stream f.
     :param f: output stream to write the string to
     :param marx_module: module which contains the vcalls list to print
     """
-    def format_vtable(vtable, vcall):
-        func = vtable.functions.get(vcall.index, None)
-        return " {:s} {:s}".format(vtable, func) if func else ""
-
-    print >> f, marx_module.name + "\n" + "\n".join(
-        map(lambda vcall: "{:x} {:x}".format(vcall.address, vcall.index) + "".join(
-            (format_vtable(vtable, vcall) for vtable in vcall.class_hierarchy.vtables)
-            if vcall.class_hierarchy else ""),
-            marx_module.vcalls.itervalues()))
+    _write_lines(f, marx_module.name, vcalls_extended_lines(marx_module))
 
 
 def print_vtables(f, marx_module):
     """
-    Converts the vtables of the given module to string and prints it to the given output stream f.
+    Prints the vtables of the given module line by line to the given output stream f.
     :param f: output stream to write the string to
     :param marx_module: module which contains the vtables to print
     """
-    print >> f, marx_module.name + "\n" + "\n".join(
-        map(lambda vtable: "{:x} {:d} ".format(vtable.address, vtable.offset_to_top) +
-                           " ".join(map(lambda item: "{:x}".format(item[1].address), vtable.functions.iteritems())),
-            marx_module.vtables.itervalues()))
+    _write_lines(f, marx_module.name, vtables_lines(marx_module))
 
 
 # Standalone code, for debugging
 def main(args):
+    paths = zip(MARX_FILE_KINDS, (args.hierarchy_file_path, args.new_operators_file_path,
+                                  args.vcalls_extended_file_path, args.vtables_txt_file_path))
+    cache_path = args.cache_file or default_cache_path(paths)
+    import_filter = import_filter_from_args(args)
+
+    if args.verify_cache:
+        if check_cache(paths, cache_path, import_filter=import_filter):
+            print "Model cache is up to date: {:s}".format(cache_path)
+            return 0
+        print "Model cache is missing or out of date: {:s}".format(cache_path)
+        return 1
+
+    if args.build_cache:
+        _, marx_module, cached = parse_files(paths, cache_path, import_filter=import_filter)
+        if cached:
+            print "Model cache is up to date: {:s}".format(cache_path)
+        elif check_cache(paths, cache_path, verify=False, import_filter=import_filter):
+            print "Model cache written: {:s}".format(cache_path)
+        else:
+            print "Could not write model cache: {:s}".format(cache_path)
+            return 1
+
+        # Additional debug output
+        for debug, print_function in ((args.debug_hierarchy, print_hierarchy),
+                                      (args.debug_new_operators, print_new_operators),
+                                      (args.debug_vcalls, print_vcalls_extended),
+                                      (args.debug_vtables, print_vtables)):
+            if debug:
+                print_function(stdout, marx_module)
+        return 0
+
+    default_session.import_filter = import_filter
+
     # Parsing hierarchy file
     with open(args.hierarchy_file_path, "r") as f:
         marx_module = parse_hierarchy(f)
+        default_session.filter_class_hierarchies()
         if args.verbose:
             print "Hierarchy file successful parsed"
 
@@ -353,4 +2096,12 @@ if __name__ == '__main__':
     parser.add_argument("-dn", "--debug_new_operators", help="prints new operators after parsing", action="store_true")
     parser.add_argument("-dv", "--debug_vcalls", help="prints vcalls after parsing", action="store_true")
     parser.add_argument("-dt", "--debug_vtables", help="prints vtables after parsing", action="store_true")
-    main(parser.parse_args())
+
+    parser.add_argument("-b", "--build_cache", help="parses the files into a model cache (unless it is up to date)",
+                        action="store_true")
+    parser.add_argument("-c", "--verify_cache", help="checks if the model cache was built from the files "
+                                                     "(exit code 1 if not)", action="store_true")
+    parser.add_argument("--cache_file", help="path of the model cache (default: next to the hierarchy file)")
+
+    add_import_filter_arguments(parser)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,323 @@
+import argparse
+import json
+import marshal
+import os
+import time
+from collections import defaultdict
+from sys import stderr, stdout
+
+import marx
+
+# Number of bytes of an address
+WORD_BYTE_COUNT = 8
+
+# Version of the applied import files, increase when their format changes
+APPLIED_VERSION = 1
+APPLIED_EXTENSION = ".marx_import"
+
+# Record of an address the plan does not write to
+EMPTY_RECORD = (False, (), ())
+
+# Comment writes, applied in order to the comment found in the database
+COMMENT_PREPEND = "prepend"  # adds the text in front of the comment unless the comment contains it already
+COMMENT_DEFAULT = "default"  # sets the comment to the text if there is no comment
+COMMENT_SET = "set"  # replaces the comment by the text
+
+
+def resolve_comment(comment, comment_writes):
+    """
+    Computes the comment an address has after applying the given comment writes.
+    :param comment: current comment of the address (None if there is none)
+    :param comment_writes: list of (mode, text) tuples, mode is one of the COMMENT_* constants
+    :return: the resulting comment (None if there is none)
+    """
+    for mode, text in comment_writes:
+        if mode == COMMENT_SET or (mode == COMMENT_DEFAULT and not comment):
+            comment = text
+        elif mode == COMMENT_PREPEND and text not in (comment or ""):
+            comment = text + (comment or "")
+    return comment
+
+
+class WritePlan(object):
+    """
+    All writes an import makes to the IDA database (vtable entries defined as qwords, comments and data
+    references), computed without IDA. Writes to the same address are collected and duplicates are dropped,
+    so the plan can be applied address by address in ascending order.
+    """
+
+    def __init__(self):
+        self.qwords = set()  # {address}
+        self.comments = defaultdict(list)  # {address: [(mode, text)]}
+        self.drefs = defaultdict(set)  # {from_address: {to_address}}
+        self.requested = 0  # number of writes added, including duplicates
+
+    def add_qword(self, address):
+        self.requested += 1
+        self.qwords.add(address)
+
+    def add_comment(self, address, mode, text):
+        """
+        :param address: address of the comment
+        :param mode: one of the COMMENT_* constants
+        :param text: comment text
+        """
+        self.requested += 1
+        comment_writes = self.comments[address]
+        # Writes before a replacement do not change the result
+        if mode == COMMENT_SET:
+            del comment_writes[:]
+        if not comment_writes or comment_writes[-1] != (mode, text):
+            comment_writes.append((mode, text))
+
+    def add_dref(self, from_address, to_address):
+        self.requested += 1
+        self.drefs[from_address].add(to_address)
+
+    def add_drefs(self, from_address, to_addresses):
+        """
+        :param from_address: address the data references start at
+        :param to_addresses: collection of addresses the data references point to
+        """
+        self.requested += len(to_addresses)
+        self.drefs[from_address].update(to_addresses)
+
+    def __len__(self):
+        """
+        :return: number of writes in the plan
+        """
+        return (len(self.qwords) + sum(len(comment_writes) for comment_writes in self.comments.itervalues()) +
+                sum(len(to_addresses) for to_addresses in self.drefs.itervalues()))
+
+    def addresses(self):
+        """
+        :return: sorted list of all addresses written by the plan
+        """
+        return sorted(self.qwords.union(self.comments, self.drefs))
+
+    def record(self, address):
+        """
+        :param address: address written by the plan
+        :return: (define_qword, comment_writes, dref_to_addresses) tuple of all writes to the address,
+                 comment_writes and dref_to_addresses are (sorted) tuples, empty if there are none
+        """
+        return (address in self.qwords, tuple(self.comments.get(address, ())),
+                tuple(sorted(self.drefs.get(address, ()))))
+
+    def iteraddresses(self):
+        """
+        :return: generator of (address, define_qword, comment_writes, dref_to_addresses) tuples in ascending
+                 order of the addresses, see record
+        """
+        for address in self.addresses():
+            yield (address,) + self.record(address)
+
+    def diff(self, applied, changed_only=True):
+        """
+        Compares the plan with the writes of an earlier import.
+        :param applied: {address: applied_entry} of the earlier import, see load_applied
+        :param changed_only: skip addresses whose writes did not change
+        :return: generator of (address, record, applied_entry) tuples in ascending order of the addresses for
+                 all addresses whose writes changed (all addresses if not changed_only), record is EMPTY_RECORD
+                 for addresses the plan no longer writes to and applied_entry is None for addresses the earlier
+                 import did not write to
+        """
+        for address in sorted(self.qwords.union(self.comments, self.drefs, applied)):
+            record = self.record(address)
+            applied_entry = applied.get(address)
+            if not changed_only or applied_entry is None or applied_entry[0] != record:
+                yield address, record, applied_entry
+
+    def dump(self, f):
+        """
+        Writes the plan in a readable form to the given output stream f, one write per line in the order the
+        writes are applied.
+        :param f: output stream
+        """
+        for address, define_qword, comment_writes, dref_to_addresses in self.iteraddresses():
+            if define_qword:
+                f.write("{:x} qword\n".format(address))
+            for mode, text in comment_writes:
+                f.write("{:x} comment {:s} {:s}\n".format(address, mode, json.dumps(text)))
+            for to_address in dref_to_addresses:
+                f.write("{:x} dref {:x}\n".format(address, to_address))
+
+
+def default_applied_path(database_path):
+    """
+    :param database_path: path of the IDA database
+    :return: path of the file recording the writes of the last import into the database
+    """
+    return os.path.splitext(database_path)[0] + APPLIED_EXTENSION
+
+
+def load_applied(path, token):
+    """
+    Loads the writes of the last import into a database. The writes of an address are recorded as applied entry
+    (record, base_comment, comment, added_dref_to_addresses): the record of the plan (see WritePlan.record), the
+    comment before and after the import and the data references which were added by the import.
+    :param path: path of the applied import file
+    :param token: token stored in the database by the last import, the file is ignored if its token differs
+                  (e.g. the database was not saved after the import)
+    :return: {address: applied_entry}, empty if there is no valid file
+    """
+    try:
+        with open(path, "rb") as f:
+            version, applied_token = marshal.load(f)
+            if version != APPLIED_VERSION or not token or applied_token != token:
+                return {}
+            return marshal.load(f)
+    except (EnvironmentError, EOFError, ValueError, TypeError):
+        return {}
+
+
+def save_applied(path, token, applied):
+    """
+    Writes the writes of an import (see load_applied), to a temporary file first, so an interrupted write
+    leaves no broken file.
+    :param path: path of the applied import file
+    :param token: token stored in the database
+    :param applied: {address: applied_entry}
+    :return: True if the file was written
+    """
+    temporary_path = path + ".tmp"
+    try:
+        with open(temporary_path, "wb") as f:
+            marshal.dump((APPLIED_VERSION, token), f)
+            marshal.dump(applied, f)
+        if os.name == "nt" and os.path.exists(path):
+            os.remove(path)
+        os.rename(temporary_path, path)
+        return True
+    except EnvironmentError:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return False
+
+
+def plan_vtable_hierarchy(plan, marx_module):
+    import_filter = marx_module.session.import_filter
+    for hierarchy in marx_module.class_hierarchies:
+        for vtable in hierarchy.vtables:
+            if import_filter and not import_filter.includes_address(vtable.address):
+                continue
+            plan.add_comment(vtable.address, COMMENT_PREPEND,
+                             "Begin of vtable - Class_{:X}, part of ClassHierarchy_{:d}".format(vtable.address,
+                                                                                                hierarchy.number))
+            plan.add_qword(vtable.address)
+
+
+def plan_new_operators(plan, marx_module):
+    for new_op in marx_module.new_operators.itervalues():
+        if new_op.class_hierarchy:
+            plan.add_comment(new_op.address, COMMENT_DEFAULT,
+                             "New operator - Size: {:d}, ".format(new_op.size) +
+                             "ClassHierarchy_{:d}".format(new_op.class_hierarchy.number))
+
+            # Add references from new operator address to the vtables of objects which could be constructed
+            plan.add_drefs(new_op.address, [vtable.address for vtable in new_op.class_hierarchy.vtables])
+        else:
+            plan.add_comment(new_op.address, COMMENT_DEFAULT,
+                             "New operator - Size: {:d}, no class info available".format(new_op.size))
+
+
+def plan_vcalls_extended(plan, marx_module):
+    session = marx_module.session
+    for vcall in marx_module.vcalls.itervalues():
+        if vcall.class_hierarchy:
+            # Target functions of all vtables of an object which is possible at this vcall
+            target_addresses = session.target_addresses(vcall.class_hierarchy, vcall.index)
+
+            # Add reference from vcall address to target function address (resolves icall)
+            plan.add_drefs(vcall.address, target_addresses)
+
+            plan.add_comment(vcall.address, COMMENT_DEFAULT,
+                             "Vcall - vtable index: {:d}, ".format(vcall.index) +
+                             "ClassHierarchy_{:d}\n".format(vcall.class_hierarchy.number) +
+                             "\n".join(map(lambda target_address: "Possible target: 0x{:X}".format(target_address),
+                                           sorted(target_addresses))))
+        else:
+            plan.add_comment(vcall.address, COMMENT_DEFAULT,
+                             "Vcall - vtable index: {:d}, no class info available".format(vcall.index))
+
+
+def plan_vtables(plan, marx_module):
+    import_filter = marx_module.session.import_filter
+    for vtable in marx_module.vtables.itervalues():
+        # Vtables are created for every vtable referenced by the Marx files, also for excluded ones
+        if import_filter and not import_filter.includes_vtable(vtable.address, vtable):
+            continue
+        vtable_entry_address = 0
+        for index, target_address, _ in vtable.functions.iterentries():
+            vtable_entry_address = vtable.address + (index * WORD_BYTE_COUNT)
+            plan.add_qword(vtable_entry_address)
+
+            if target_address:
+                # Add reference from vtable entry address to target function address
+                plan.add_dref(vtable_entry_address, target_address)
+
+        # Add comment at the end of the vtable
+        if vtable_entry_address and vtable.class_hierarchy:
+            plan.add_comment(vtable_entry_address, COMMENT_SET,
+                             "End of vtable - Class_{:X}, ".format(vtable.address) +
+                             "part of ClassHierarchy_{:d}".format(vtable.class_hierarchy.number))
+
+
+def plan_module(marx_module):
+    """
+    Computes the writes importing the given module makes to the IDA database.
+    :param marx_module: module to import
+    :return: the write plan
+    """
+    plan = WritePlan()
+    # Add comments to vtables
+    plan_vtable_hierarchy(plan, marx_module)
+    # Add data references and comments to new operators
+    plan_new_operators(plan, marx_module)
+    # Add data references and comments to vcalls
+    plan_vcalls_extended(plan, marx_module)
+    # Add data references to vtables
+    plan_vtables(plan, marx_module)
+    return plan
+
+
+# Standalone code, computes and prints the plan of an import without IDA
+def main(args):
+    marx.allow_single_class_hierarchies = args.allow_single_class_hierarchies
+    paths = zip(marx.MARX_FILE_KINDS, (args.hierarchy_file_path, args.new_operators_file_path,
+                                       args.vcalls_extended_file_path, args.vtables_txt_file_path))
+
+    start = time.time()
+    _, marx_module, _ = marx.parse_files(paths, marx.default_cache_path(paths) if args.cache else None,
+                                         import_filter=marx.import_filter_from_args(args))
+    parsed = time.time()
+    plan = plan_module(marx_module)
+    planned = time.time()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            plan.dump(f)
+    else:
+        plan.dump(stdout)
+
+    if args.verbose:
+        print >> stderr, "Parsed in {:.3f}s, planned in {:.3f}s".format(parsed - start, planned - parsed)
+        print >> stderr, "{:d} writes requested, {:d} planned at {:d} addresses".format(
+            plan.requested, len(plan), len(plan.addresses()))
+
+
+if __name__ == '__main__':
+    # Parsing arguments passed to this script
+    parser = argparse.ArgumentParser()
+    parser.add_argument("hierarchy_file_path", help="File path to a .hierarchy file generated by MARX")
+    parser.add_argument("new_operators_file_path", help="File path to a .new_operators file generated by MARX")
+    parser.add_argument("vcalls_extended_file_path", help="File path to a .vcalls_extended file generated by MARX")
+    parser.add_argument("vtables_txt_file_path", help="File path to a _vtables.txt file generated by MARX")
+    parser.add_argument("-o", "--output", help="file to write the plan to (default: standard output)")
+    parser.add_argument("-s", "--allow_single_class_hierarchies", help="allows hierarchies with only one class",
+                        action="store_true")
+    parser.add_argument("-c", "--cache", help="uses the model cache next to the hierarchy file",
+                        action="store_true")
+    parser.add_argument("-v", "--verbose", help="prints timings and the number of writes", action="store_true")
+    marx.add_import_filter_arguments(parser)
+    main(parser.parse_args())
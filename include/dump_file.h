@@ -5,6 +5,7 @@
 #include <set>
 #include <vector>
 #include <string>
+#include <cstdint>
 
 /*!
  * \brief Structure containing information about a serialized block in the
@@ -20,6 +21,47 @@ typedef std::vector<BlockDescriptor> FunctionBlocks;
 typedef std::map<uintptr_t, FunctionBlocks> ParsedFunctions;
 typedef std::set<uintptr_t> NonReturningFunctions;
 
+/*!
+ * \brief Magic value at the beginning of an indexed (version 2) `.dmp` file.
+ *
+ * Version 1 files start with the image base instead. As image bases are page
+ * aligned, they never collide with the magic value.
+ */
+const char DUMP_FILE_MAGIC[8] = {'M', 'A', 'R', 'X', 'D', 'M', 'P', '\0'};
+
+/*!
+ * \brief Header of an indexed (version 2) `.dmp` file.
+ */
+struct DumpFileHeader {
+    char magic[8];
+    uint32_t version;
+    uint32_t function_count;
+    uint64_t image_base;
+    uint64_t index_offset;
+};
+
+/*!
+ * \brief Entry of the function index of an indexed (version 2) `.dmp` file.
+ *
+ * The index is sorted by `function_rva`, `blocks_offset` is the file offset of
+ * the first `DumpBlockRecord` of the function.
+ */
+struct DumpIndexEntry {
+    uint32_t function_rva;
+    uint32_t block_count;
+    uint64_t blocks_offset;
+};
+
+/*!
+ * \brief Fixed-width block record of an indexed (version 2) `.dmp` file.
+ */
+struct DumpBlockRecord {
+    uint32_t block_rva;
+    uint32_t block_size;
+    uint16_t instruction_count;
+    uint16_t reserved;
+};
+
 /*!
  * \brief Class collecting the information that was produced by the IDA
  * exporting script.
@@ -28,6 +70,9 @@ typedef std::set<uintptr_t> NonReturningFunctions;
  * `.dmp.no-return` file is supported which contains information about
  * non-returning functions in the processed binary.
  *
+ * Version 1 files are parsed completely. Indexed (version 2) files are
+ * memory-mapped and functions are parsed once they are queried.
+ *
  * \todo This can be handled in a better manner.
  */
 class DumpFile {
@@ -35,16 +80,31 @@ private:
     ParsedFunctions _functions;
     NonReturningFunctions _functions_no_return;
 
+    uint32_t _version = 1;
+    uint64_t _image_base = 0;
+
+    const uint8_t *_mapping = nullptr;
+    size_t _mapping_size = 0;
+    const DumpIndexEntry *_index = nullptr;
+    uint32_t _function_count = 0;
+    bool _is_complete = true;
+
 public:
+    DumpFile(const DumpFile&) = delete;
+    void operator=(const DumpFile&) = delete;
+
     DumpFile(const std::string &dump_file);
+    ~DumpFile();
+
+    const ParsedFunctions &get_functions();
+    const FunctionBlocks *find_function(uintptr_t address);
 
     /*!
-     * \brief Returns all known functions.
-     * \return Returns a `map` with all known functions (address as key,
-     * `Function` object as value).
+     * \brief Returns the version of the parsed `.dmp` file.
+     * \return Returns 1 for sequential and 2 for indexed files.
      */
-    const ParsedFunctions &get_functions() const {
-        return _functions;
+    uint32_t get_version() const {
+        return _version;
     }
 
     /*!
@@ -58,6 +118,8 @@ public:
 
 private:
     bool parse(const std::string &dump_file);
+    bool parse_indexed(const std::string &dump_file);
+    const FunctionBlocks *parse_indexed_function(const DumpIndexEntry &entry);
     bool parse_no_return(const std::string &no_return_file);
 };
 
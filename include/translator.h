@@ -100,7 +100,8 @@ private:
     void detect_tail_jumps(Function &function);
 
     Function *maybe_translate_function(const uintptr_t address);
-    Function *translate_function(const std::pair<uintptr_t, FunctionBlocks>&);
+    Function *translate_function(const uintptr_t address,
+                                 const FunctionBlocks &blocks);
 
     Terminator get_terminator(const IRSB &block) const;
 };
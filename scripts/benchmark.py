@@ -0,0 +1,683 @@
+#!/usr/bin/env python2.7
+
+from __future__ import print_function
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'ida_export'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'ida_import'))
+
+import vtable_scanner
+from vtable_scanner import unpack_qwords
+
+'''
+Micro-benchmarks for the export and import scripts on synthetic data.
+'''
+
+
+def measure(name, func, *args):
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    print("%-30s %8.3fs" % (name, elapsed))
+    return result, elapsed
+
+
+# returns the current resident set size (falls back to the peak resident set
+# size where /proc is not available) in bytes
+def get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        return get_peak_rss()
+
+
+# returns the peak resident set size of this process in bytes
+def get_peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _run_child(queue, func, args):
+    queue.put(func(*args))
+
+
+# runs func in a child process (so that memory allocated or freed by earlier
+# benchmarks does not influence it) and returns its result
+def run_in_child(func, *args):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_child,
+                                      args=(queue, func, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _measure_memory(func, args):
+    before = get_rss()
+    start = time.time()
+    result = func(*args)
+    elapsed = time.time() - start
+    return elapsed, get_rss() - before
+
+
+# reports the time and the memory held by the object returned by func
+# (run in a child process)
+def measure_memory(name, func, *args):
+    elapsed, memory = run_in_child(_measure_memory, func, args)
+    print("%-30s %8.3fs %10.1f MiB" % (name, elapsed, memory / float(1 << 20)))
+    return elapsed, memory
+
+
+def bench_classifier(args):
+    rng = random.Random(args.seed)
+
+    # synthetic module layout
+    text_start, text_end = 0x10000, 0x800000
+    plt_start, plt_end = 0xf000, 0x10000
+    extern_start, extern_end = 0x2000000, 0x2010000
+    vtable_start = 0x1000000
+    vtable_end = vtable_start + args.qwords * 8
+    vtable_sections = [(vtable_start, vtable_end)]
+    pure_virtual_addr = 0x1234
+
+    # every 4th qword is a relocation entry, values are a mix of pointers
+    # into the text, plt, extern and vtable sections and other data
+    relocation_entries = set(range(vtable_start, vtable_end, 32))
+    ranges = [(text_start, text_end), (plt_start, plt_end),
+              (extern_start, extern_end), (vtable_start, vtable_end),
+              (0, 0x100), (0x3000000, 0x4000000)]
+    qwords = []
+    for _ in range(args.qwords):
+        start, end = ranges[rng.randrange(len(ranges))]
+        qwords.append(rng.randrange(start, end))
+    qwords = unpack_qwords(struct.pack('<%dQ' % len(qwords), *qwords))
+
+    # per qword check as done by the exporter before
+    def check_entry_valid_legacy(addr, qword):
+        ptr_to_text = (text_start <= qword < text_end)
+        ptr_to_extern = (extern_start <= qword < extern_end)
+        ptr_to_plt = (plt_start <= qword < plt_end)
+        is_relocation_entry = ((addr in relocation_entries)
+            and not any(map(
+            lambda x: x[0] <= qword <= x[1], vtable_sections)))
+        if (ptr_to_text
+            or ptr_to_extern
+            or ptr_to_plt
+            or qword == pure_virtual_addr
+            or is_relocation_entry):
+            return True
+        return False
+
+    def run_legacy():
+        return bytearray(check_entry_valid_legacy(vtable_start + k*8, x)
+                         for k, x in enumerate(qwords))
+
+    classifier, _ = measure("build classifier", vtable_scanner.EntryClassifier,
+        [(text_start, text_end), (extern_start, extern_end),
+         (plt_start, plt_end)],
+        pure_virtual_addr, relocation_entries, vtable_sections)
+
+    print("Classifying %d qwords." % args.qwords)
+    legacy, legacy_time = measure("check_entry_valid_gcc64", run_legacy)
+    mask, mask_time = measure("EntryClassifier.classify_section",
+                              classifier.classify_section,
+                              vtable_start, qwords)
+    if mask != legacy:
+        raise Exception("Classifier results differ.")
+    print("Speedup: %.1fx" % (legacy_time / max(mask_time, 1e-9)))
+
+
+# import model as it was before vtable entries were stored in typed arrays
+class LegacyAddressable(object):
+    def __init__(self, address, marx_module):
+        self.address = address
+        self.module = marx_module
+
+
+class LegacyVTable(LegacyAddressable):
+    def __init__(self, address, marx_module):
+        super(LegacyVTable, self).__init__(address, marx_module)
+        self.class_hierarchy = None
+        self.offset_to_top = 0
+        self.functions = {}
+
+
+class LegacyModule(object):
+    def __init__(self, name):
+        self.name = name
+        self.vtables = {}
+
+
+# builds a module with the given number of vtables and entries per vtable
+# through the public attribute API of the import model
+def build_model(module, vtable_class, addressable_class, vtable_count,
+                entry_count, seed):
+    rng = random.Random(seed)
+    text_start, text_end = 0x10000, 0x8000000
+    vtable_start = 0x10000000
+    for k in range(vtable_count):
+        address = vtable_start + k * (entry_count + 2) * 8
+        vtable = module.vtables[address] = vtable_class(address, module)
+        for index in range(entry_count):
+            vtable.functions[index] = addressable_class(
+                rng.randrange(text_start, text_end), module)
+    return module
+
+
+def bench_model(args):
+    import marx
+
+    print("Building %d vtables with %d entries each." % (args.vtables,
+                                                         args.entries))
+    _, legacy_memory = measure_memory(
+        "dict-backed model", build_model, LegacyModule("bench"),
+        LegacyVTable, LegacyAddressable, args.vtables, args.entries,
+        args.seed)
+    _, compact_memory = measure_memory(
+        "marx model", build_model, marx.Session().modules["bench"],
+        marx.VTable, marx.Addressable, args.vtables, args.entries, args.seed)
+    print("Reduction: %.1fx" % (legacy_memory / float(max(compact_memory, 1))))
+
+
+# writes synthetic .hierarchy, .new_operators, .vcalls_extended and
+# _vtables.txt files of one module into directory and returns their paths
+def write_marx_inputs(directory, module_name, vtable_count, entry_count,
+                      vcall_count, new_operator_count, seed):
+    rng = random.Random(seed)
+    extern_name = "libextern.so"
+    vtable_start = 0x10000000
+    vtables = ["%s:%x" % (module_name, vtable_start + k * (entry_count + 2) * 8)
+               for k in range(vtable_count)]
+
+    # hierarchies of 1 to 8 vtables, 1 in 8 hierarchies also contains a
+    # vtable of another module
+    hierarchies = []
+    k = 0
+    while k < vtable_count:
+        size = rng.randint(1, 8)
+        hierarchy = vtables[k:k + size]
+        if not rng.randrange(8):
+            hierarchy.append("%s:%x" % (extern_name, vtable_start + k * 8))
+        hierarchies.append(hierarchy)
+        k += size
+
+    def target():
+        if not rng.randrange(16):
+            return "%s:0" % module_name
+        return "%s:%x" % (module_name if rng.randrange(4) else extern_name,
+                          rng.randrange(0x10000, 0x8000000))
+
+    paths = {}
+    prefix = os.path.join(directory, module_name)
+    paths["hierarchy"] = prefix + ".hierarchy"
+    with open(paths["hierarchy"], "w") as f:
+        f.write(module_name + "\n")
+        for hierarchy in hierarchies:
+            f.write(" ".join(hierarchy) + "\n")
+
+    paths["new_operators"] = prefix + ".new_operators"
+    with open(paths["new_operators"], "w") as f:
+        f.write(module_name + "\n")
+        for k in range(new_operator_count):
+            hierarchy = hierarchies[rng.randrange(len(hierarchies))]
+            f.write("%x %x %s\n" % (0x10000 + k * 16, rng.randrange(8, 512),
+                                    " ".join(hierarchy)))
+
+    paths["vcalls_extended"] = prefix + ".vcalls_extended"
+    with open(paths["vcalls_extended"], "w") as f:
+        f.write(module_name + "\n")
+        for k in range(vcall_count):
+            hierarchy = hierarchies[rng.randrange(len(hierarchies))]
+            f.write("%x %x %s\n" % (0x20000 + k * 8, rng.randrange(entry_count),
+                                    " ".join(x + " " + target()
+                                             for x in hierarchy)))
+
+    paths["vtables"] = prefix + "_vtables.txt"
+    with open(paths["vtables"], "w") as f:
+        f.write(module_name + "\n")
+        for vtable in vtables:
+            f.write("%x 0 %s\n" % (int(vtable.split(":")[1], 16), " ".join(
+                "%x" % rng.randrange(0x10000, 0x8000000)
+                for _ in range(entry_count))))
+    return paths
+
+
+# file kinds in the order they are parsed
+MARX_INPUTS = ["hierarchy", "new_operators", "vcalls_extended", "vtables"]
+
+
+# parses the given files with the marx.py at module_path and returns a list
+# of (kind, lines, seconds) and the peak resident set size
+def _run_parsers(module_path, paths):
+    import imp
+    marx = imp.load_source("marx_bench", module_path)
+    timings = []
+    for kind in MARX_INPUTS:
+        with open(paths[kind]) as f:
+            lines = sum(1 for _ in f)
+        with open(paths[kind]) as f:
+            start = time.time()
+            getattr(marx, "parse_" + kind)(f)
+            timings.append((kind, lines, time.time() - start))
+    return timings, get_peak_rss()
+
+
+def bench_parsers(args):
+    import shutil
+    import tempfile
+
+    directory = args.directory or tempfile.mkdtemp()
+    try:
+        print("Writing inputs to %s." % directory)
+        paths = write_marx_inputs(directory, "bench", args.vtables,
+                                  args.entries, args.vcalls,
+                                  args.new_operators, args.seed)
+
+        variants = [("marx.py", os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "..", "ida_import",
+            "marx.py"))]
+        if args.reference:
+            variants.insert(0, ("reference", args.reference))
+
+        results = []
+        for name, module_path in variants:
+            timings, peak_rss = run_in_child(_run_parsers, module_path, paths)
+            print("%s (peak RSS %.1f MiB)" % (name, peak_rss / float(1 << 20)))
+            for kind, lines, seconds in timings:
+                print("  %-28s %10d lines %8.3fs %12.0f lines/s" % (
+                    kind, lines, seconds, lines / max(seconds, 1e-9)))
+            results.append(timings)
+
+        if len(results) == 2:
+            for (kind, _, before), (_, _, after) in zip(*results):
+                print("Speedup %-22s %.1fx" % (kind, before / max(after, 1e-9)))
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory)
+
+
+# parses (or loads from the model cache) the given files and returns the
+# seconds taken and whether the cache was used
+def _run_parse_files(paths, cache_path, verify):
+    import marx
+    start = time.time()
+    _, _, cached = marx.parse_files(paths, cache_path, verify)
+    return time.time() - start, cached
+
+
+def bench_cache(args):
+    import shutil
+    import tempfile
+    import marx
+
+    directory = args.directory or tempfile.mkdtemp()
+    try:
+        print("Writing inputs to %s." % directory)
+        paths = write_marx_inputs(directory, "bench", args.vtables,
+                                  args.entries, args.vcalls,
+                                  args.new_operators, args.seed)
+        paths = [(kind, paths[kind]) for kind in marx.MARX_FILE_KINDS]
+        cache_path = marx.default_cache_path(paths)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+        timings = []
+        for name, verify in (("parse and write cache", False),
+                             ("load cache", False),
+                             ("load cache (hash inputs)", True)):
+            seconds, cached = run_in_child(_run_parse_files, paths,
+                                           cache_path, verify)
+            print("%-30s %8.3fs%s" % (name, seconds,
+                                      "" if cached else " (parsed)"))
+            timings.append(seconds)
+        print("Cache size: %.1f MiB" % (os.path.getsize(cache_path) /
+                                        float(1 << 20)))
+        print("Speedup: %.1fx" % (timings[0] / max(timings[1], 1e-9)))
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory)
+
+
+def bench_store(args):
+    import shutil
+    import tempfile
+    import marx
+
+    directory = args.directory or tempfile.mkdtemp()
+    try:
+        print("Writing inputs of %d modules to %s." % (args.modules, directory))
+        for k in range(args.modules):
+            write_marx_inputs(directory, "module%d" % k, args.vtables,
+                              args.entries, args.vcalls, args.new_operators,
+                              args.seed + k)
+
+        database = os.path.join(directory, "marx.db")
+        if os.path.exists(database):
+            os.remove(database)
+        store = marx.ResultStore(database)
+        measure("import", store.import_directory, directory)
+        print("Database size: %.1f MiB" % (os.path.getsize(database) /
+                                           float(1 << 20)))
+
+        # random queries on vtables and functions of all modules (the
+        # vtables are laid out as by write_marx_inputs)
+        rng = random.Random(args.seed)
+        vtable_start = 0x10000000
+        queries = []
+        for _ in range(args.queries):
+            module_name = "module%d" % rng.randrange(args.modules)
+            vtable = vtable_start + (rng.randrange(args.vtables) *
+                                     (args.entries + 2) * 8)
+            queries.append((module_name, vtable))
+
+        def run_queries():
+            for module_name, vtable in queries:
+                for _, target in store.vtable_entries(module_name, vtable):
+                    store.vcalls_reaching(module_name, target)
+                store.hierarchies_with_vtable(module_name, vtable)
+                store.new_operators_with_vtable(module_name, vtable)
+
+        _, seconds = measure("%d vtable queries" % len(queries), run_queries)
+        print("Per vtable: %.3f ms" % (seconds * 1000 / max(len(queries), 1)))
+        store.close()
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory)
+
+
+def bench_lazy(args):
+    import shutil
+    import tempfile
+    import marx
+
+    directory = args.directory or tempfile.mkdtemp()
+    try:
+        print("Writing inputs to %s." % directory)
+        paths = write_marx_inputs(directory, "bench", args.vtables,
+                                  args.entries, args.vcalls,
+                                  args.new_operators, args.seed)
+        path = paths["vcalls_extended"]
+        index_path = marx.IndexedMarxFile.default_index_path(path)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        def parse():
+            with open(path) as f:
+                return marx.Session().parse_vcalls_extended(f)
+
+        marx_module, parse_time = measure("parse_vcalls_extended", parse)
+        rng = random.Random(args.seed)
+        addresses = rng.sample(sorted(marx_module.vcalls), args.lookups)
+        del marx_module
+
+        indexed, _ = measure("build and persist index", marx.IndexedMarxFile,
+                             path, None, index_path)
+        indexed.close()
+        indexed, load_time = measure("load persisted index",
+                                     marx.IndexedMarxFile, path, None,
+                                     index_path)
+
+        def lookup():
+            session = marx.Session()
+            return indexed.parse_into(session, addresses)
+
+        marx_module, lookup_time = measure("parse %d vcalls" % args.lookups,
+                                           lookup)
+        if sorted(marx_module.vcalls) != sorted(addresses):
+            raise Exception("Indexed lookup results differ.")
+        indexed.close()
+        print("Speedup: %.1fx" % (parse_time /
+                                  max(load_time + lookup_time, 1e-9)))
+    finally:
+        if not args.directory:
+            shutil.rmtree(directory)
+
+
+def bench_targets(args):
+    import marx
+
+    rng = random.Random(args.seed)
+    session = marx.Session()
+    module = session.modules["bench"]
+    vtable_start = 0x10000000
+    text_start = 0x10000
+
+    # the vtables of a hierarchy share the functions of a small pool per slot
+    # (inherited functions), like real class hierarchies do
+    print("Building %d hierarchies of %d vtables, %d vcalls." % (
+        args.hierarchies, args.vtables, args.vcalls))
+    hierarchies = []
+    for k in range(args.hierarchies):
+        hierarchy = session.new_class_hierarchy()
+        module.class_hierarchies.append(hierarchy)
+        for j in range(args.vtables):
+            address = (vtable_start +
+                       (k * args.vtables + j) * (args.entries + 2) * 8)
+            vtable = module.vtables[address]
+            vtable.class_hierarchy = hierarchy
+            hierarchy.vtables.append(vtable)
+            vtable.functions.fill(
+                [text_start + (index * args.pool + rng.randrange(args.pool))
+                 * 16 for index in range(args.entries)], module)
+        hierarchies.append(hierarchy)
+    vcalls = [(hierarchies[rng.randrange(len(hierarchies))],
+               rng.randrange(args.entries)) for _ in range(args.vcalls)]
+
+    # per vcall loop over all vtables of the hierarchy as done by the
+    # importer before
+    def run_legacy():
+        results = []
+        for hierarchy, index in vcalls:
+            target_addresses = set()
+            for vtable in hierarchy.vtables:
+                target_function = vtable.functions.get(index, None)
+                if target_function:
+                    target_addresses.add(target_function.address)
+            results.append(target_addresses)
+        return results
+
+    def run_memoized():
+        return [session.target_addresses(hierarchy, index)
+                for hierarchy, index in vcalls]
+
+    legacy, legacy_time = measure("per vcall loop", run_legacy)
+    memoized, memoized_time = measure("Session.target_addresses",
+                                      run_memoized)
+    if legacy != memoized:
+        raise Exception("Target sets differ.")
+    print("Distinct target sets: %d" % len(set(map(id, memoized))))
+    print("Speedup: %.1fx" % (legacy_time / max(memoized_time, 1e-9)))
+
+
+
+def bench_plan(args):
+    import marx
+    import write_plan
+
+    rng = random.Random(args.seed)
+    session = marx.Session()
+    module = session.modules["bench"]
+    vtable_start = 0x10000000
+    text_start = 0x10000
+
+    print("Building %d hierarchies of %d vtables, %d vcalls, "
+          "%d new operators." % (args.hierarchies, args.vtables, args.vcalls,
+                                 args.new_operators))
+    hierarchies = []
+    for k in range(args.hierarchies):
+        hierarchy = session.new_class_hierarchy()
+        module.class_hierarchies.append(hierarchy)
+        for j in range(args.vtables):
+            address = (vtable_start +
+                       (k * args.vtables + j) * (args.entries + 2) * 8)
+            vtable = module.vtables[address]
+            vtable.class_hierarchy = hierarchy
+            hierarchy.vtables.append(vtable)
+            vtable.functions.fill(
+                [text_start + (index * args.pool + rng.randrange(args.pool))
+                 * 16 for index in range(args.entries)], module)
+        hierarchies.append(hierarchy)
+    for address in rng.sample(range(0x100000, 0x8000000, 4), args.vcalls):
+        vcall = marx.VCall(address, module, rng.randrange(args.entries))
+        vcall.class_hierarchy = hierarchies[rng.randrange(len(hierarchies))]
+        module.vcalls[address] = vcall
+    for address in rng.sample(range(0x8000000, 0x9000000, 4),
+                              args.new_operators):
+        new_op = marx.NewOperator(address, module, rng.randrange(8, 512))
+        new_op.class_hierarchy = hierarchies[rng.randrange(len(hierarchies))]
+        module.new_operators[address] = new_op
+
+    plan, plan_time = measure("write_plan.plan_module",
+                              write_plan.plan_module, module)
+    print("Writes requested: %d, planned: %d at %d addresses" % (
+        plan.requested, len(plan), len(plan.addresses())))
+
+    # applies the plan to a database modelled by dicts, skipping writes
+    # which would not change it, and returns the number of writes
+    comments, qwords, drefs = {}, set(), set()
+
+    def apply_plan():
+        writes = 0
+        for address, define_qword, comment_writes, dref_to_addresses in \
+                plan.iteraddresses():
+            if define_qword and address not in qwords:
+                qwords.add(address)
+                writes += 1
+            if comment_writes:
+                comment = comments.get(address)
+                new_comment = write_plan.resolve_comment(comment,
+                                                         comment_writes)
+                if new_comment != comment:
+                    comments[address] = new_comment
+                    writes += 1
+            for to_address in dref_to_addresses:
+                if (address, to_address) not in drefs:
+                    drefs.add((address, to_address))
+                    writes += 1
+        return writes
+
+    writes, _ = measure("apply (empty database)", apply_plan)
+    print("Writes: %d" % writes)
+    writes, _ = measure("apply (imported before)", apply_plan)
+    print("Writes: %d (%d without skipping)" % (writes, plan.requested))
+
+    # re-import after a new Marx run which changed 1% of the vcalls, only
+    # the addresses whose writes changed are applied
+    applied = dict((address, (plan.record(address), None, None, ()))
+                   for address in plan.addresses())
+    for vcall in rng.sample(list(module.vcalls.values()), args.vcalls // 100):
+        vcall.index = (vcall.index + 1) % args.entries
+    plan, _ = measure("write_plan.plan_module", write_plan.plan_module,
+                      module)
+    changes, _ = measure("WritePlan.diff", lambda: list(plan.diff(applied)))
+    print("Changed addresses: %d of %d" % (len(changes),
+                                           len(plan.addresses())))
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark")
+
+    classifier = subparsers.add_parser(
+        "classifier", help="vtable entry classification (export)")
+    classifier.add_argument("-n", "--qwords", type=int, default=2000000)
+    classifier.add_argument("-s", "--seed", type=int, default=0)
+    classifier.set_defaults(func=bench_classifier)
+
+    model = subparsers.add_parser(
+        "model", help="memory used by the vtables of the import model")
+    model.add_argument("-n", "--vtables", type=int, default=100000)
+    model.add_argument("-e", "--entries", type=int, default=20)
+    model.add_argument("-s", "--seed", type=int, default=0)
+    model.set_defaults(func=bench_model)
+
+    parsers = subparsers.add_parser(
+        "parsers", help="parsing Marx output files (import)")
+    parsers.add_argument("-r", "--reference",
+                         help="path to another marx.py to compare with")
+    parsers.add_argument("-d", "--directory",
+                         help="directory for the generated inputs (kept)")
+    parsers.add_argument("-n", "--vtables", type=int, default=100000)
+    parsers.add_argument("-e", "--entries", type=int, default=20)
+    parsers.add_argument("-c", "--vcalls", type=int, default=2000000)
+    parsers.add_argument("-o", "--new-operators", type=int, default=500000)
+    parsers.add_argument("-s", "--seed", type=int, default=0)
+    parsers.set_defaults(func=bench_parsers)
+
+    cache = subparsers.add_parser(
+        "cache", help="loading the parsed model from its cache (import)")
+    cache.add_argument("-d", "--directory",
+                       help="directory for the generated inputs (kept)")
+    cache.add_argument("-n", "--vtables", type=int, default=100000)
+    cache.add_argument("-e", "--entries", type=int, default=20)
+    cache.add_argument("-c", "--vcalls", type=int, default=500000)
+    cache.add_argument("-o", "--new-operators", type=int, default=500000)
+    cache.add_argument("-s", "--seed", type=int, default=0)
+    cache.set_defaults(func=bench_cache)
+
+    store = subparsers.add_parser(
+        "store", help="SQLite result store of many modules (import)")
+    store.add_argument("-d", "--directory",
+                       help="directory for the generated inputs (kept)")
+    store.add_argument("-m", "--modules", type=int, default=50)
+    store.add_argument("-n", "--vtables", type=int, default=2000)
+    store.add_argument("-e", "--entries", type=int, default=20)
+    store.add_argument("-c", "--vcalls", type=int, default=20000)
+    store.add_argument("-o", "--new-operators", type=int, default=5000)
+    store.add_argument("-q", "--queries", type=int, default=1000)
+    store.add_argument("-s", "--seed", type=int, default=0)
+    store.set_defaults(func=bench_store)
+
+    lazy = subparsers.add_parser(
+        "lazy", help="point lookups in an indexed .vcalls_extended file")
+    lazy.add_argument("-d", "--directory",
+                      help="directory for the generated inputs (kept)")
+    lazy.add_argument("-n", "--vtables", type=int, default=100000)
+    lazy.add_argument("-e", "--entries", type=int, default=20)
+    lazy.add_argument("-c", "--vcalls", type=int, default=2000000)
+    lazy.add_argument("-o", "--new-operators", type=int, default=0)
+    lazy.add_argument("-l", "--lookups", type=int, default=100)
+    lazy.add_argument("-s", "--seed", type=int, default=0)
+    lazy.set_defaults(func=bench_lazy)
+
+    targets = subparsers.add_parser(
+        "targets", help="resolving the targets of vcalls (import)")
+    targets.add_argument("-m", "--hierarchies", type=int, default=5)
+    targets.add_argument("-n", "--vtables", type=int, default=2000,
+                         help="vtables per hierarchy")
+    targets.add_argument("-e", "--entries", type=int, default=20)
+    targets.add_argument("-p", "--pool", type=int, default=50,
+                         help="distinct functions per vtable slot")
+    targets.add_argument("-c", "--vcalls", type=int, default=10000)
+    targets.add_argument("-s", "--seed", type=int, default=0)
+    targets.set_defaults(func=bench_targets)
+
+    plan = subparsers.add_parser(
+        "plan", help="planning the writes to the IDA database (import)")
+    plan.add_argument("-m", "--hierarchies", type=int, default=5)
+    plan.add_argument("-n", "--vtables", type=int, default=500,
+                      help="vtables per hierarchy")
+    plan.add_argument("-e", "--entries", type=int, default=20)
+    plan.add_argument("-p", "--pool", type=int, default=50,
+                      help="distinct functions per vtable slot")
+    plan.add_argument("-c", "--vcalls", type=int, default=50000)
+    plan.add_argument("-o", "--new-operators", type=int, default=2000)
+    plan.add_argument("-s", "--seed", type=int, default=0)
+    plan.set_defaults(func=bench_plan)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
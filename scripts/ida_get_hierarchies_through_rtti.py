@@ -1,10 +1,15 @@
 #!/usr/bin/python2
 
+import os
 import sys
 from idc import *
 from idaapi import *
 from idautils import *
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'ida_export'))
+from segment_index import build_ida_segment_index
+
 '''
 Generate ground truth from RTTI values.
 '''
@@ -30,19 +35,45 @@ class ClassObject:
     def __init__(self, name):
         self.name = name
         self.base_classes = list()
+        # names of this class and all its base classes (see hierarchy_names)
+        self.hierarchy_names = None
 
 
     def add_base_class(self, base_class):
         self.base_classes.append(base_class)
 
 
+# Type infos parsed so far by their address (None if the type info could not
+# be parsed). Base classes shared by many classes are parsed only once and
+# their class object is shared.
+typeinfo_cache = dict()
+
+# Addresses of the type infos currently being parsed (to detect cycles).
+typeinfo_in_progress = set()
+
+
 def parse_typeinfo(rtti_ptr):
 
-    in_vtable_section = False
-    for vtable_sec in vtable_sections:
-        if SegStart(vtable_sec) <= rtti_ptr <= SegEnd(vtable_sec):
-            in_vtable_section = True
-            break
+    if rtti_ptr in typeinfo_cache:
+        return typeinfo_cache[rtti_ptr]
+
+    if rtti_ptr in typeinfo_in_progress:
+        print "Error for type info: 0x%x" % rtti_ptr
+        print "Type info is its own base class."
+        return None
+
+    typeinfo_in_progress.add(rtti_ptr)
+    try:
+        class_obj = decode_typeinfo(rtti_ptr)
+    finally:
+        typeinfo_in_progress.discard(rtti_ptr)
+    typeinfo_cache[rtti_ptr] = class_obj
+    return class_obj
+
+
+def decode_typeinfo(rtti_ptr):
+
+    in_vtable_section = segment_index.is_vtable_section(rtti_ptr)
 
     # Check if type info resides in extern.
     if not in_vtable_section:
@@ -112,15 +143,8 @@ def parse_typeinfo(rtti_ptr):
     else: # single-inheritance or base-class
         base_ptr = Qword(rtti_ptr + 0x10)
 
-        is_ptr = False
-        for vtable_sec in vtable_sections:
-            if SegStart(vtable_sec) <= base_ptr <= SegEnd(vtable_sec):
-                is_ptr = True
-                break
-
-        is_extern = False
-        if SegStart(extern_section) <= base_ptr <= SegEnd(extern_section):
-            is_extern = True
+        is_ptr = segment_index.is_vtable_section(base_ptr)
+        is_extern = segment_index.in_segments(base_ptr, ("extern",))
 
         if is_ptr: # single-inheritance
 
@@ -168,24 +192,23 @@ def print_class_hierarchy(class_obj):
     pretty_print(class_obj, 0)
 
 
-def convert_to_set(class_obj):
-    hierarchy_set = set()
-    hierarchy_set.add(class_obj.name)
-    for base_obj in class_obj.base_classes:
-        hierarchy_set |= convert_to_set(base_obj)
-    return hierarchy_set
+# returns the names of the class and all its base classes, computed once per
+# class object
+def hierarchy_names(class_obj):
+    if class_obj.hierarchy_names is None:
+        names = set()
+        names.add(class_obj.name)
+        for base_obj in class_obj.base_classes:
+            names |= hierarchy_names(base_obj)
+        class_obj.hierarchy_names = frozenset(names)
+    return class_obj.hierarchy_names
 
 
-segments = list(Segments())
-vtable_sections = set()
-extern_section = None
-for segment in segments:
-    if SegName(segment) in vtable_section_names:
-        vtable_sections.add(segment)
+def convert_to_set(class_obj):
+    return set(hierarchy_names(class_obj))
 
-    if SegName(segment) == "extern":
-        extern_section = segment
 
+segment_index = build_ida_segment_index(vtable_section_names)
 
 
 hierarchy_list = list()
@@ -232,14 +255,13 @@ for vtable_addr in vtables:
 
 
 # Replace vtable names with vtable addresses.
+vtables_by_name = dict()
+for k,v in vtable_mapping.iteritems():
+    vtables_by_name.setdefault(v.name, list()).append(k)
 for hierarchy_set in hierarchy_list:
     for name in list(hierarchy_set):
-        was_added = False
-        for k,v in vtable_mapping.iteritems():
-            if name == v.name:
-                was_added = True
-                hierarchy_set.add(k)
-        if was_added:
+        if name in vtables_by_name:
+            hierarchy_set.update(vtables_by_name[name])
             hierarchy_set.remove(name)
 '''
 for hierarchy_set in hierarchy_list:
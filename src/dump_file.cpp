@@ -3,6 +3,14 @@
 
 #include <fstream>
 #include <sstream>
+#include <cstring>
+#include <algorithm>
+#include <stdexcept>
+
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 using namespace std;
 
@@ -22,8 +30,77 @@ DumpFile::DumpFile(const string &dump_file) {
     parse_no_return(dump_file + ".no-return");
 }
 
+DumpFile::~DumpFile() {
+    if(_mapping) {
+        munmap(const_cast<uint8_t*>(_mapping), _mapping_size);
+    }
+}
+
+/*!
+ * \brief Returns all known functions.
+ *
+ * For indexed `.dmp` files, all functions that were not queried yet are
+ * parsed first.
+ *
+ * \return Returns a `map` with all known functions (address as key,
+ * `Function` object as value).
+ */
+const ParsedFunctions &DumpFile::get_functions() {
+    if(!_is_complete) {
+        for(auto i = 0u; i < _function_count; ++i) {
+            parse_indexed_function(_index[i]);
+        }
+        _is_complete = true;
+    }
+
+    return _functions;
+}
+
+/*!
+ * \brief Returns the blocks of the function at the given address.
+ *
+ * Indexed `.dmp` files are searched in O(log n) without parsing other
+ * functions.
+ *
+ * \param address The address the function lies at.
+ * \return A pointer to the blocks of the function or `nullptr`, if the
+ * function is not known.
+ */
+const FunctionBlocks *DumpFile::find_function(uintptr_t address) {
+    const auto &needle = _functions.find(address);
+    if(needle != _functions.cend()) {
+        return &needle->second;
+    }
+
+    if(_is_complete || address < _image_base
+       || address - _image_base > UINT32_MAX) {
+        return nullptr;
+    }
+
+    const uint32_t rva = address - _image_base;
+    const auto *end = _index + _function_count;
+    const auto *entry = lower_bound(_index, end, rva,
+        [](const DumpIndexEntry &current, uint32_t value) {
+            return current.function_rva < value;
+        });
+
+    if(entry == end || entry->function_rva != rva) {
+        return nullptr;
+    }
+
+    return parse_indexed_function(*entry);
+}
+
 bool DumpFile::parse(const string &dump_file) {
-    // FIXME: Comment on dump file structure.
+    /* Version 1 files are a sequence of
+     *     uint64_t image_base, uint32_t function_count,
+     *     function_count times:
+     *         uint32_t function_rva, uint16_t block_count,
+     *         block_count times:
+     *             uint32_t block_rva, uint32_t block_size,
+     *             uint16_t instruction_count.
+     * Version 2 files start with a `DumpFileHeader` (see dump_file.h).
+     */
     _functions.clear();
 
     ifstream file(dump_file.c_str(), ios::binary);
@@ -31,11 +108,20 @@ bool DumpFile::parse(const string &dump_file) {
         return false;
     }
 
-    uint64_t image_base = 0;
-    if(!file.read(reinterpret_cast<char*>(&image_base), sizeof(image_base))) {
+    char magic[sizeof(DUMP_FILE_MAGIC)];
+    if(!file.read(magic, sizeof(magic))) {
         return false;
     }
 
+    if(!memcmp(magic, DUMP_FILE_MAGIC, sizeof(magic))) {
+        file.close();
+        return parse_indexed(dump_file);
+    }
+
+    uint64_t image_base = 0;
+    memcpy(&image_base, magic, sizeof(image_base));
+    _image_base = image_base;
+
     uint32_t function_count = 0;
     if(!file.read(reinterpret_cast<char*>(&function_count),
                   sizeof(function_count))) {
@@ -91,6 +177,90 @@ bool DumpFile::parse(const string &dump_file) {
     return true;
 }
 
+bool DumpFile::parse_indexed(const string &dump_file) {
+    int fd = open(dump_file.c_str(), O_RDONLY);
+    if(fd == -1) {
+        return false;
+    }
+
+    struct stat file_stat;
+    if(fstat(fd, &file_stat) == -1
+       || static_cast<size_t>(file_stat.st_size) < sizeof(DumpFileHeader)) {
+        close(fd);
+        return false;
+    }
+
+    _mapping_size = file_stat.st_size;
+    void *mapping = mmap(nullptr, _mapping_size, PROT_READ, MAP_PRIVATE, fd,
+                         0);
+    close(fd);
+    if(mapping == MAP_FAILED) {
+        _mapping_size = 0;
+        return false;
+    }
+    _mapping = static_cast<const uint8_t*>(mapping);
+
+    DumpFileHeader header;
+    memcpy(&header, _mapping, sizeof(header));
+    if(header.version != 2) {
+        return false;
+    }
+
+    const uint64_t index_size = static_cast<uint64_t>(header.function_count)
+                                * sizeof(DumpIndexEntry);
+    if(header.index_offset % alignof(DumpIndexEntry)
+       || header.index_offset > _mapping_size
+       || index_size > _mapping_size - header.index_offset) {
+        return false;
+    }
+
+    _version = header.version;
+    _image_base = header.image_base;
+    _function_count = header.function_count;
+    _index = reinterpret_cast<const DumpIndexEntry*>(
+        _mapping + header.index_offset);
+    _is_complete = false;
+
+    return true;
+}
+
+const FunctionBlocks *DumpFile::parse_indexed_function(
+        const DumpIndexEntry &entry) {
+
+    const uint64_t function_base = _image_base + entry.function_rva;
+    const auto &needle = _functions.find(function_base);
+    if(needle != _functions.cend()) {
+        return &needle->second;
+    }
+
+    const uint64_t blocks_size = static_cast<uint64_t>(entry.block_count)
+                                 * sizeof(DumpBlockRecord);
+    if(entry.blocks_offset > _mapping_size
+       || blocks_size > _mapping_size - entry.blocks_offset) {
+        throw runtime_error("Malformed function record in indexed dump "
+                            "file.");
+    }
+
+    FunctionBlocks &blocks = _functions[function_base];
+    blocks.reserve(entry.block_count);
+
+    const uint8_t *current = _mapping + entry.blocks_offset;
+    for(auto j = 0u; j < entry.block_count; ++j) {
+        DumpBlockRecord record;
+        memcpy(&record, current, sizeof(record));
+        current += sizeof(record);
+
+        BlockDescriptor block;
+        block.block_start = _image_base + record.block_rva;
+        block.block_end = block.block_start + record.block_size;
+        block.instruction_count = record.instruction_count;
+
+        blocks.push_back(block);
+    }
+
+    return &blocks;
+}
+
 bool DumpFile::parse_no_return(const string &no_return_file) {
     _functions_no_return.clear();
 
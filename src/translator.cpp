@@ -201,11 +201,8 @@ void Translator::detect_tail_jumps(Function &function) {
     }
 }
 
-Function *Translator::translate_function(const
-    pair<uintptr_t, FunctionBlocks> &current) {
-
-    const auto address = current.first;
-    const auto &blocks = current.second;
+Function *Translator::translate_function(const uintptr_t address,
+                                         const FunctionBlocks &blocks) {
 
     _functions[address] = Function(address);
     Function &function = _functions.at(address);
@@ -228,14 +225,13 @@ Function *Translator::maybe_translate_function(const uintptr_t address) {
         return &function->second;
     }
 
-    const ParsedFunctions &functions = _dump_file.get_functions();
-    const auto &needle = functions.find(address);
+    const FunctionBlocks *blocks = _dump_file.find_function(address);
 
-    if(needle == functions.cend()) {
+    if(!blocks) {
         return nullptr;
     }
 
-    return translate_function(*needle);
+    return translate_function(address, *blocks);
 }
 
 /*!
@@ -282,7 +278,7 @@ void Translator::parse_known_functions() {
     const auto &functions = _dump_file.get_functions();
 
     for(const auto &kv : functions) {
-        translate_function(kv);
+        translate_function(kv.first, kv.second);
     }
 }
 
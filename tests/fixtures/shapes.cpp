@@ -0,0 +1,57 @@
+// Small C++ program whose vtables are exported by tests/test_headless_export.py.
+// Build: g++ -O0 -o shapes shapes.cpp
+#include <cstdio>
+#include <exception>
+
+struct Shape {
+    virtual ~Shape() {}
+    virtual double area() const = 0;
+    virtual const char *name() const { return "shape"; }
+};
+
+struct Rectangle : Shape {
+    Rectangle(double w, double h) : w(w), h(h) {}
+    double area() const { return w * h; }
+    const char *name() const { return "rectangle"; }
+    double w, h;
+};
+
+struct Square : Rectangle {
+    explicit Square(double s) : Rectangle(s, s) {}
+    const char *name() const { return "square"; }
+};
+
+struct Printable {
+    virtual ~Printable() {}
+    virtual void print() const = 0;
+};
+
+struct Circle : Shape, Printable {
+    explicit Circle(double r) : r(r) {}
+    double area() const { return 3.14159 * r * r; }
+    void print() const { std::printf("circle %f\n", r); }
+    double r;
+};
+
+struct ShapeError : std::exception {
+    const char *what() const throw() { return "shape error"; }
+};
+
+int main(int argc, char **argv) {
+    Shape *shapes[] = {new Rectangle(2, 3), new Square(argc), new Circle(1)};
+    double total = 0;
+    for (int i = 0; i < 3; i++) {
+        total += shapes[i]->area();
+        std::printf("%s\n", shapes[i]->name());
+    }
+    dynamic_cast<Printable *>(shapes[2])->print();
+    for (int i = 0; i < 3; i++)
+        delete shapes[i];
+    try {
+        if (total < 0)
+            throw ShapeError();
+    } catch (const std::exception &e) {
+        std::printf("%s\n", e.what());
+    }
+    return 0;
+}
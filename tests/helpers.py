@@ -0,0 +1,26 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TemporaryDirectoryTestCase(unittest.TestCase):
+    """
+    Test case with a temporary directory (self.directory) which is removed after each test.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, *lines):
+        """
+        Writes the given lines to a file in the temporary directory.
+        :param name: name of the file
+        :param lines: lines of the file (without line breaks)
+        :return: path of the file
+        """
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
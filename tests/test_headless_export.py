@@ -0,0 +1,80 @@
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+sys.path.insert(0, os.path.join(ROOT, 'ida_export'))
+
+import headless_export
+
+try:
+    import elftools
+except ImportError:
+    elftools = None
+
+'''
+Exports the vtables of tests/fixtures/shapes (built from shapes.cpp) and
+compares them with the expected _vtables.txt.
+'''
+
+
+def read_vtables(path):
+    with open(path) as f:
+        lines = f.read().splitlines()
+    return lines[0], dict((int(x.split()[0], 16), x) for x in lines[1:])
+
+
+@unittest.skipIf(elftools is None, "pyelftools is not installed")
+class ElfExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def export(self):
+        headless_export.export_binary(
+            (os.path.join(FIXTURES, 'shapes'), self.output_dir, None,
+             ['_vtables.txt']))
+        return read_vtables(os.path.join(self.output_dir,
+                                         'shapes_vtables.txt'))
+
+    def test_matches_expected_vtables(self):
+        expected = read_vtables(os.path.join(FIXTURES, 'shapes_vtables.txt'))
+        self.assertEqual(self.export(), expected)
+
+    # the address point of every class is 16 bytes behind its vtable
+    # symbol (offset to top and RTTI pointer come first)
+    def test_finds_vtable_symbols(self):
+        from elf_image import ElfImage
+        with ElfImage(os.path.join(FIXTURES, 'shapes')) as image:
+            address_points = set(
+                x.value + 16 for x in image.symbols('.symtab')
+                if x.name.startswith('_ZTV') and x.value
+                and image.section_at(x.value).name == '.data.rel.ro'
+                and not x.name.startswith('_ZTVSt'))
+        _, vtables = self.export()
+        self.assertEqual(len(address_points), 6)
+        self.assertTrue(address_points.issubset(vtables))
+
+        # Circle's secondary vtable (Printable in Circle) follows its
+        # primary one
+        secondary = [x for x in vtables.values() if x.split()[1] != '0']
+        self.assertEqual(len(secondary), 1)
+        self.assertEqual(secondary[0].split()[1], '-8')
+
+    # relocation entries of pure virtual slots must not count as
+    # references (they made slots inside Shape and Printable vtables
+    # survive as candidates)
+    def test_no_candidates_inside_vtables(self):
+        _, vtables = self.export()
+        for address, line in vtables.items():
+            end = address + 8 * (len(line.split()) - 2)
+            self.assertEqual([x for x in vtables if address < x < end], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ida_import'))
+
+import marx
+from helpers import TemporaryDirectoryTestCase
+from marx import ImportFilter
+
+
+class ImportFilterTest(TemporaryDirectoryTestCase):
+
+    def parse(self, paths, import_filter):
+        session, marx_module, _ = marx.parse_files(paths, import_filter=import_filter)
+        return session, marx_module
+
+    def test_hierarchies_are_filtered_after_merging_all_files(self):
+        paths = [("hierarchy", self.write("a.hierarchy", "m", "m:100 m:200")),
+                 ("hierarchy", self.write("b.hierarchy", "m", "m:300 m:400 m:500")),
+                 ("hierarchy", self.write("c.hierarchy", "m", "m:200 m:300"))]
+
+        _, marx_module = self.parse(paths, ImportFilter(min_hierarchy_size=3))
+        self.assertEqual([sorted(vtable.address for vtable in class_hierarchy.vtables)
+                          for class_hierarchy in marx_module.class_hierarchies],
+                         [[0x100, 0x200, 0x300, 0x400, 0x500]])
+
+        _, marx_module = self.parse(paths, ImportFilter(max_hierarchy_size=3))
+        self.assertEqual(marx_module.class_hierarchies, [])
+
+    def test_excluded_vcalls_fill_vtable_entries(self):
+        paths = [("hierarchy", self.write("m.hierarchy", "m", "m:100 m:200")),
+                 ("vcalls_extended", self.write("m.vcalls_extended", "m",
+                                                "10 1 m:100 m:1000 m:200 m:2000",
+                                                "20 2 m:100 m:1001 m:200 m:2001",
+                                                "900 3 m:100 m:1002"))]
+
+        session, marx_module = self.parse(paths, ImportFilter(address_ranges=[(0, 0x100)], max_vcall_targets=1))
+        self.assertEqual(marx_module.vcalls.keys(), [])
+        vtables = marx_module.vtables
+        self.assertEqual([(index, address) for index, address, _ in vtables[0x100].functions.iterentries()],
+                         [(1, 0x1000), (2, 0x1001), (3, 0x1002)])
+        self.assertEqual([(index, address) for index, address, _ in vtables[0x200].functions.iterentries()],
+                         [(1, 0x2000), (2, 0x2001)])
+
+        # The model does not depend on the filter besides the records which are skipped
+        _, unfiltered_module = self.parse(paths, None)
+        self.assertEqual(sorted(unfiltered_module.vcalls), [0x10, 0x20, 0x900])
+        for address, vtable in unfiltered_module.vtables.iteritems():
+            self.assertEqual([entry[:2] for entry in vtables[address].functions.iterentries()],
+                             [entry[:2] for entry in vtable.functions.iterentries()])
+        self.assertEqual(session.target_addresses(marx_module.class_hierarchies[0], 2), set([0x1001, 0x2001]))
+
+    def test_target_count_counts_distinct_functions(self):
+        paths = [("hierarchy", self.write("m.hierarchy", "m", "m:100 m:200")),
+                 ("vcalls_extended", self.write("m.vcalls_extended", "m",
+                                                "10 1 m:100 m:1000 m:200 m:2000",
+                                                "20 2 m:100 m:1001 m:200 m:1001"))]
+        _, marx_module = self.parse(paths, ImportFilter(max_vcall_targets=1))
+        self.assertEqual(marx_module.vcalls.keys(), [0x20])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ida_import'))
+
+import marx
+from helpers import TemporaryDirectoryTestCase
+from marx import IndexedMarxFile
+
+
+class TypedArrayTest(unittest.TestCase):
+
+    def test_widens_iterators(self):
+        values = [1, 2, 1 << 33, 5]
+        self.assertEqual(list(marx._typed_array("I", iter(values))), values)
+        self.assertEqual(list(marx._typed_array("I", (x for x in values))), values)
+
+
+class IndexedMarxFileTest(TemporaryDirectoryTestCase):
+
+    # addresses of a rebased MSVC x64 image, written in hash order like Marx does
+    LINES = ("140001020 0 140000100 140000200",
+             "10 0 140000300",
+             "140001000 -8 140000400",
+             "100000010 0 0")
+
+    def open(self, path, index_path=None):
+        marx_file = IndexedMarxFile(path, index_path=index_path)
+        self.addCleanup(marx_file.close)
+        return marx_file
+
+    def check_lookups(self, marx_file):
+        self.assertEqual(len(marx_file), 4)
+        self.assertEqual(list(marx_file), [0x10, 0x100000010, 0x140001000, 0x140001020])
+        for line in self.LINES:
+            self.assertEqual(marx_file.line(int(line.split()[0], 16)), line)
+        self.assertEqual(marx_file.line(0x40001000), None)
+
+    def test_addresses_beyond_32_bits(self):
+        self.check_lookups(self.open(self.write("m_vtables.txt", "m", *self.LINES)))
+
+    def test_vcalls_beyond_32_bits(self):
+        path = self.write("m.vcalls_extended", "m", "140002000 1 m:140001020 m:140000200")
+        marx_file = self.open(path)
+        self.assertEqual(list(marx_file), [0x140002000])
+        session = marx.Session()
+        marx_module = marx_file.parse_into(session, [0x140002000])
+        self.assertEqual(marx_module.vcalls.keys(), [0x140002000])
+
+    def test_persisted_index(self):
+        path = self.write("m_vtables.txt", "m", *self.LINES)
+        index_path = IndexedMarxFile.default_index_path(path)
+        self.check_lookups(self.open(path, index_path))
+        self.assertTrue(os.path.exists(index_path))
+
+        # The persisted index is loaded instead of reading the file again
+        build_index = IndexedMarxFile._build_index
+        IndexedMarxFile._build_index = None
+        try:
+            self.check_lookups(self.open(path, index_path))
+        finally:
+            IndexedMarxFile._build_index = build_index
+
+
+if __name__ == '__main__':
+    unittest.main()
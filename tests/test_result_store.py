@@ -0,0 +1,59 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ida_import'))
+
+import marx
+from helpers import TemporaryDirectoryTestCase
+
+
+class ResultStoreTest(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super(ResultStoreTest, self).setUp()
+        self.store = marx.ResultStore(":memory:")
+        self.addCleanup(self.store.close)
+
+    def vcalls(self, module_name):
+        return self.store.connection.execute(
+            "SELECT address, entry_index FROM vcalls WHERE module_id = ? ORDER BY address",
+            (self.store._module_ids[module_name],)).fetchall()
+
+    def test_reimport_vcalls_extended_replaces_its_vcalls(self):
+        vcalls = self.write("m.vcalls", "m", "10 m:100", "20 m:200")
+        extended = self.write("m.vcalls_extended", "m", "20 1 m:200 m:2000", "30 2 m:300 m:3000")
+        self.store.import_files([vcalls, extended])
+        self.assertEqual(self.vcalls("m"), [(0x10, None), (0x20, 1), (0x30, 2)])
+
+        extended = self.write("m.vcalls_extended", "m", "40 3 m:400 m:4000")
+        self.store.import_files([extended])
+        # The vcall only found in the .vcalls file is kept
+        self.assertEqual(self.vcalls("m"), [(0x10, None), (0x40, 3)])
+        self.assertEqual(self.store.vcall_targets("m", 0x10), [("m", 0x100, None, None)])
+        self.assertEqual(self.store.vcall_targets("m", 0x30), [])
+        self.assertEqual(self.store.vcall_targets("m", 0x40), [("m", 0x400, "m", 0x4000)])
+        self.assertEqual(self.store.vcalls_reaching("m", 0x3000), [])
+
+    def test_reimport_vcalls_keeps_extended_vcalls(self):
+        extended = self.write("m.vcalls_extended", "m", "20 1 m:200 m:2000")
+        vcalls = self.write("m.vcalls", "m", "10 m:100", "20 m:200")
+        self.store.import_files([extended, vcalls])
+
+        vcalls = self.write("m.vcalls", "m", "50 m:500")
+        self.store.import_files([vcalls])
+        self.assertEqual(self.vcalls("m"), [(0x20, 1), (0x50, None)])
+        self.assertEqual(self.store.vcall_targets("m", 0x10), [])
+        self.assertEqual(self.store.vcall_targets("m", 0x20), [("m", 0x200, "m", 0x2000)])
+
+    def test_hierarchies_of_different_files_are_not_merged(self):
+        self.store.import_files([self.write("a.hierarchy", "a", "a:100 b:200"),
+                                 self.write("b.hierarchy", "b", "b:200 b:300")])
+        self.assertEqual(self.store.hierarchies_with_vtable("b", 0x200), [("a", 0), ("b", 0)])
+        self.assertEqual(self.store.hierarchy_vtables("a", 0), [("a", 0x100), ("b", 0x200)])
+        self.assertEqual(self.store.hierarchy_vtables("b", 0), [("b", 0x200), ("b", 0x300)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+from __future__ import print_function
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ida_export'))
+
+import vtable_scanner
+
+
+# candidate filter as export.py implemented it before the sweep, run in
+# ascending address order
+def filter_vtable_candidates_nested(vtables_offset_to_top, has_xrefs,
+                                    number_allowed_zero_entries):
+    for vtable in sorted(vtables_offset_to_top.keys()):
+        for i in range(1, number_allowed_zero_entries+1):
+            if (vtable + i*8) in vtables_offset_to_top:
+
+                if not has_xrefs(vtable + i*8):
+                    if (vtable + i*8) in vtables_offset_to_top:
+                        del vtables_offset_to_top[(vtable + i*8)]
+                    continue
+
+                if not has_xrefs(vtable):
+                    if vtable in vtables_offset_to_top:
+                        del vtables_offset_to_top[vtable]
+                    continue
+
+    return vtables_offset_to_top
+
+
+# returns {address: offset to top} of candidates that often lie within a
+# few qwords of each other and the set of referenced candidates
+def generate_candidates(rng, count):
+    candidates = dict()
+    addr = 0x1000
+    for _ in range(count):
+        addr += rng.choice((8, 8, 16, 16, 24, 32, 4, 12, 0x40))
+        candidates[addr] = rng.choice((0, 0, -8, -16))
+    referenced = set(x for x in candidates if rng.random() < 0.5)
+    return candidates, referenced
+
+
+class FilterVtableCandidatesTest(unittest.TestCase):
+
+    def test_matches_nested_loop(self):
+        rng = random.Random(1)
+        for iteration in range(2000):
+            candidates, referenced = generate_candidates(
+                rng, rng.randint(0, 40))
+            number_allowed_zero_entries = rng.randint(0, 3)
+
+            expected = filter_vtable_candidates_nested(
+                dict(candidates), referenced.__contains__,
+                number_allowed_zero_entries)
+            actual = vtable_scanner.filter_vtable_candidates(
+                dict(candidates), referenced.__contains__,
+                number_allowed_zero_entries)
+            self.assertEqual(actual, expected,
+                             "iteration %d: %r" % (iteration, candidates))
+
+    def test_queries_xrefs_once_per_address(self):
+        rng = random.Random(2)
+        candidates, referenced = generate_candidates(rng, 500)
+        queries = []
+
+        def has_xrefs(addr):
+            queries.append(addr)
+            return addr in referenced
+
+        vtable_scanner.filter_vtable_candidates(candidates, has_xrefs)
+        self.assertEqual(len(queries), len(set(queries)))
+
+    def test_keeps_referenced_vtable(self):
+        # vtable with two zero entries found at 0x1000, 0x1008 and 0x1010
+        candidates = {0x1000: 0, 0x1008: 0, 0x1010: 0, 0x1100: -8}
+        actual = vtable_scanner.filter_vtable_candidates(
+            candidates, set([0x1000, 0x1100]).__contains__)
+        self.assertEqual(actual, {0x1000: 0, 0x1100: -8})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ida_import'))
+
+import write_plan
+from write_plan import COMMENT_DEFAULT, COMMENT_PREPEND, COMMENT_SET, EMPTY_RECORD, WritePlan, resolve_comment
+
+
+class AddCommentTest(unittest.TestCase):
+
+    def test_repeated_writes_are_dropped(self):
+        plan = WritePlan()
+        plan.add_comment(0x10, COMMENT_PREPEND, "a")
+        plan.add_comment(0x10, COMMENT_PREPEND, "a")
+        plan.add_comment(0x10, COMMENT_DEFAULT, "b")
+        plan.add_comment(0x10, COMMENT_PREPEND, "a")
+        self.assertEqual(plan.comments[0x10], [(COMMENT_PREPEND, "a"), (COMMENT_DEFAULT, "b"),
+                                               (COMMENT_PREPEND, "a")])
+        self.assertEqual(plan.requested, 4)
+        self.assertEqual(len(plan), 3)
+
+    def test_set_drops_earlier_writes(self):
+        plan = WritePlan()
+        plan.add_comment(0x10, COMMENT_PREPEND, "a")
+        plan.add_comment(0x10, COMMENT_DEFAULT, "b")
+        plan.add_comment(0x10, COMMENT_SET, "c")
+        plan.add_comment(0x10, COMMENT_PREPEND, "d")
+        self.assertEqual(plan.comments[0x10], [(COMMENT_SET, "c"), (COMMENT_PREPEND, "d")])
+
+        plan.add_comment(0x10, COMMENT_SET, "e")
+        self.assertEqual(plan.record(0x10), (False, ((COMMENT_SET, "e"),), ()))
+
+    def test_set_does_not_change_resolved_comment(self):
+        writes = [(COMMENT_PREPEND, "a"), (COMMENT_DEFAULT, "b"), (COMMENT_SET, "c"), (COMMENT_PREPEND, "d")]
+        plan = WritePlan()
+        for mode, text in writes:
+            plan.add_comment(0x10, mode, text)
+        for comment in (None, "", "x", "a"):
+            self.assertEqual(resolve_comment(comment, plan.comments[0x10]), resolve_comment(comment, writes))
+
+
+class ResolveCommentTest(unittest.TestCase):
+
+    def test_prepend(self):
+        self.assertEqual(resolve_comment(None, [(COMMENT_PREPEND, "a")]), "a")
+        self.assertEqual(resolve_comment("b", [(COMMENT_PREPEND, "a")]), "ab")
+        # Text contained in the comment already is not added again
+        self.assertEqual(resolve_comment("xay", [(COMMENT_PREPEND, "a")]), "xay")
+
+    def test_default(self):
+        self.assertEqual(resolve_comment(None, [(COMMENT_DEFAULT, "a")]), "a")
+        self.assertEqual(resolve_comment("", [(COMMENT_DEFAULT, "a")]), "a")
+        self.assertEqual(resolve_comment("b", [(COMMENT_DEFAULT, "a")]), "b")
+
+    def test_set(self):
+        self.assertEqual(resolve_comment(None, [(COMMENT_SET, "a")]), "a")
+        self.assertEqual(resolve_comment("b", [(COMMENT_SET, "a")]), "a")
+
+    def test_writes_are_applied_in_order(self):
+        self.assertEqual(resolve_comment("b", [(COMMENT_DEFAULT, "a"), (COMMENT_PREPEND, "c")]), "cb")
+        self.assertEqual(resolve_comment(None, [(COMMENT_PREPEND, "a"), (COMMENT_DEFAULT, "b")]), "a")
+        self.assertEqual(resolve_comment(None, []), None)
+
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plan = WritePlan()
+        self.plan.add_qword(0x10)
+        self.plan.add_dref(0x10, 0x100)
+        self.plan.add_comment(0x20, COMMENT_DEFAULT, "a")
+        self.plan.add_drefs(0x30, [0x300, 0x301])
+
+    # applied entry of an address written with the given record
+    def applied_entry(self, record):
+        return record, None, None, ()
+
+    def test_diff(self):
+        applied = {
+            # unchanged
+            0x10: self.applied_entry((True, (), (0x100,))),
+            # changed
+            0x30: self.applied_entry((False, (), (0x300,))),
+            # removed
+            0x40: self.applied_entry((True, (), ())),
+        }
+        self.assertEqual(list(self.plan.diff(applied)), [
+            (0x20, (False, ((COMMENT_DEFAULT, "a"),), ()), None),
+            (0x30, (False, (), (0x300, 0x301)), applied[0x30]),
+            (0x40, EMPTY_RECORD, applied[0x40]),
+        ])
+
+    def test_diff_all_addresses(self):
+        applied = {0x10: self.applied_entry((True, (), (0x100,)))}
+        self.assertEqual([address for address, _, _ in self.plan.diff(applied, changed_only=False)],
+                         [0x10, 0x20, 0x30])
+
+    def test_diff_without_earlier_import(self):
+        self.assertEqual(list(self.plan.diff({})),
+                         [(address, self.plan.record(address), None) for address in self.plan.addresses()])
+
+    def test_no_changes(self):
+        applied = dict((address, self.applied_entry(self.plan.record(address)))
+                       for address in self.plan.addresses())
+        self.assertEqual(list(self.plan.diff(applied)), [])
+
+
+class AppliedFileTest(unittest.TestCase):
+
+    def test_load_rejects_other_token(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_plan.default_applied_path(os.path.join(directory, "m.i64"))
+        applied = {0x10: ((True, (), ()), None, None, ())}
+        self.assertTrue(write_plan.save_applied(path, "token", applied))
+        self.assertEqual(write_plan.load_applied(path, "token"), applied)
+        self.assertEqual(write_plan.load_applied(path, "other"), {})
+        self.assertEqual(write_plan.load_applied(path + ".missing", "token"), {})
+
+
+if __name__ == '__main__':
+    unittest.main()